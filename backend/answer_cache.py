@@ -0,0 +1,242 @@
+"""
+Cache of chat answers for follow-up questions.
+
+Most chat questions are the same few follow-ups per disease ("how do I treat
+it", "is it contagious"). Answers are cached per detected disease and looked
+up by the question: first by its normalized text, then by TF-IDF cosine
+similarity over the content words and their character trigrams, so rewordings
+such as "how can I cure it?" reuse the answer to "how do I treat this". Function
+words are dropped and a few close synonyms are mapped to one word before
+comparing; the character trigrams also catch inflected forms in the Indic
+languages. Question words (what, when, why, ...) are kept, and a cached question
+only matches one asking with the same question words, so "when should I spray?"
+never gets the answer to "which fungicide should I spray?".
+
+The cache is bounded in total and per disease, least recently used entries
+are evicted first, and entries expire after a TTL.
+"""
+import math
+import re
+import time
+import threading
+from collections import Counter, OrderedDict
+
+from metrics import REGISTRY
+from topic_gate import normalize
+
+# Words of any script; Indic vowel signs aren't \w to the re module
+WORD = re.compile(r'[\w\u0900-\u0aff]+')
+
+# Words that don't change what a follow-up asks, in English, romanized Hindi and Hindi
+STOPWORDS = {
+    'a', 'an', 'the', 'is', 'are', 'was', 'be', 'it', 'its', 'this', 'that', 'these', 'those', 'there',
+    'i', 'me', 'my', 'we', 'our', 'you', 'your', 'do', 'does', 'did', 'can', 'could', 'should', 'would',
+    'will', 'shall', 'may', 'might', 'to', 'of', 'in', 'on', 'at', 'for', 'with', 'from', 'by',
+    'and', 'or', 'so', 'if', 'about', 'please', 'tell', 'know', 'want', 'need', 'any', 'some', 'way',
+    'ways', 'best', 'disease', 'plant', 'plants', 'crop', 'crops', 'problem',
+    'kya', 'hai', 'hain', 'ka', 'ki', 'ke', 'ko', 'se', 'mein', 'main', 'mera', 'meri', 'kare',
+    'karen', 'karein', 'batao', 'bataiye', 'iska', 'iski', 'yeh', 'ye',
+    'क्या', 'है', 'हैं', 'का', 'की', 'के', 'को', 'से', 'में', 'मेरा', 'मेरी', 'मेरे', 'करें',
+    'करे', 'बताओ', 'बताइए', 'बताएं', 'इसका', 'इसकी', 'इसके', 'इस', 'यह', 'ये', 'रोग', 'बीमारी',
+}
+
+# Question words; a cached question only matches a question with the same ones
+WH_WORDS = {
+    'what', 'when', 'where', 'which', 'who', 'whom', 'whose', 'why', 'how',
+    'kab', 'kahan', 'kyun', 'kyon', 'kaun', 'kaunsa', 'kaunsi', 'kaise',
+    'कब', 'कहाँ', 'कहां', 'क्यों', 'कौन', 'कौनसा', 'कौनसी', 'कैसे',
+}
+
+# Words asking the same thing; each maps to the first of its group. Only words that mean the
+# same in any question are grouped, and groups stay within one language, so a question is only
+# answered from the cache in the language it was asked in.
+SYNONYM_GROUPS = [
+    ['treat', 'treatment', 'cure', 'remedy', 'remedies', 'heal'],
+    ['spread', 'spreads', 'contagious', 'infectious', 'transmit', 'transmitted'],
+    ['symptom', 'symptoms', 'signs'],
+    ['ilaj', 'ilaaj', 'upchar'],
+    ['इलाज', 'उपचार'],
+]
+SYNONYMS = {word: group[0] for group in SYNONYM_GROUPS for word in group}
+
+
+def question_text(question, topic_words=()):
+    """Normalized question: lowercased, punctuation dropped, and without the crop and disease names."""
+    words = WORD.findall(normalize(question).replace('_', ' '))
+    return ' '.join(word for word in words if word not in topic_words)
+
+
+def question_terms(text):
+    """Content words of a normalized question, with common synonyms mapped to one word."""
+    words = text.split()
+    terms = [SYNONYMS.get(word, word) for word in words if word not in STOPWORDS]
+    # Questions made only of function words ("what is it") are compared as they are
+    return terms or words
+
+
+def question_words(text):
+    """The question words of a normalized question."""
+    return frozenset(word for word in text.split() if word in WH_WORDS)
+
+
+def question_features(text):
+    """Word and character trigram counts of the content words of a normalized question."""
+    features = Counter()
+    for word in question_terms(text):
+        features['w:' + word] += 1
+        padded = f' {word} '
+        for i in range(len(padded) - 2):
+            features[padded[i:i + 3]] += 1
+    return features
+
+
+class CachedAnswer:
+    def __init__(self, topic, text, answer):
+        self.topic = topic
+        self.text = text
+        self.answer = answer
+        self.features = question_features(text)
+        self.question_words = question_words(text)
+        self.created_at = time.time()
+
+
+class AnswerCache:
+    """Answers keyed by topic (crop and disease) and question, with similarity lookup."""
+
+    def __init__(self, max_entries=5000, threshold=0.75, ttl_seconds=86400, max_per_topic=256):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl_seconds
+        self.max_per_topic = max_per_topic
+        # (topic, text) -> CachedAnswer, least recently used first
+        self._entries = OrderedDict()
+        self._by_topic = {}
+        # Number of cached questions each feature appears in, for the IDF weights
+        self._document_frequency = Counter()
+        self._lock = threading.Lock()
+
+        self.exact_hits = REGISTRY.counter('chat_answer_cache_hits_total', 'Chat answers served from the cache',
+                                           {'match': 'exact'})
+        self.similar_hits = REGISTRY.counter('chat_answer_cache_hits_total', 'Chat answers served from the cache',
+                                             {'match': 'similar'})
+        self.misses = REGISTRY.counter('chat_answer_cache_misses_total', 'Chat questions not found in the cache')
+        self.evictions = REGISTRY.counter('chat_answer_cache_evictions_total',
+                                          'Cached chat answers evicted or expired')
+        self.size = REGISTRY.gauge('chat_answer_cache_entries', 'Chat answers held in the cache')
+        self.similarity = REGISTRY.histogram('chat_answer_cache_similarity', 'Similarity of the closest cached question',
+                                             buckets=(0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1.0))
+
+    @staticmethod
+    def topic_words(crop_type, disease):
+        return set(question_text(f'{crop_type} {disease}'.replace('_', ' ')).split())
+
+    def get(self, crop_type, disease, question):
+        """Return the cached answer to this question or a close rewording of it, or None."""
+        topic = (crop_type, disease)
+        text = question_text(question, self.topic_words(crop_type, disease))
+        with self._lock:
+            entry = self._entries.get((topic, text))
+            if entry is not None and not self._expired(entry):
+                self._touch(entry)
+                self.exact_hits.inc()
+                return entry.answer
+
+            best, score = self._closest(topic, question_features(text), question_words(text))
+            if best is not None:
+                self.similarity.observe(score)
+            if best is not None and score >= self.threshold:
+                self._touch(best)
+                self.similar_hits.inc()
+                return best.answer
+        self.misses.inc()
+        return None
+
+    def put(self, crop_type, disease, question, answer):
+        topic = (crop_type, disease)
+        text = question_text(question, self.topic_words(crop_type, disease))
+        if not text or not answer:
+            return
+        with self._lock:
+            if (topic, text) in self._entries:
+                self._remove(self._entries[(topic, text)])
+            entry = CachedAnswer(topic, text, answer)
+            self._entries[(topic, text)] = entry
+            self._by_topic.setdefault(topic, OrderedDict())[text] = entry
+            self._document_frequency.update(entry.features.keys())
+
+            topic_entries = self._by_topic[topic]
+            while len(topic_entries) > self.max_per_topic:
+                self._remove(next(iter(topic_entries.values())))
+                self.evictions.inc()
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries.values())))
+                self.evictions.inc()
+            self.size.set(len(self._entries))
+
+    def stats(self):
+        hits = self.exact_hits.value + self.similar_hits.value
+        lookups = hits + self.misses.value
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'threshold': self.threshold,
+            'exact_hits': self.exact_hits.value,
+            'similar_hits': self.similar_hits.value,
+            'misses': self.misses.value,
+            'hit_rate': hits / lookups if lookups else None
+        }
+
+    def _closest(self, topic, features, wh=frozenset()):
+        """
+        The cached question of this topic with the question words wh most similar to the
+        features, and its cosine similarity.
+        """
+        candidates = self._by_topic.get(topic)
+        if not candidates or not features:
+            return None, 0.0
+        documents = len(self._entries) + 1
+
+        def idf(feature):
+            return math.log(documents / (1 + self._document_frequency[feature])) + 1.0
+
+        weights = {feature: count * idf(feature) for feature, count in features.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        best, best_score = None, 0.0
+        for entry in list(candidates.values()):
+            if self._expired(entry):
+                self._remove(entry)
+                self.evictions.inc()
+                continue
+            if entry.question_words != wh:
+                continue
+            dot = sum(weight * entry.features[feature] * idf(feature)
+                      for feature, weight in weights.items() if feature in entry.features)
+            if not dot:
+                continue
+            entry_norm = math.sqrt(sum((count * idf(feature)) ** 2 for feature, count in entry.features.items()))
+            score = dot / (norm * entry_norm)
+            if score > best_score:
+                best, best_score = entry, score
+        self.size.set(len(self._entries))
+        return best, best_score
+
+    def _touch(self, entry):
+        """Mark an entry as recently used. Caller holds the lock."""
+        self._entries.move_to_end((entry.topic, entry.text))
+        self._by_topic[entry.topic].move_to_end(entry.text)
+
+    def _expired(self, entry):
+        return time.time() - entry.created_at > self.ttl
+
+    def _remove(self, entry):
+        """Drop an entry. Caller holds the lock."""
+        self._entries.pop((entry.topic, entry.text), None)
+        topic_entries = self._by_topic.get(entry.topic)
+        if topic_entries is not None:
+            topic_entries.pop(entry.text, None)
+            if not topic_entries:
+                del self._by_topic[entry.topic]
+        for feature in entry.features:
+            self._document_frequency[feature] -= 1
+            if not self._document_frequency[feature]:
+                del self._document_frequency[feature]
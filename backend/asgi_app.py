@@ -0,0 +1,419 @@
+"""
+Async (ASGI) serving mode for the GreenGuard backend.
+
+Serves the same endpoints and response shapes as backend.py, but chat LLM
+calls are awaited on the event loop instead of holding a worker thread, and
+model inference runs on its own thread pool. Inference and LLM work have
+separate concurrency limits, so a burst of slow Groq responses can't starve
+the prediction path.
+
+Run with:
+    uvicorn asgi_app:app --port 5000
+"""
+import os
+import time
+import asyncio
+import logging
+import zipfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.applications import Starlette
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from backend import (
+    BATCH_MAX_BYTES, BATCH_MAX_IMAGES, BATCH_MAX_MB, CLIENT_ID_HEADER, CLIENT_ID_TRUSTED_HOPS, MAX_UPLOAD_MB,
+    STARTED_AT, batch_prediction_lines, SESSION_EXPIRED_BODY, UnknownChatSession, build_chat_prompt, chat_reply,
+    chat_sessions, degraded_reply, expand_batch_uploads, explanation_jobs, llm_quota_wait, model_readiness,
+    prediction_response, professionals_map, professionals_search, readiness_status, response_options, sse_event,
+    throttled_body, upload_error
+)
+from client_quotas import client_id
+from disease_predict import analyze_image, load_in_background
+from groq_demo import agenerate_response, astream_response
+from llm_client import CircuitOpenError
+from metrics import PROMETHEUS_CONTENT_TYPE, REGISTRY, RequestTimer, record_request
+
+logger = logging.getLogger(__name__)
+
+# Separate limits: inference is CPU-bound, LLM calls are mostly waiting on the network
+INFERENCE_CONCURRENCY = int(os.getenv('GREENGUARD_INFERENCE_CONCURRENCY', '4'))
+LLM_CONCURRENCY = int(os.getenv('GREENGUARD_LLM_CONCURRENCY', '32'))
+
+MAX_UPLOAD_BYTES = int(MAX_UPLOAD_MB * 1024 * 1024)
+
+inference_executor = ThreadPoolExecutor(max_workers=INFERENCE_CONCURRENCY, thread_name_prefix='inference')
+inference_slots = asyncio.Semaphore(INFERENCE_CONCURRENCY)
+llm_slots = asyncio.Semaphore(LLM_CONCURRENCY)
+
+inference_in_flight = REGISTRY.gauge('asgi_in_flight', 'Requests holding a concurrency slot', {'pool': 'inference'})
+llm_in_flight = REGISTRY.gauge('asgi_in_flight', 'Requests holding a concurrency slot', {'pool': 'llm'})
+inference_slot_wait = REGISTRY.histogram('asgi_slot_wait_seconds', 'Time spent waiting for a concurrency slot',
+                                         labels={'pool': 'inference'})
+llm_slot_wait = REGISTRY.histogram('asgi_slot_wait_seconds', 'Time spent waiting for a concurrency slot',
+                                   labels={'pool': 'llm'})
+
+
+class Slot:
+    """Async context manager around a semaphore that records wait time and occupancy."""
+
+    def __init__(self, semaphore, in_flight, wait):
+        self.semaphore = semaphore
+        self.in_flight = in_flight
+        self.wait = wait
+
+    async def __aenter__(self):
+        start = time.perf_counter()
+        await self.semaphore.acquire()
+        self.wait.observe(time.perf_counter() - start)
+        self.in_flight.inc()
+
+    async def __aexit__(self, *exc):
+        self.in_flight.dec()
+        self.semaphore.release()
+
+
+class RequestMetricsMiddleware:
+    """
+    Gives each request a RequestTimer (request.state.timer), counts it by route and
+    status and adds the Server-Timing header when the response starts.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        timer = RequestTimer()
+        scope.setdefault('state', {})['timer'] = timer
+
+        async def send_with_timing(message):
+            if message['type'] == 'http.response.start':
+                elapsed = time.perf_counter() - start
+                route = scope.get('route')
+                record_request(route.path if route else 'unmatched', scope['method'], message['status'], elapsed)
+                headers = list(message.get('headers', []))
+                headers.append((b'server-timing', timer.server_timing(elapsed).encode()))
+                headers.append((b'timing-allow-origin', b'*'))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        await self.app(scope, receive, send_with_timing)
+
+
+def inference_slot():
+    return Slot(inference_slots, inference_in_flight, inference_slot_wait)
+
+
+def llm_slot():
+    return Slot(llm_slots, llm_in_flight, llm_slot_wait)
+
+
+class UploadTooLarge(Exception):
+    """The request body grew past the upload limit while it was being read."""
+
+
+def limit_body(request, limit):
+    """
+    The request with its body capped at limit bytes, like Flask's MAX_CONTENT_LENGTH: reading
+    more raises UploadTooLarge. Content-Length is checked up front, and chunked uploads, which
+    have none, are counted as they arrive so request.form() never buffers more than the limit.
+    """
+    if int(request.headers.get('content-length') or 0) > limit:
+        raise UploadTooLarge()
+    received = 0
+
+    async def receive():
+        nonlocal received
+        message = await request.receive()
+        if message['type'] == 'http.request':
+            received += len(message.get('body', b''))
+            if received > limit:
+                raise UploadTooLarge()
+        return message
+
+    return Request(request.scope, receive)
+
+
+def request_client(request):
+    return client_id(request.headers, request.client.host if request.client else None, CLIENT_ID_HEADER,
+                     CLIENT_ID_TRUSTED_HOPS)
+
+
+def too_large():
+    return JSONResponse({
+        'error': f'Image is too large. The maximum upload size is {MAX_UPLOAD_MB:g} MB.',
+        'status': 'failed'
+    }, status_code=413)
+
+
+def batch_too_large():
+    return JSONResponse({
+        'error': f'Upload is too large. The maximum batch size is {BATCH_MAX_MB:g} MB.',
+        'status': 'failed'
+    }, status_code=413)
+
+
+def event_stream(events):
+    return StreamingResponse(events, media_type='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+async def health(request):
+    status = model_readiness()
+    return JSONResponse({
+        'status': status['state'],
+        'model': status
+    }, status_code=200 if status['ready'] else 503)
+
+
+async def liveness(request):
+    return JSONResponse({'status': 'alive', 'uptime_seconds': round(time.time() - STARTED_AT, 3)})
+
+
+async def readiness(request):
+    body, status = readiness_status()
+    return JSONResponse(body, status_code=status)
+
+
+async def metrics(request):
+    return JSONResponse(REGISTRY.snapshot())
+
+
+async def prometheus_metrics(request):
+    return Response(REGISTRY.prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+async def predict(request):
+    timer = request.state.timer
+    try:
+        try:
+            top_k, fields = response_options(request.query_params)
+        except ValueError as e:
+            return JSONResponse({'error': str(e), 'status': 'failed'}, status_code=400)
+
+        with timer.stage('upload_receive'):
+            try:
+                form = await limit_body(request, MAX_UPLOAD_BYTES).form()
+            except UploadTooLarge:
+                return too_large()
+            upload = form.get('image')
+            image_bytes = b'' if upload is None or isinstance(upload, str) else await upload.read()
+        if upload is None or isinstance(upload, str):
+            return JSONResponse({'error': 'No image file provided', 'status': 'failed'}, status_code=400)
+
+        if len(image_bytes) > MAX_UPLOAD_BYTES:
+            return too_large()
+        error = upload_error(upload.filename or '', image_bytes)
+        if error:
+            return JSONResponse({'error': error, 'status': 'failed'}, status_code=400)
+
+        # Inference runs on its own pool so the event loop keeps serving LLM-bound requests
+        async with inference_slot():
+            loop = asyncio.get_running_loop()
+            analysis_result = await loop.run_in_executor(inference_executor, analyze_image, image_bytes, timer)
+
+        # Both look up the explanation store in SQLite; sync also waits for the explanation
+        wait_for_explanation = request.query_params.get('explanation') == 'sync'
+        response_data, status = await run_in_threadpool(prediction_response, analysis_result, wait_for_explanation,
+                                                        top_k, fields, timer)
+        with timer.stage('serialization'):
+            response = JSONResponse(response_data, status_code=status)
+        return response
+
+    except Exception as e:
+        logger.exception("Error in predict endpoint: %s", e)
+        return JSONResponse({'error': str(e), 'status': 'failed'}, status_code=500)
+
+
+async def predict_batch(request):
+    try:
+        top_k, _ = response_options(request.query_params)
+        with request.state.timer.stage('upload_receive'):
+            try:
+                form = await limit_body(request, BATCH_MAX_BYTES).form(max_files=BATCH_MAX_IMAGES)
+            except UploadTooLarge:
+                return batch_too_large()
+            uploads = [upload for upload in form.getlist('images') + form.getlist('image')
+                       if not isinstance(upload, str)]
+            files = [(upload.filename or '', await upload.read()) for upload in uploads]
+        if not uploads:
+            return JSONResponse({'error': 'No image files provided', 'status': 'failed'}, status_code=400)
+        images = await run_in_threadpool(expand_batch_uploads, files)
+    except (ValueError, zipfile.BadZipFile) as e:
+        return JSONResponse({'error': str(e), 'status': 'failed'}, status_code=400)
+
+    with_explanations = request.query_params.get('explanations') in ('1', 'true')
+
+    async def lines():
+        # The whole batch holds one inference slot; each line is produced on the thread pool
+        async with inference_slot():
+            async for line in iterate_in_threadpool(batch_prediction_lines(images, with_explanations, top_k)):
+                yield line
+
+    return StreamingResponse(lines(), media_type='application/x-ndjson', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+async def get_explanation(request):
+    job = explanation_jobs.get(request.path_params['job_id'])
+    if job is None:
+        return JSONResponse({'error': 'Unknown or expired explanation id', 'status': 'failed'}, status_code=404)
+    return JSONResponse(job.to_dict())
+
+
+async def stream_explanation(request):
+    job = explanation_jobs.get(request.path_params['job_id'])
+    if job is None:
+        return JSONResponse({'error': 'Unknown or expired explanation id', 'status': 'failed'}, status_code=404)
+
+    def events():
+        for event, text in job.events():
+            payload = {'error': text} if event == 'error' else {'text': text}
+            yield sse_event(event, payload)
+
+    # Starlette iterates synchronous generators on its thread pool
+    return event_stream(events())
+
+
+async def get_chat_session(request):
+    session = chat_sessions.get(request.path_params['session_id'])
+    if session is None:
+        return JSONResponse(SESSION_EXPIRED_BODY, status_code=404)
+    return JSONResponse(session.to_dict())
+
+
+async def chat(request):
+    try:
+        data = await request.json()
+        # The answer cache lookup vectorizes the question, which would block the event loop
+        prompt, reply, session = await run_in_threadpool(build_chat_prompt, data)
+        if reply is not None:
+            return JSONResponse(chat_reply(data, session, reply))
+
+        wait = llm_quota_wait(request_client(request))
+        if wait:
+            body, headers = throttled_body(wait)
+            return JSONResponse(body, status_code=429, headers=headers)
+
+        try:
+            async with llm_slot():
+                response = await agenerate_response(prompt)
+        except Exception as e:
+            body = degraded_reply(data, session, e)
+            if body is None:
+                raise
+            return JSONResponse(body)
+        return JSONResponse(await run_in_threadpool(chat_reply, data, session, response, generated=True))
+
+    except UnknownChatSession:
+        return JSONResponse(SESSION_EXPIRED_BODY, status_code=404)
+    except CircuitOpenError as e:
+        return JSONResponse({'message': str(e), 'error': True}, status_code=503)
+    except Exception as e:
+        logger.exception("Error in chat endpoint: %s", e)
+        return JSONResponse({'message': str(e), 'error': True}, status_code=500)
+
+
+async def chat_stream(request):
+    try:
+        data = await request.json()
+        prompt, reply, session = await run_in_threadpool(build_chat_prompt, data)
+    except UnknownChatSession:
+        return JSONResponse(SESSION_EXPIRED_BODY, status_code=404)
+    except Exception as e:
+        logger.exception("Error in chat stream endpoint: %s", e)
+        return JSONResponse({'message': str(e), 'error': True}, status_code=500)
+
+    wait = llm_quota_wait(request_client(request)) if reply is None else 0
+    if wait:
+        body, headers = throttled_body(wait)
+        return JSONResponse(body, status_code=429, headers=headers)
+
+    async def events():
+        if reply is not None:
+            yield sse_event('done', chat_reply(data, session, reply))
+            return
+        async with llm_slot():
+            tokens = astream_response(prompt)
+            parts = []
+            try:
+                async for token in tokens:
+                    parts.append(token)
+                    yield sse_event('token', {'text': token})
+                body = await run_in_threadpool(chat_reply, data, session, ''.join(parts), generated=True)
+                yield sse_event('done', body)
+            except Exception as e:
+                fallback = None if parts else degraded_reply(data, session, e)
+                if fallback is not None:
+                    yield sse_event('done', fallback)
+                else:
+                    logger.exception("Error in chat stream endpoint: %s", e)
+                    yield sse_event('error', {'message': str(e), 'error': True})
+            finally:
+                # Also runs when the client disconnects and Starlette cancels the stream
+                await tokens.aclose()
+
+    return event_stream(events())
+
+
+async def agricultural_professionals(request):
+    try:
+        # The first query builds the index, so it runs off the event loop
+        professionals, headers = await run_in_threadpool(professionals_search, request.url.path,
+                                                         request.query_params)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    return JSONResponse(professionals, headers=headers)
+
+
+async def agricultural_professionals_map(request):
+    try:
+        view = await run_in_threadpool(professionals_map, request.query_params)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    return JSONResponse(view)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Serve right away; the model loads on a background thread and /api/health/ready reports when it is done
+    load_in_background()
+    logger.info("Startup completed in %.2fs, loading the model in the background", time.time() - STARTED_AT)
+    yield
+
+
+app = Starlette(
+    routes=[
+        Route('/api/health', health, methods=['GET']),
+        Route('/api/health/live', liveness, methods=['GET']),
+        Route('/api/health/ready', readiness, methods=['GET']),
+        Route('/api/metrics', metrics, methods=['GET']),
+        Route('/metrics', prometheus_metrics, methods=['GET']),
+        Route('/api/predict', predict, methods=['POST']),
+        Route('/api/predict/batch', predict_batch, methods=['POST']),
+        Route('/api/explanations/{job_id}', get_explanation, methods=['GET']),
+        Route('/api/explanations/{job_id}/stream', stream_explanation, methods=['GET']),
+        Route('/api/chat', chat, methods=['POST']),
+        Route('/api/chat/sessions/{session_id}', get_chat_session, methods=['GET']),
+        Route('/api/chat/stream', chat_stream, methods=['POST']),
+        Route('/api/agricultural-professionals', agricultural_professionals, methods=['GET']),
+        Route('/api/agricultural-professionals/map', agricultural_professionals_map, methods=['GET']),
+    ],
+    middleware=[
+        Middleware(RequestMetricsMiddleware),
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*']),
+    ],
+    lifespan=lifespan,
+)
@@ -1,191 +1,852 @@
+import io
 import os
-import base64
-import traceback
-from flask import Flask, request, jsonify
+import time
+import json
+import math
+import logging
+import zipfile
+from urllib.parse import urlencode
+from flask import Flask, Request, Response, g, request, jsonify
 from flask_cors import CORS
-from werkzeug.utils import secure_filename
-from disease_predict import analyze_image
-from groq_demo import generate_response
+from werkzeug.exceptions import RequestEntityTooLarge
+from disease_predict import analyze_image, analyze_images, load_in_background, model_status, top_classes
+from labels import CLASS_NAMES
+from groq_demo import generate_response, llm_status, stream_response
+from llm_client import CircuitOpenError
+from metrics import PROMETHEUS_CONTENT_TYPE, REGISTRY, RequestTimer, record_request
+from explanation_store import ExplanationStore
+from explanation_jobs import ExplanationJobs
+from professionals import get_index as professionals_index
+from chat_sessions import ChatSessionStore
+from answer_cache import AnswerCache
+from client_quotas import ClientQuotas, client_id
+from topic_gate import TOPIC_GATE
+
+# Per-request details are logged at DEBUG; GREENGUARD_LOG_LEVEL=DEBUG turns them on
+logging.basicConfig(level=os.getenv('GREENGUARD_LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+class InMemoryRequest(Request):
+    """Keep uploaded files in memory instead of spooling large ones to a temporary file."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Safe because MAX_CONTENT_LENGTH (or the batch limit) bounds the request size
+        return io.BytesIO()
+
+# For the uptime reported by the liveness check
+STARTED_AT = time.time()
 
 app = Flask(__name__)
+app.request_class = InMemoryRequest
 CORS(app)
 
-# Setup upload folder
-UPLOAD_FOLDER = 'temp_uploads'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Explanations are stored per predicted class, see explanation_store.py
+explanations = ExplanationStore()
+
+# Explanations missing from the store are generated in the background
+EXPLANATION_WORKERS = int(os.getenv('GREENGUARD_EXPLANATION_WORKERS', '4'))
+explanation_jobs = ExplanationJobs(explanations, generate_response,
+                                   stream=lambda prompt: stream_response(prompt, 'explanation'),
+                                   max_workers=EXPLANATION_WORKERS)
+
+# Chat sessions started by /api/predict, so chat requests don't need to carry the transcript
+CHAT_SESSIONS_MAX = int(os.getenv('GREENGUARD_CHAT_SESSIONS_MAX', '10000'))
+CHAT_SESSION_TTL = float(os.getenv('GREENGUARD_CHAT_SESSION_TTL', '7200'))
+CHAT_HISTORY_MESSAGES = int(os.getenv('GREENGUARD_CHAT_HISTORY_MESSAGES', '20'))
+chat_sessions = ChatSessionStore(CHAT_SESSIONS_MAX, CHAT_SESSION_TTL, CHAT_HISTORY_MESSAGES)
+
+# Answers to chat questions per disease, reused for the same or a reworded question (0 entries disables)
+ANSWER_CACHE_SIZE = int(os.getenv('GREENGUARD_ANSWER_CACHE_SIZE', '5000'))
+ANSWER_CACHE_THRESHOLD = float(os.getenv('GREENGUARD_ANSWER_CACHE_THRESHOLD', '0.75'))
+ANSWER_CACHE_TTL = float(os.getenv('GREENGUARD_ANSWER_CACHE_TTL', '86400'))
+answer_cache = AnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL) if ANSWER_CACHE_SIZE > 0 else None
+
+# Per-client token buckets for chat questions that need the LLM (0 per minute disables them).
+# Behind a proxy, GREENGUARD_CLIENT_ID_HEADER=X-Forwarded-For keys them by the original client, as
+# appended by the last of GREENGUARD_CLIENT_ID_TRUSTED_HOPS proxies (default 1).
+LLM_QUOTA_PER_MINUTE = float(os.getenv('GREENGUARD_LLM_QUOTA_PER_MINUTE', '20'))
+LLM_QUOTA_BURST = int(os.getenv('GREENGUARD_LLM_QUOTA_BURST', '10'))
+CLIENT_ID_HEADER = os.getenv('GREENGUARD_CLIENT_ID_HEADER')
+CLIENT_ID_TRUSTED_HOPS = int(os.getenv('GREENGUARD_CLIENT_ID_TRUSTED_HOPS', '1'))
+llm_quotas = ClientQuotas(LLM_QUOTA_PER_MINUTE / 60, LLM_QUOTA_BURST) if LLM_QUOTA_PER_MINUTE > 0 else None
+
+# Chat answers taken from the stored explanation while the LLM is failing
+degraded_replies = REGISTRY.counter('chat_degraded_replies_total',
+                                    'Chat answers served from a stored explanation because the LLM call failed')
+
+# Reject request bodies above this size before they are read into memory
+MAX_UPLOAD_MB = float(os.getenv('GREENGUARD_MAX_UPLOAD_MB', '10'))
+app.config['MAX_CONTENT_LENGTH'] = int(MAX_UPLOAD_MB * 1024 * 1024)
+
+# Limits for /api/predict/batch: total request size, uncompressed zip contents and image count
+BATCH_MAX_MB = float(os.getenv('GREENGUARD_BATCH_MAX_MB', '200'))
+BATCH_MAX_BYTES = int(BATCH_MAX_MB * 1024 * 1024)
+BATCH_MAX_IMAGES = int(os.getenv('GREENGUARD_BATCH_MAX_IMAGES', '500'))
+
+# Response fields a client can select with ?fields= ('status' is always returned)
+RESPONSE_FIELDS = (
+    'disease', 'confidence', 'crop_type', 'crop_confidence', 'top_classes', 'crop_probabilities',
+    'explanation', 'explanation_status', 'explanation_id', 'explanation_url', 'explanation_stream_url',
+    'session_id'
+)
+EXPLANATION_FIELDS = {field for field in RESPONSE_FIELDS if field.startswith('explanation')}
+# Number of classes returned when 'top_classes' is selected without a top_k
+DEFAULT_TOP_K = 5
 
 # Allowable file extensions for images
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
+# Leading bytes of the image formats we accept
+IMAGE_SIGNATURES = (
+    b'\xff\xd8\xff',        # JPEG
+    b'\x89PNG\r\n\x1a\n',  # PNG
+    b'GIF87a', b'GIF89a',   # GIF
+)
+
 def allowed_file(filename):
     """Check if the file has an allowed extension."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def is_disease_related(message, disease):
-    """Check if the user's message is related to the disease context."""
-    # List of disease-related keywords
-    disease_keywords = [
-        'disease', 'treatment', 'symptoms', 'cure', 'prevent', 'spread', 
-        'control', 'causes', 'affected', 'infection', 'remedy', 'solution',
-        'manage', 'handle', 'rice', 'plant', 'crop', 'farm', 'field',
-    ]
-    disease = disease.lower()
-    
-    message_lower = message.lower()
+def looks_like_image(data):
+    """Cheap check of the file signature so non-image bytes never reach the decoder."""
+    return data.startswith(IMAGE_SIGNATURES)
+
+def sse_event(event, payload):
+    """Format one Server-Sent Events message with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.timer = RequestTimer()
+
+@app.after_request
+def finish_request_timer(response):
+    """Count the request and add the Server-Timing header. Streamed bodies are still being sent at this point."""
+    elapsed = time.perf_counter() - g.request_start
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    record_request(endpoint, request.method, response.status_code, elapsed)
+    response.headers['Server-Timing'] = g.timer.server_timing(elapsed)
+    # Lets the cross-origin frontend read Server-Timing in the browser's resource timing
+    response.headers['Timing-Allow-Origin'] = '*'
+    return response
+
+@app.errorhandler(413)
+def upload_too_large(error):
+    if request.path == '/api/predict/batch':
+        message = f'Upload is too large. The maximum batch size is {BATCH_MAX_MB:g} MB.'
+    else:
+        message = f'Image is too large. The maximum upload size is {MAX_UPLOAD_MB:g} MB.'
+    return jsonify({'error': message, 'status': 'failed'}), 413
+
+def is_disease_related(message, disease, crop_type=None):
+    """Check if the user's message is related to the disease context, in any of the supported languages."""
+    return TOPIC_GATE.is_on_topic(message, disease, crop_type)
+
+def model_readiness():
+    """
+    Loading state of the model for the health checks. Servers that import the app, like gunicorn
+    or waitress, don't run __main__, so the first check starts the background load.
+    """
+    status = model_status()
+    if status['state'] == 'not_loaded':
+        load_in_background()
+        status = model_status()
+    return status
+
+@app.route('/api/health', methods=['GET'])
+def health():
+    """Readiness check: reports whether the disease model is loaded."""
+    status = model_readiness()
+    return jsonify({
+        'status': status['state'],
+        'model': status
+    }), 200 if status['ready'] else 503
+
+@app.route('/api/health/live', methods=['GET'])
+def liveness():
+    """Liveness check: the process is up and serving requests, whether or not the model has loaded."""
+    return jsonify({'status': 'alive', 'uptime_seconds': round(time.time() - STARTED_AT, 3)})
+
+def readiness_status():
+    """Per-component readiness. Only the model gates readiness; chat works without it and vice versa."""
+    model = model_readiness()
+    components = {
+        'model': model,
+        'llm': llm_status(),
+        'explanations': {'ready': True, 'stored': explanations.count()}
+    }
+    if answer_cache is not None:
+        components['answer_cache'] = dict(answer_cache.stats(), ready=True)
+    return {'status': 'ready' if model['ready'] else model['state'], 'components': components}, \
+        200 if model['ready'] else 503
+
+@app.route('/api/health/ready', methods=['GET'])
+def readiness():
+    """Readiness check: 200 once the disease model can serve predictions, 503 before."""
+    body, status = readiness_status()
+    return jsonify(body), status
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Expose queue depth, batch sizes and latency histograms as JSON."""
+    return jsonify(REGISTRY.snapshot())
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """The same metrics in the Prometheus text format, for scraping."""
+    return Response(REGISTRY.prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+def upload_error(filename, image_bytes):
+    """Validate an uploaded image. Returns the message for a 400 response, or None if it is fine."""
+    # Check if a file was actually selected
+    if filename == '':
+        return 'No file selected'
+    # Check if the file has a valid extension
+    if not allowed_file(filename):
+        return 'Invalid file type. Only image files are allowed.'
+    # Cheap signature check so non-image bytes never reach the decoder
+    if not looks_like_image(image_bytes):
+        return 'The uploaded file is not a valid image.'
+    return None
+
+def explanation_fields(crop_type, condition, wait_for_explanation=False):
+    """
+    Explanation part of a prediction response. If the explanation isn't stored yet,
+    it is generated in the background and the client fetches it through the returned handle.
+    """
+    explanation = explanations.lookup(crop_type, condition)
+    job = None
+    if explanation is None:
+        job = explanation_jobs.submit(crop_type, condition)
+        # Older clients can still ask to wait for the full explanation
+        if wait_for_explanation:
+            job.wait(timeout=60)
+            explanation = job.to_dict()['explanation']
+
+    fields = {
+        'explanation': explanation,
+        'explanation_status': 'ready' if explanation is not None else job.status
+    }
+    if job is not None:
+        fields.update({
+            'explanation_id': job.id,
+            'explanation_url': f'/api/explanations/{job.id}',
+            'explanation_stream_url': f'/api/explanations/{job.id}/stream'
+        })
+    return fields
+
+def response_options(args):
+    """
+    Read the ?top_k= and ?fields= options of a prediction request.
+
+    Returns (top_k, fields), where fields is None if the client didn't pick any.
+    Raises ValueError for values that can't be served.
+    """
+    try:
+        top_k = int(args.get('top_k') or 0)
+    except ValueError:
+        raise ValueError('top_k must be an integer')
+    if not 0 <= top_k <= len(CLASS_NAMES):
+        raise ValueError(f'top_k must be between 0 and {len(CLASS_NAMES)}')
+
+    fields = None
+    if args.get('fields'):
+        fields = {field.strip() for field in args['fields'].split(',') if field.strip()}
+        unknown = fields - set(RESPONSE_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}. "
+                             f"Available fields: {', '.join(RESPONSE_FIELDS)}")
+        if 'top_classes' in fields and not top_k:
+            top_k = DEFAULT_TOP_K
+    return top_k, fields
+
+def prediction_response(analysis_result, wait_for_explanation=False, top_k=0, fields=None, timer=None):
+    """
+    Build the /api/predict JSON body and status code from an analysis result.
+
+    top_k adds the most likely classes; fields limits the body to the chosen keys,
+    and the explanation is only looked up when one of its fields is wanted.
+    """
+    timer = timer or RequestTimer()
+    if analysis_result['status'] != 'success':
+        # Return the error
+        return {
+            'error': analysis_result.get('error', 'Disease detection failed'),
+            'status': 'failed'
+        }, 500
+
+    logger.debug("Prediction: %s %s (%.2f%%)", analysis_result['crop_type'], analysis_result['condition'],
+                 analysis_result['confidence'] * 100)
+        
+    # Return the prediction and explanation
+    response_data = {
+        'disease': analysis_result.get('condition', 'Unknown'),
+        'confidence': float(analysis_result.get('confidence', 0.0)),
+        'crop_type': analysis_result.get('crop_type', 'Unknown'),
+        'crop_confidence': float(analysis_result.get('crop_confidence', 0.0)),
+        'status': analysis_result.get('status', 'failed')
+    }
+    if top_k:
+        response_data['top_classes'] = top_classes(analysis_result, top_k)
+    if fields is not None and 'crop_probabilities' in fields:
+        response_data['crop_probabilities'] = analysis_result['crop_probabilities']
+    if fields is None or fields & EXPLANATION_FIELDS:
+        with timer.stage('explanation'):
+            response_data.update(explanation_fields(
+                analysis_result['crop_type'], analysis_result['condition'], wait_for_explanation
+            ))
+    if fields is None or 'session_id' in fields:
+        # Chat about this detection goes through the session from here on
+        response_data['session_id'] = chat_sessions.start(analysis_result['crop_type'], analysis_result['condition']).id
     
-    # Check if any disease-related keyword is in the message
-    return any(keyword in message_lower for keyword in disease_keywords)
+    if fields is not None:
+        response_data = {key: value for key, value in response_data.items() if key in fields or key == 'status'}
+    return response_data, 200
 
 @app.route('/api/predict', methods=['POST'])
 def predict():
     try:
-        print("API predict endpoint called")
-        # Create temp folder if it doesn't exist
-        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+        try:
+            top_k, fields = response_options(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e), 'status': 'failed'}), 400
+        
+        # Parsing the form reads the upload straight into memory; nothing is written to disk
+        with g.timer.stage('upload_receive'):
+            file = request.files.get('image')
+            image_bytes = file.read() if file is not None else b''
         
         # Check if the 'image' key exists in request.files
-        if 'image' not in request.files:
-            print("No image file found in request")
+        if file is None:
+            logger.debug("No image file found in request")
             return jsonify({'error': 'No image file provided', 'status': 'failed'}), 400
         
-        file = request.files['image']
-        
-        # Check if a file was actually selected
-        if file.filename == '':
-            print("Empty filename received")
-            return jsonify({'error': 'No file selected', 'status': 'failed'}), 400
-        
-        # Check if the file has a valid extension
-        if not allowed_file(file.filename):
-            print(f"Invalid file type: {file.filename}")
-            return jsonify({'error': 'Invalid file type. Only image files are allowed.', 'status': 'failed'}), 400
-        
-        # Secure the filename and save the image
-        filename = secure_filename(file.filename)
-        image_path = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(image_path)
-        
-        print(f"Image saved to {image_path}, analyzing...")
+        error = upload_error(file.filename, image_bytes)
+        if error:
+            logger.debug("Rejected upload %r: %s", file.filename, error)
+            return jsonify({'error': error, 'status': 'failed'}), 400
 
         # Predict disease from the image
-        analysis_result = analyze_image(image_path)
-        if analysis_result['status'] == 'success':
-            print("\nDisease Prediction Test Results:")
-            print("-" * 30)
-            print(f"Crop Type: {analysis_result['crop_type']}")
-            print(f"Condition: {analysis_result['condition']}")
-            print(f"Confidence: {analysis_result['confidence']*100:.2f}%")
-            
-            print("\nProbabilities by crop type:")
-            for crop, prob in analysis_result['crop_probabilities'].items():
-                print(f"{crop}: {prob*100:.2f}%")
-                
-            # Generate detailed explanation for the disease
-            prompt = (
-                f"What is {analysis_result['condition']} in {analysis_result['crop_type']} plants? Please provide a detailed response covering: "
-                f"1. Disease description and symptoms "
-                f"2. Spreadability "
-                f"3. Common causes "
-                f"4. Treatment methods "
-                f"5. Prevention measures"
-            )
-            explanation = generate_response(prompt)
-            
-            # Clean up the uploaded image file after processing
-            try:
-                os.remove(image_path)
-                print(f"Temporary image removed: {image_path}")
-            except Exception as cleanup_err:
-                print(f"Warning: Failed to remove temporary image: {str(cleanup_err)}")
-            
-            # Return the prediction and explanation
-            response_data = {
-                'disease': analysis_result.get('condition', 'Unknown'),
-                'confidence': analysis_result.get('confidence', 0.0),
-                'explanation': explanation,
-                'crop_type': analysis_result.get('crop_type', 'Unknown'),
-                'crop_confidence': analysis_result.get('crop_confidence', 0.0),
-                'status': analysis_result.get('status', 'failed')
-            }
-            
-            # Ensure confidence values are float
-            if response_data['confidence'] is not None:
-                response_data['confidence'] = float(response_data['confidence'])
-            if response_data['crop_confidence'] is not None:
-                response_data['crop_confidence'] = float(response_data['crop_confidence'])
-                
-            print("Analysis complete, returning results to frontend")
-            return jsonify(response_data)
-        else:
-            # Clean up the uploaded image file
-            try:
-                os.remove(image_path)
-            except:
-                pass
-                
-            # Return the error
-            return jsonify({
-                'error': analysis_result.get('error', 'Disease detection failed'),
-                'status': 'failed'
-            }), 500
+        analysis_result = analyze_image(image_bytes, g.timer)
+        
+        response_data, status = prediction_response(
+            analysis_result, request.args.get('explanation') == 'sync', top_k, fields, g.timer
+        )
+        with g.timer.stage('serialization'):
+            response = jsonify(response_data)
+        logger.debug("Analysis complete in %.1fms", (time.perf_counter() - g.request_start) * 1000)
+        return response, status
             
+    except RequestEntityTooLarge:
+        # Let the 413 handler build the response
+        raise
     except Exception as e:
-        print(f"Error in predict endpoint: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error in predict endpoint: %s", e)
         # Catch all errors and return them
         return jsonify({
             'error': str(e),
             'status': 'failed'
         }), 500
 
+def expand_batch_uploads(uploads):
+    """
+    Turn the (filename, bytes) pairs of a batch request into the list of images to analyze.
+
+    Zip archives are unpacked in memory. Raises ValueError when the batch holds too
+    many images or the archives expand beyond the batch size limit.
+    """
+    too_many = f'Too many images. A batch can hold at most {BATCH_MAX_IMAGES} images.'
+    images = []
+    expanded_bytes = 0
+    for filename, data in uploads:
+        if not data.startswith(b'PK\x03\x04'):
+            images.append((filename, data))
+        else:
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                for entry in archive.infolist():
+                    name = entry.filename
+                    # Skip folders and the metadata macOS adds to archives
+                    if entry.is_dir() or name.startswith('__MACOSX/') or os.path.basename(name).startswith('.'):
+                        continue
+                    # Checked against the declared size before anything is decompressed
+                    expanded_bytes += entry.file_size
+                    if expanded_bytes > BATCH_MAX_BYTES:
+                        raise ValueError(f'Archive contents exceed the {BATCH_MAX_MB:g} MB batch limit')
+                    if len(images) >= BATCH_MAX_IMAGES:
+                        raise ValueError(too_many)
+                    images.append((name, archive.read(entry)))
+        if len(images) > BATCH_MAX_IMAGES:
+            raise ValueError(too_many)
+    return images
+
+def batch_prediction_lines(images, with_explanations=False, top_k=0):
+    """
+    Analyze a batch of (filename, bytes) images and yield one NDJSON line per event.
+
+    'result' lines come in completion order and carry the image's position in the
+    request. With explanations, one 'explanation' line is sent before the first
+    result of each distinct predicted class. A final 'summary' line closes the stream.
+    """
+    start = time.perf_counter()
+    succeeded = 0
+    classes = {}
+
+    def line(payload):
+        return json.dumps(payload) + '\n'
+
+    valid = []
+    for index, (filename, data) in enumerate(images):
+        error = upload_error(filename, data)
+        if error:
+            yield line({'type': 'result', 'index': index, 'filename': filename, 'status': 'failed', 'error': error})
+        else:
+            valid.append(index)
+
+    for position, analysis_result in analyze_images([images[index][1] for index in valid]):
+        index = valid[position]
+        filename = images[index][0]
+        if analysis_result['status'] != 'success':
+            yield line({
+                'type': 'result', 'index': index, 'filename': filename, 'status': 'failed',
+                'error': analysis_result.get('error', 'Disease detection failed')
+            })
+            continue
+
+        crop_type, condition = analysis_result['crop_type'], analysis_result['condition']
+        class_name = f"{crop_type}_{condition}"
+        if class_name not in classes:
+            classes[class_name] = 0
+            if with_explanations:
+                explanation = {'type': 'explanation', 'class_name': class_name,
+                               'crop_type': crop_type, 'disease': condition}
+                explanation.update(explanation_fields(crop_type, condition))
+                yield line(explanation)
+        classes[class_name] += 1
+        succeeded += 1
+
+        result = {
+            'type': 'result',
+            'index': index,
+            'filename': filename,
+            'status': 'success',
+            'class_name': class_name,
+            'disease': condition,
+            'confidence': float(analysis_result['confidence']),
+            'crop_type': crop_type,
+            'crop_confidence': float(analysis_result.get('crop_confidence', 0.0))
+        }
+        if top_k:
+            result['top_classes'] = top_classes(analysis_result, top_k)
+        yield line(result)
+
+    yield line({
+        'type': 'summary',
+        'total': len(images),
+        'succeeded': succeeded,
+        'failed': len(images) - succeeded,
+        'classes': classes,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 1)
+    })
+
+@app.route('/api/predict/batch', methods=['POST'])
+def predict_batch():
+    """
+    Analyze many images in one request: multipart files under 'images' (or 'image'),
+    and/or zip archives of images. Results are streamed as NDJSON, one line per image.
+    Pass ?explanations=1 to also receive one explanation per distinct predicted class,
+    and ?top_k= for the most likely classes of each image.
+    """
+    try:
+        top_k, _ = response_options(request.args)
+        # A survey upload is much larger than one photo
+        request.max_content_length = BATCH_MAX_BYTES
+        with g.timer.stage('upload_receive'):
+            files = request.files.getlist('images') + request.files.getlist('image')
+            uploads = [(file.filename, file.read()) for file in files]
+        if not files:
+            return jsonify({'error': 'No image files provided', 'status': 'failed'}), 400
+        images = expand_batch_uploads(uploads)
+    except RequestEntityTooLarge:
+        raise
+    except (ValueError, zipfile.BadZipFile) as e:
+        return jsonify({'error': str(e), 'status': 'failed'}), 400
+
+    logger.debug("Batch of %d images received, analyzing...", len(images))
+    with_explanations = request.args.get('explanations') in ('1', 'true')
+    return Response(batch_prediction_lines(images, with_explanations, top_k), mimetype='application/x-ndjson', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/explanations/<job_id>', methods=['GET'])
+def get_explanation(job_id):
+    """Polling endpoint for an explanation started by /api/predict."""
+    job = explanation_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired explanation id', 'status': 'failed'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/explanations/<job_id>/stream', methods=['GET'])
+def stream_explanation(job_id):
+    """Server-Sent Events stream of an explanation as it is generated."""
+    job = explanation_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired explanation id', 'status': 'failed'}), 404
+
+    def events():
+        for event, text in job.events():
+            payload = {'error': text} if event == 'error' else {'text': text}
+            yield sse_event(event, payload)
+
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+class UnknownChatSession(LookupError):
+    """The chat request names a session this process doesn't have (expired, evicted or another worker's)."""
+
+SESSION_EXPIRED_BODY = {
+    'message': 'Your chat session has expired. Please send the conversation again as context.',
+    'error': True,
+    'session_expired': True
+}
+
+def disease_from_context(context):
+    """Find the detected disease in a transcript sent by the client."""
+    for msg in context:
+        if msg.get('type') == 'bot' and 'Disease detected:' in msg.get('content', ''):
+            # Extract the disease name from the bot's response
+            return msg['content'].split('Disease detected:')[1].split('\n')[0].strip()
+    return None
+
+def chat_session_for(data):
+    """
+    The chat session of a request, or None for clients that send the whole transcript as context.
+
+    A client whose session is gone resends the transcript with the stale id, and a
+    new session is started from it. Raises UnknownChatSession if it sent no transcript.
+    """
+    session_id = data.get('session_id')
+    if not session_id:
+        return None
+    session = chat_sessions.get(session_id)
+    if session is None:
+        context = data.get('context') or []
+        disease = disease_from_context(context)
+        if not disease:
+            raise UnknownChatSession(session_id)
+        history = [(msg['type'], msg['content']) for msg in context
+                   if msg.get('type') in ('user', 'bot') and isinstance(msg.get('content'), str)]
+        session = chat_sessions.start(None, disease, history[-CHAT_HISTORY_MESSAGES:])
+    return session
+
+def chat_topic(data, session):
+    """Detected disease and crop of a chat request."""
+    # The session knows the detection; older clients send it in the transcript
+    if session is not None:
+        return session.disease, session.crop_type or 'Rice'
+    return disease_from_context(data.get('context') or []), 'Rice'
+
+def build_chat_prompt(data):
+    """
+    Work out the LLM prompt for a chat request.
+
+    Returns (prompt, None, session) for disease-related questions, or (None, reply, session)
+    when the request is answered directly without calling the LLM, from the answer cache
+    or with an apology. session is the chat session of the request, or None for clients
+    that send the transcript as context.
+    """
+    user_message = data.get('message', '')
+    session = chat_session_for(data)
+    disease, crop_type = chat_topic(data, session)
+    
+    # If no disease context was found, reply without calling the LLM
+    if not disease:
+        return None, ('I apologize, but I cannot find any disease context in our conversation. '
+                      'Please upload an image first so I can detect the disease and assist you better.'), session
+    
+    # Check if the user's message is related to the disease context
+    if not is_disease_related(user_message, disease, crop_type):
+        return None, ('I apologize, but your question doesn\'t seem to be related to the detected '
+                      f'{crop_type.lower()} plant disease ({disease}). Please ask questions about the disease, its '
+                      'symptoms, treatment, or prevention for me to help you better.'), session
+
+    # The same question, or a rewording of it, was already answered for this disease
+    cached = answer_cache.get(crop_type, disease, user_message) if answer_cache is not None else None
+    if cached is not None:
+        return None, cached, session
+        
+    # Prompt for disease-related queries
+    return f"Regarding {disease} disease in {crop_type} plants: {user_message}", None, session
+
+def chat_reply(data, session, answer, generated=False):
+    """
+    Record a finished chat turn in its session and build the response body.
+
+    generated marks answers the LLM wrote for this question, which are added to the answer cache.
+    """
+    if generated and answer_cache is not None:
+        disease, crop_type = chat_topic(data, session)
+        answer_cache.put(crop_type, disease, data.get('message', ''), answer)
+    body = {'message': answer, 'error': False}
+    if session is not None:
+        chat_sessions.add_message(session, 'user', data.get('message', ''))
+        chat_sessions.add_message(session, 'bot', answer)
+        body['session_id'] = session.id
+    return body
+
+def degraded_reply(data, session, error):
+    """
+    Response body for a chat question the LLM couldn't answer, built from the stored
+    explanation of the detected disease. None if there is no explanation to fall back on.
+    """
+    disease, crop_type = chat_topic(data, session)
+    explanation = explanations.lookup(crop_type, disease) if disease else None
+    if explanation is None:
+        return None
+    logger.warning("LLM call failed, answering from the stored %s_%s explanation: %s", crop_type, disease, error)
+    degraded_replies.inc()
+    answer = ("I can't reach the assistant right now, so here is what I know about "
+              f"{disease.replace('_', ' ')} in {crop_type.lower()} plants:\n\n{explanation}")
+    return dict(chat_reply(data, session, answer), degraded=True)
+
+def request_client():
+    """Quota key of the Flask request's client."""
+    return client_id(request.headers, request.remote_addr, CLIENT_ID_HEADER, CLIENT_ID_TRUSTED_HOPS)
+
+def llm_quota_wait(client):
+    """Seconds the client has to wait before its next LLM call; 0 (and one token taken) if it may call now."""
+    return llm_quotas.acquire(client) if llm_quotas is not None else 0
+
+def throttled_body(retry_after):
+    """Body and headers of a 429 response for a client over its LLM quota."""
+    seconds = math.ceil(retry_after)
+    return {
+        'message': f'You are asking questions faster than I can answer. Please try again in {seconds} seconds.',
+        'error': True,
+        'throttled': True,
+        'retry_after': seconds
+    }, {'Retry-After': str(seconds)}
+
+@app.route('/api/chat/sessions/<session_id>', methods=['GET'])
+def get_chat_session(session_id):
+    """The detection and recent messages of a chat session, e.g. to restore the chat after a reload."""
+    session = chat_sessions.get(session_id)
+    if session is None:
+        return jsonify(SESSION_EXPIRED_BODY), 404
+    return jsonify(session.to_dict())
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     try:
         data = request.get_json()
-        user_message = data.get('message', '')
-        context = data.get('context', [])
-        
-        # Look for the disease in the context if it's already detected
-        disease = None
-        for msg in context:
-            if msg.get('type') == 'bot' and 'Disease detected:' in msg.get('content', ''):
-                # Extract the disease name from the bot's response
-                disease = msg['content'].split('Disease detected:')[1].split('\n')[0].strip()
-                break
-        
-        # If no disease context was found, return a message with 200 status
-        if not disease:
-            return jsonify({
-                'message': 'I apologize, but I cannot find any disease context in our conversation. '
-                          'Please upload an image first so I can detect the disease and assist you better.',
-                'error': False
-            }), 200
-        
-        # Check if the user's message is related to the disease context
-        if not is_disease_related(user_message, disease):
-            return jsonify({
-                'message': 'I apologize, but your question doesn\'t seem to be related to the detected '
-                          f'rice plant disease ({disease}). Please ask questions about the disease, its '
-                          'symptoms, treatment, or prevention for me to help you better.',
-                'error': False
-            }), 200
+        prompt, reply, session = build_chat_prompt(data)
+        if reply is not None:
+            return jsonify(chat_reply(data, session, reply)), 200
+
+        wait = llm_quota_wait(request_client())
+        if wait:
+            body, headers = throttled_body(wait)
+            return jsonify(body), 429, headers
             
         # Generate a response for disease-related queries
-        prompt = f"Regarding {disease} disease in Rice plants: {user_message}"
-        response = generate_response(prompt)
-        return jsonify({
-            'message': response,
-            'error': False
-        }), 200
+        try:
+            response = generate_response(prompt)
+        except Exception as e:
+            body = degraded_reply(data, session, e)
+            if body is None:
+                raise
+            return jsonify(body), 200
+        return jsonify(chat_reply(data, session, response, generated=True)), 200
 
+    except UnknownChatSession:
+        return jsonify(SESSION_EXPIRED_BODY), 404
+    except CircuitOpenError as e:
+        return jsonify({'message': str(e), 'error': True}), 503
     except Exception as e:
-        print(f"Error in chat endpoint: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error in chat endpoint: %s", e)
         # Catch all errors and return them
         return jsonify({
             'message': str(e),
             'error': True
         }), 500
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Streaming variant of /api/chat: the answer is sent as Server-Sent Events.
+
+    Emits 'token' events while the model generates, then one 'done' event with
+    the full message (or an 'error' event). If the client disconnects, the
+    generator is closed and the upstream LLM stream is cancelled.
+    """
+    try:
+        data = request.get_json()
+        prompt, reply, session = build_chat_prompt(data)
+    except UnknownChatSession:
+        return jsonify(SESSION_EXPIRED_BODY), 404
+    except Exception as e:
+        logger.exception("Error in chat stream endpoint: %s", e)
+        return jsonify({'message': str(e), 'error': True}), 500
+
+    wait = llm_quota_wait(request_client()) if reply is None else 0
+    if wait:
+        body, headers = throttled_body(wait)
+        return jsonify(body), 429, headers
+
+    def events():
+        if reply is not None:
+            yield sse_event('done', chat_reply(data, session, reply))
+            return
+        tokens = stream_response(prompt)
+        parts = []
+        try:
+            for token in tokens:
+                parts.append(token)
+                yield sse_event('token', {'text': token})
+            yield sse_event('done', chat_reply(data, session, ''.join(parts), generated=True))
+        except Exception as e:
+            # Before the first token the stored explanation can still stand in for the answer
+            fallback = None if parts else degraded_reply(data, session, e)
+            if fallback is not None:
+                yield sse_event('done', fallback)
+            else:
+                logger.exception("Error in chat stream endpoint: %s", e)
+                yield sse_event('error', {'message': str(e), 'error': True})
+        finally:
+            # Runs on client disconnect too, which stops the upstream generation
+            tokens.close()
+
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+# Page size of /api/agricultural-professionals unless the client asks for another
+PROFESSIONALS_PAGE_SIZE = 50
+PROFESSIONALS_MAX_PAGE_SIZE = 500
+PROFESSIONALS_MAX_RADIUS_KM = 2000
+# Bounds on what /api/agricultural-professionals/map returns for a viewport
+MAP_MAX_CLUSTERS = int(os.getenv('GREENGUARD_MAP_MAX_CLUSTERS', '1024'))
+MAP_MAX_POINTS = int(os.getenv('GREENGUARD_MAP_MAX_POINTS', '1000'))
+# From this zoom level on the map gets individual professionals rather than clusters
+MAP_CLUSTER_MAX_ZOOM = int(os.getenv('GREENGUARD_MAP_CLUSTER_MAX_ZOOM', '16'))
+
+def professionals_filters(args):
+    return {
+        'expertise': args.get('expertise'),
+        'location': args.get('location'),
+        'crop_type': args.get('cropType'),
+        'keywords': args.get('keywords', '')
+    }
+
+def parse_bbox(value):
+    """
+    Parse a west,south,east,north bounding box; raises ValueError if it is invalid. west > east
+    is a box across the antimeridian, as map viewports over the Pacific send.
+    """
+    try:
+        west, south, east, north = (float(v) for v in value.split(','))
+    except ValueError:
+        raise ValueError('bbox must be west,south,east,north in degrees')
+    if not (-180 <= west <= 180 and -180 <= east <= 180 and -90 <= south <= north <= 90):
+        raise ValueError('bbox must have west and east within [-180, 180] and south <= north within [-90, 90]')
+    return west, south, east, north
+
+def parse_near(args):
+    """Parse lat, lon and radius_km into (lat, lon, radius_km), or None if lat and lon are not given."""
+    if args.get('lat') is None and args.get('lon') is None:
+        return None
+    try:
+        lat, lon = float(args.get('lat')), float(args.get('lon'))
+        radius_km = float(args.get('radius_km') or 50)
+    except (TypeError, ValueError):
+        raise ValueError('lat, lon and radius_km must be numbers')
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180 and 0 < radius_km <= PROFESSIONALS_MAX_RADIUS_KM):
+        raise ValueError(f'lat and lon must be valid coordinates and radius_km between 0 and {PROFESSIONALS_MAX_RADIUS_KM}')
+    return lat, lon, radius_km
+
+def professionals_search(path, args):
+    """
+    Run an /api/agricultural-professionals query.
+
+    Returns (professionals, headers): the body stays a plain list, and the total count and the
+    link to the next page are sent as headers. Raises ValueError for invalid paging or geo parameters.
+    """
+    try:
+        page = int(args.get('page') or 1)
+        page_size = int(args.get('page_size') or PROFESSIONALS_PAGE_SIZE)
+    except ValueError:
+        raise ValueError('page and page_size must be integers')
+    if page < 1 or not 1 <= page_size <= PROFESSIONALS_MAX_PAGE_SIZE:
+        raise ValueError(f'page must be at least 1 and page_size between 1 and {PROFESSIONALS_MAX_PAGE_SIZE}')
+
+    total, professionals = professionals_index().search(
+        bbox=parse_bbox(args['bbox']) if args.get('bbox') else None,
+        near=parse_near(args),
+        page=page,
+        page_size=page_size,
+        **professionals_filters(args)
+    )
+    headers = {
+        'X-Total-Count': str(total),
+        'Access-Control-Expose-Headers': 'X-Total-Count, Link'
+    }
+    if page * page_size < total:
+        query = urlencode(dict(args.items(), page=page + 1, page_size=page_size))
+        headers['Link'] = f'<{path}?{query}>; rel="next"'
+    return professionals, headers
+
+def professionals_map(args):
+    """
+    Run an /api/agricultural-professionals/map query: the clusters and single professionals to draw
+    for the bbox viewport at a zoom level, with the same filters as the search. Raises ValueError
+    for invalid parameters.
+    """
+    if not args.get('bbox') or args.get('zoom') is None:
+        raise ValueError('bbox and zoom are required')
+    bbox = parse_bbox(args['bbox'])
+    try:
+        zoom = int(args['zoom'])
+    except ValueError:
+        raise ValueError('zoom must be an integer')
+    if not 0 <= zoom <= 22:
+        raise ValueError('zoom must be between 0 and 22')
+
+    total, clusters, professionals = professionals_index().map_view(
+        bbox, zoom,
+        max_cells=MAP_MAX_CLUSTERS,
+        max_points=MAP_MAX_POINTS,
+        cluster_max_zoom=MAP_CLUSTER_MAX_ZOOM,
+        **professionals_filters(args)
+    )
+    return {'total': total, 'clusters': clusters, 'professionals': professionals}
+
+@app.route('/api/agricultural-professionals', methods=['GET'])
+def agricultural_professionals():
+    """
+    Professionals matching the expertise, location, cropType and keywords filters, a page at a time.
+    bbox=west,south,east,north or lat, lon and radius_km restrict them to an area.
+    """
+    try:
+        professionals, headers = professionals_search(request.path, request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(professionals), 200, headers
+
+@app.route('/api/agricultural-professionals/map', methods=['GET'])
+def agricultural_professionals_map():
+    """Clusters and professionals to draw on the map for a bbox viewport and zoom level."""
+    try:
+        return jsonify(professionals_map(request.args))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
 if __name__ == '__main__':
-    app.run(debug=False, port=5000)
\ No newline at end of file
+    # Serve right away and load the model in the background; /api/health/ready turns 200 once it is loaded
+    load_in_background()
+    logger.info("Startup completed in %.2fs, loading the model in the background", time.time() - STARTED_AT)
+    app.run(debug=False, host=os.getenv('GREENGUARD_HOST', '127.0.0.1'), port=int(os.getenv('GREENGUARD_PORT', '5000')))
\ No newline at end of file
@@ -0,0 +1,116 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+
+from metrics import REGISTRY
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class InferenceBatcher:
+    """
+    Collect single-image inference requests from many threads into batches.
+
+    A background worker takes the first pending request, then keeps collecting
+    until either max_batch_size requests are queued or max_wait_ms has passed,
+    runs one batched forward pass and hands each caller its own row.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=8, max_wait_ms=5.0, name='inference'):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._worker = None
+        self._stopping = threading.Event()
+
+        labels = {'batcher': name}
+        self.queue_depth = REGISTRY.gauge('inference_queue_depth', 'Requests waiting for a batch', labels)
+        self.batch_size = REGISTRY.histogram('inference_batch_size', 'Requests per batched forward pass',
+                                             buckets=BATCH_SIZE_BUCKETS, labels=labels)
+        self.queue_wait = REGISTRY.histogram('inference_queue_wait_seconds',
+                                             'Time a request waited in the queue before its batch ran', labels=labels)
+        self.batch_latency = REGISTRY.histogram('inference_batch_seconds',
+                                                'Time spent in one batched forward pass', labels=labels)
+
+    def start(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._stopping.clear()
+            self._worker = threading.Thread(target=self._run, name=f'{self.name}-batcher', daemon=True)
+            self._worker.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._queue.put(None)  # wake the worker
+        if self._worker is not None:
+            self._worker.join(timeout)
+
+    def submit(self, item):
+        """Queue one input (without batch dimension) and return a Future for its output row."""
+        future = Future()
+        self._queue.put((item, time.perf_counter(), future))
+        self.queue_depth.inc()
+        return future
+
+    def predict(self, item, timeout=None):
+        """Blocking helper: submit one input and wait for its output row."""
+        return self.submit(item).result(timeout)
+
+    def _collect(self):
+        """Block for the first request, then gather more until the batch is full or the wait expires."""
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is None:
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+            self.queue_depth.dec(len(batch))
+            started = time.perf_counter()
+            for _, enqueued, _ in batch:
+                self.queue_wait.observe(started - enqueued)
+            self.batch_size.observe(len(batch))
+
+            try:
+                outputs = self.predict_fn(np.stack([item for item, _, _ in batch]))
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            finally:
+                self.batch_latency.observe(time.perf_counter() - started)
+
+            for row, (_, _, future) in zip(outputs, batch):
+                future.set_result(row)
+
+    def stats(self):
+        """Summary used to tune batch size and wait time against tail latency."""
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'queue_depth': self.queue_depth.value,
+            'batch_size': self.batch_size.snapshot(),
+            'queue_wait_seconds': self.queue_wait.snapshot(),
+            'batch_seconds': self.batch_latency.snapshot()
+        }
@@ -0,0 +1,49 @@
+"""
+Micro-benchmark per-call latency of Keras model.predict against the traced
+tf.function inference path, for each traced batch size.
+
+Usage:
+    python benchmarks/bench_inference_path.py --model path/to/model.keras --calls 50
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from disease_predict import DiseasePredictor, TRACE_BATCH_SIZES
+
+
+def time_calls(fn, batch, calls):
+    fn(batch)  # exclude first-call overhead
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn(batch)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000, statistics.mean(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--model', required=True, help='Path to the .keras model')
+    parser.add_argument('--calls', type=int, default=50)
+    args = parser.parse_args()
+
+    predictor = DiseasePredictor(args.model)
+    predictor.compile_inference(TRACE_BATCH_SIZES)
+
+    print(f"{'batch':>5}  {'predict p50':>12}  {'compiled p50':>13}  {'speedup':>7}")
+    for size in TRACE_BATCH_SIZES:
+        batch = np.random.rand(size, *predictor.target_size, 3).astype(np.float32)
+        keras_p50, _ = time_calls(predictor.predict_batch_keras, batch, args.calls)
+        compiled_p50, _ = time_calls(predictor.predict_batch, batch, args.calls)
+        print(f"{size:>5}  {keras_p50:>10.2f}ms  {compiled_p50:>11.2f}ms  {keras_p50 / compiled_p50:>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
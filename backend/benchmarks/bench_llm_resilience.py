@@ -0,0 +1,172 @@
+"""
+Tail latency and error rate of LLM calls with and without the resilient client
+(llm_client.py), against a fake LLM that injects latency and errors.
+
+Each configuration sends the same number of concurrent calls:
+
+    direct   one call per request, as before the resilient client
+    retries  jittered retries
+    hedged   retries plus a hedged second request after the --hedge-percentile latency
+
+An outage phase then fails every upstream call, to compare how long callers
+wait and how many upstream requests are made with and without the circuit breaker.
+
+By default the fake LLM runs in-process. With --server the calls go through the
+real ChatGroq client to fake_llm_server.py, which needs langchain-groq.
+
+Usage:
+    python benchmarks/bench_llm_resilience.py --requests 400 --error-rate 0.1 --slow-rate 0.05
+    python benchmarks/bench_llm_resilience.py --server --json resilience.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_workers import percentile
+from fake_llm import FakeChunk, FakeLLM
+from fake_llm_server import make_server
+from llm_client import CircuitBreaker, ResilientLLM
+
+
+class CountingLLM:
+    """Counts the upstream calls made through a chat model."""
+
+    def __init__(self, llm):
+        self.llm = llm
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, messages, **kwargs):
+        with self._lock:
+            self.calls += 1
+        return self.llm.invoke(messages, **kwargs)
+
+    def stream(self, messages, **kwargs):
+        # Hedged attempts are streamed, so the slower one can be stopped
+        with self._lock:
+            self.calls += 1
+        return self.llm.stream(messages, **kwargs)
+
+
+def fake_upstream(args, error_rate, slow_rate):
+    """A chat model backed by the fake LLM, in-process or behind the fake server. Returns (llm, server)."""
+    options = dict(first_token_delay=args.first_token_delay, token_interval=args.token_interval,
+                   num_tokens=args.tokens, error_rate=error_rate, slow_rate=slow_rate, slow_delay=args.slow_delay)
+    if not args.server:
+        return FakeLLM(**options), None
+    from langchain_groq import ChatGroq
+    server = make_server(port=0, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    llm = ChatGroq(groq_api_key='fake', base_url=f'http://127.0.0.1:{server.server_address[1]}',
+                   model_name='fake', max_retries=0, timeout=args.slow_delay * 4)
+    return llm, server
+
+
+def run(llm, requests, concurrency):
+    """Send the calls; returns the latency of each and how many failed."""
+    messages = [FakeChunk('How do I treat rice blast?')]
+
+    def call(_):
+        start = time.perf_counter()
+        try:
+            llm.invoke(messages)
+            return time.perf_counter() - start, False
+        except Exception:
+            return time.perf_counter() - start, True
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, range(requests)))
+    return sorted(latency for latency, _ in results), sum(failed for _, failed in results)
+
+
+def summary(latencies, failures, requests, upstream_calls):
+    return {
+        'error_rate': failures / requests,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': latencies[-1] * 1000,
+        'upstream_calls_per_request': upstream_calls / requests,
+    }
+
+
+def print_row(name, r):
+    print(f"{name:<18} {r['error_rate'] * 100:>7.1f}% {r['p50_ms']:>9.0f} {r['p95_ms']:>9.0f} {r['p99_ms']:>9.0f} "
+          f"{r['max_ms']:>9.0f} {r['upstream_calls_per_request']:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--error-rate', type=float, default=0.1, help='Share of upstream calls that fail')
+    parser.add_argument('--slow-rate', type=float, default=0.05, help='Share of upstream calls delayed')
+    parser.add_argument('--slow-delay', type=float, default=1.0, help='Extra delay of the slow calls')
+    parser.add_argument('--first-token-delay', type=float, default=0.05)
+    parser.add_argument('--token-interval', type=float, default=0.002)
+    parser.add_argument('--tokens', type=int, default=20)
+    parser.add_argument('--retries', type=int, default=2)
+    parser.add_argument('--hedge-percentile', type=float, default=90)
+    parser.add_argument('--outage-requests', type=int, default=100)
+    parser.add_argument('--server', action='store_true', help='Call fake_llm_server.py through ChatGroq')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    configs = {
+        'direct': lambda llm: llm,
+        'retries': lambda llm: ResilientLLM(llm, retries=args.retries, backoff_base=0.05,
+                                            breaker=CircuitBreaker(failure_threshold=10 ** 9)),
+        'hedged': lambda llm: ResilientLLM(llm, retries=args.retries, backoff_base=0.05,
+                                           hedge_percentile=args.hedge_percentile, hedge_workers=args.concurrency * 2,
+                                           max_hedges=args.concurrency,
+                                           breaker=CircuitBreaker(failure_threshold=10 ** 9)),
+    }
+    print(f"{args.requests} calls, concurrency {args.concurrency}, {args.error_rate:.0%} errors, "
+          f"{args.slow_rate:.0%} slowed by {args.slow_delay:.1f}s\n")
+    header = f"{'':<18} {'errors':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'calls/req':>9}"
+    print(header)
+
+    results = {'config': vars(args), 'faults': {}, 'outage': {}}
+    for name, wrap in configs.items():
+        upstream, server = fake_upstream(args, args.error_rate, args.slow_rate)
+        counted = CountingLLM(upstream)
+        llm = wrap(counted)
+        # Latencies seen before the measured run, so the hedging delay is known from the start
+        run(llm, 50, args.concurrency)
+        counted.calls = 0
+        latencies, failures = run(llm, args.requests, args.concurrency)
+        results['faults'][name] = summary(latencies, failures, args.requests, counted.calls)
+        print_row(name, results['faults'][name])
+        if server is not None:
+            server.shutdown()
+
+    print(f"\nOutage: every upstream call fails ({args.outage_requests} calls)\n")
+    print(header)
+    outage_configs = {
+        'retries': lambda llm: ResilientLLM(llm, retries=args.retries, backoff_base=0.05,
+                                            breaker=CircuitBreaker(failure_threshold=10 ** 9)),
+        'retries+breaker': lambda llm: ResilientLLM(llm, retries=args.retries, backoff_base=0.05,
+                                                    breaker=CircuitBreaker(failure_threshold=5, reset_timeout=30)),
+    }
+    for name, wrap in outage_configs.items():
+        upstream, server = fake_upstream(args, 1.0, 0.0)
+        counted = CountingLLM(upstream)
+        latencies, failures = run(wrap(counted), args.outage_requests, args.concurrency)
+        results['outage'][name] = summary(latencies, failures, args.outage_requests, counted.calls)
+        print_row(name, results['outage'][name])
+        if server is not None:
+            server.shutdown()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
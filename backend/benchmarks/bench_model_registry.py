@@ -0,0 +1,56 @@
+"""
+Compare per-request latency of loading the model on every call (old behaviour)
+against the shared predictor registry.
+
+Usage:
+    python benchmarks/bench_model_registry.py --model path/to/model.keras --image leaf.jpg
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from disease_predict import DiseasePredictor, get_predictor
+
+
+def summarize(name, timings):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{name}: mean {statistics.mean(timings)*1000:.1f}ms, "
+          f"p50 {statistics.median(timings)*1000:.1f}ms, p95 {p95*1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--model', required=True, help='Path to the .keras model')
+    parser.add_argument('--image', required=True, help='Image used for every request')
+    parser.add_argument('--requests', type=int, default=10)
+    args = parser.parse_args()
+
+    # Before: a fresh DiseasePredictor for every request
+    per_request = []
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        DiseasePredictor(args.model).analyze_image(args.image)
+        per_request.append(time.perf_counter() - start)
+
+    # After: load once, then reuse
+    start = time.perf_counter()
+    predictor = get_predictor(args.model)
+    print(f"Registry startup: {time.perf_counter() - start:.2f}s "
+          f"(load {predictor.load_seconds:.2f}s, warmup {predictor.warmup_seconds:.2f}s)")
+    shared = []
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        predictor.analyze_image(args.image)
+        shared.append(time.perf_counter() - start)
+
+    summarize("Load per request", per_request)
+    summarize("Shared predictor", shared)
+
+
+if __name__ == '__main__':
+    main()
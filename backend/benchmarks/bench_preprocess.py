@@ -0,0 +1,93 @@
+"""
+Per-image preprocessing time and memory at common phone camera resolutions,
+comparing a full decode (the previous implementation) with draft-mode decoding
+into a preallocated float32 buffer.
+
+Peak memory is reported as the size of the decoded image held by Pillow plus
+the peak of Python/numpy allocations seen by tracemalloc.
+
+Usage:
+    python benchmarks/bench_preprocess.py --repeat 20
+"""
+import io
+import os
+import sys
+import time
+import argparse
+import statistics
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from disease_predict import TARGET_SIZE, open_image, preprocess_image, to_rgb
+
+RESOLUTIONS = {
+    '2 MP (1920x1080)': (1920, 1080),
+    '8 MP (3264x2448)': (3264, 2448),
+    '12 MP (4032x3024)': (4032, 3024),
+    '48 MP (8000x6000)': (8000, 6000),
+}
+
+
+def synthetic_photo(size):
+    """A noisy JPEG so the decoder does realistic work."""
+    width, height = size
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    noise = np.random.default_rng(0).integers(0, 40, (height, width, 3), dtype=np.uint8)
+    pixels = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def legacy_preprocess(data):
+    """The previous full-decode path: decode, resize, float copy, then divide into a new array."""
+    img = Image.open(io.BytesIO(data))
+    if img.mode == 'RGBA':
+        img = img.convert('RGB')
+    img = img.resize(TARGET_SIZE)
+    img_array = np.asarray(img, dtype=np.float32)
+    return np.expand_dims(img_array, axis=0) / 255.0
+
+
+def decoded_megabytes(data, draft):
+    img = open_image(data)
+    if draft:
+        img.draft('RGB', TARGET_SIZE)
+    img = to_rgb(img)
+    img.load()
+    return img.width * img.height * len(img.getbands()) / (1024 * 1024)
+
+
+def measure(fn, data, repeat):
+    fn(data)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(data)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings) * 1000, peak / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'resolution':<20} {'path':<8} {'ms/image':>9} {'decoded MB':>11} {'numpy peak MB':>14}")
+    for label, size in RESOLUTIONS.items():
+        data = synthetic_photo(size)
+        for name, fn, draft in (('full', legacy_preprocess, False), ('draft', preprocess_image, True)):
+            ms, peak = measure(fn, data, args.repeat)
+            print(f"{label:<20} {name:<8} {ms:>9.2f} {decoded_megabytes(data, draft):>11.1f} {peak:>14.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""
+Query latency of the professionals index (professionals.py) on synthetic
+datasets of 10^5 and 10^6 professionals, against a full scan of the records.
+
+For each size it reports the index build time and size, then the p50/p99
+latency of a mix of queries: single and combined facet filters, keywords,
+keywords with filters, a deep page, and bounding box and radius searches. The
+scan is only timed for a few queries, and its match counts are checked against
+the index. Last, it times the map view (clusters for a viewport) at a few zoom
+levels and compares its size with the number of markers it replaces.
+
+Usage:
+    python benchmarks/bench_professionals.py --sizes 100000,1000000 --json professionals.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_workers import percentile
+from geo_index import haversine_km
+from professionals import FACETS, ProfessionalIndex, tokenize
+
+EXPERTISE = [
+    "Farmer", "Agronomist", "Agricultural Officer", "Soil Scientist", "Seed Supplier", "Irrigation Expert",
+    "Organic Farming", "Pesticide Expert", "Crop Insurance Agent", "Agricultural Engineer", "Extension Worker",
+    "Veterinarian", "Animal Husbandry", "Agricultural Consultant", "Market Liaison", "Farm Equipment Supplier",
+    "Agricultural Researcher",
+]
+LOCATIONS = [
+    "Punjab", "Haryana", "Uttar Pradesh", "Maharashtra", "Karnataka", "Tamil Nadu", "Andhra Pradesh", "West Bengal",
+    "Gujarat", "Rajasthan", "Madhya Pradesh", "Bihar", "Telangana", "Kerala", "Assam", "Odisha",
+]
+CROPS = [
+    "Rice", "Wheat", "Cotton", "Sugarcane", "Maize", "Pulses", "Millets", "Oilseeds", "Vegetables", "Fruits",
+    "Spices", "Tea", "Coffee", "Jute", "Coconut", "Floriculture", "Horticulture",
+]
+FIRST_NAMES = [
+    "Sunita", "Rajesh", "Amit", "Priya", "Vikram", "Meena", "Sanjay", "Aarti", "Deepak", "Nandini", "Arjun",
+    "Kavita", "Ravi", "Anita", "Suresh", "Pooja", "Manoj", "Rekha", "Harpreet", "Gurpreet", "Lakshmi", "Venkat",
+    "Farhan", "Ayesha", "Joseph", "Mary", "Bhavesh", "Hetal", "Sourav", "Moumita",
+]
+LAST_NAMES = [
+    "Sharma", "Kumar", "Singh", "Patel", "Reddy", "Rani", "Verma", "Devi", "Gupta", "Kumari", "Nath", "Mishra",
+    "Yadav", "Joshi", "Iyer", "Nair", "Das", "Ghosh", "Khan", "Gill", "Sandhu", "Desai", "Shah", "Rao",
+]
+PLACES = [
+    "Ludhiana", "Amritsar", "Karnal", "Hisar", "Lucknow", "Varanasi", "Pune", "Nashik", "Mysuru", "Hubli",
+    "Coimbatore", "Madurai", "Guntur", "Kolkata", "Ahmedabad", "Rajkot", "Jodhpur", "Indore", "Patna", "Warangal",
+    "Thrissur", "Guwahati", "Cuttack",
+]
+INSTITUTIONS = [
+    "Krishi Vigyan Kendra", "Soil Testing Center", "Veterinary Hospital", "Agricultural Market Committee",
+    "Organic Farm Collective", "Water Conservation Institute", "Plant Protection Center", "Block Development Office",
+    "Rural Development Center", "Seed Processing Unit",
+]
+
+
+def synthetic_professionals(count, seed=0):
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        first = rng.choice(FIRST_NAMES)
+        records.append({
+            'id': f'prof{i:07d}',
+            'name': f'{first} {rng.choice(LAST_NAMES)}',
+            'expertise': rng.choice(EXPERTISE),
+            'location': rng.choice(LOCATIONS),
+            'cropSpecialization': rng.choice(CROPS),
+            'contact': f'+91 9{rng.randrange(10 ** 8, 10 ** 9)}',
+            'link': f'https://agri-connect.example.com/{first.lower()}{i}',
+            'address': f'{rng.choice(INSTITUTIONS)}, {rng.choice(PLACES)}',
+            'gender': rng.choice(('female', 'male')),
+            'lat': round(rng.uniform(8.0, 32.0), 4),
+            'lon': round(rng.uniform(69.0, 95.0), 4),
+        })
+    return records
+
+
+QUERIES = {
+    'location': dict(location='Punjab'),
+    'location+crop': dict(location='Punjab', crop_type='Rice'),
+    'all facets': dict(expertise='Agronomist', location='Punjab', crop_type='Rice'),
+    'keyword': dict(keywords='ludhiana'),
+    'keywords (prefix)': dict(keywords='soil veter'),
+    'keyword+facets': dict(keywords='sharma', location='Gujarat', crop_type='Cotton'),
+    'deep page': dict(location='Kerala', page=100),
+    'bbox': dict(bbox=(75.0, 30.0, 77.0, 32.0)),
+    'bbox+crop': dict(bbox=(75.0, 30.0, 77.0, 32.0), crop_type='Wheat'),
+    'radius 25 km': dict(near=(30.9, 75.85, 25)),
+    'radius 200 km': dict(near=(19.0, 73.0, 200), expertise='Farmer'),
+}
+
+# Viewports of the map: (bbox, zoom)
+VIEWS = {
+    'India, zoom 5': ((68.0, 6.0, 97.0, 36.0), 5),
+    'state, zoom 8': ((74.0, 29.5, 77.0, 32.5), 8),
+    'district, zoom 11': ((75.6, 30.7, 76.1, 31.0), 11),
+    'street, zoom 16': ((75.85, 30.9, 75.87, 30.91), 16),
+}
+
+
+def scan(records, expertise=None, location=None, crop_type=None, keywords='', bbox=None, near=None,
+         page=1, page_size=50):
+    """Full scan with the same matching rules as the index; returns the number of matches."""
+    wanted = {'expertise': expertise, 'location': location, 'cropType': crop_type}
+    terms = set(tokenize(keywords))
+    total = 0
+    for record in records:
+        if bbox and not (bbox[0] <= record['lon'] <= bbox[2] and bbox[1] <= record['lat'] <= bbox[3]):
+            continue
+        if near and haversine_km(near[0], near[1], record['lat'], record['lon']) > near[2]:
+            continue
+        if any(value and (record.get(FACETS[facet]) or '').lower() != value.lower()
+               for facet, value in wanted.items()):
+            continue
+        if terms:
+            words = set(tokenize(' '.join(str(record.get(field) or '') for field in
+                                          ('name', 'address', 'expertise', 'location', 'cropSpecialization'))))
+            if not any(word.startswith(term) for term in terms for word in words):
+                continue
+        total += 1
+    return total
+
+
+def time_queries(index, repeat):
+    results = {}
+    for name, query in QUERIES.items():
+        latencies = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            total, page = index.search(**query)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        results[name] = {'matches': total, 'p50_ms': percentile(latencies, 0.5) * 1000,
+                         'p99_ms': percentile(latencies, 0.99) * 1000}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='100000,1000000', help='Comma-separated dataset sizes')
+    parser.add_argument('--repeat', type=int, default=200, help='Timed runs per query')
+    parser.add_argument('--scan-queries', type=int, default=3, help='Queries also timed with a full scan')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    results = {}
+    for size in [int(s) for s in args.sizes.split(',')]:
+        records = synthetic_professionals(size)
+        start = time.perf_counter()
+        index = ProfessionalIndex(records)
+        build = time.perf_counter() - start
+        index_mb = (sum(ids.nbytes for ids in index._keyword_postings.values())
+                    + sum(ids.nbytes for postings in index._facet_postings.values() for ids in postings.values())
+                    ) / 1024 ** 2
+        print(f"\n{size:,} professionals: index built in {build:.1f}s, postings {index_mb:.1f} MB")
+
+        # Only the first run of a keyword query misses the prefix cache, so it shows up in p99 not p50
+        queries = time_queries(index, args.repeat)
+        print(f"{'query':<20} {'matches':>9} {'p50 ms':>8} {'p99 ms':>8} {'scan ms':>9}")
+        for name, query in list(QUERIES.items()):
+            row = queries[name]
+            if list(QUERIES).index(name) < args.scan_queries:
+                start = time.perf_counter()
+                expected = scan(records, **query)
+                row['scan_ms'] = (time.perf_counter() - start) * 1000
+                assert expected == row['matches'], f"{name}: scan found {expected}, index {row['matches']}"
+            scan_ms = f"{row['scan_ms']:>9.0f}" if 'scan_ms' in row else f"{'':>9}"
+            print(f"{name:<20} {row['matches']:>9,} {row['p50_ms']:>8.3f} {row['p99_ms']:>8.3f} {scan_ms}")
+
+        views = {}
+        print(f"{'map view':<20} {'in view':>9} {'items':>9} {'p50 ms':>8} {'p99 ms':>8}")
+        for name, (bbox, zoom) in VIEWS.items():
+            latencies = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                total, clusters, points = index.map_view(bbox, zoom)
+                latencies.append(time.perf_counter() - start)
+            latencies.sort()
+            views[name] = {'in_view': len(index.geo.within_bbox(*bbox)), 'items': len(clusters) + len(points),
+                           'p50_ms': percentile(latencies, 0.5) * 1000, 'p99_ms': percentile(latencies, 0.99) * 1000}
+            row = views[name]
+            print(f"{name:<20} {row['in_view']:>9,} {row['items']:>9,} {row['p50_ms']:>8.3f} {row['p99_ms']:>8.3f}")
+        results[size] = {'build_seconds': build, 'postings_mb': index_mb, 'queries': queries, 'map': views}
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Cold-start benchmark for the backend process.
+
+Each run starts a fresh interpreter and measures, in-process:
+  - the time to import backend.py and which heavy modules that pulled in,
+  - model load and warmup time,
+  - the time to the first successful prediction.
+It then starts the real server (python backend.py) and measures, over HTTP,
+when /api/health/live and /api/health/ready first answer 200 and when the
+first /api/predict succeeds.
+
+Usage:
+    python benchmarks/bench_startup.py --image leaf.jpg --runs 3 --json startup.json
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import statistics
+import subprocess
+import http.client
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in a fresh interpreter; prints one JSON line with the phase timings
+IN_PROCESS = r'''
+import sys, json, time
+start = time.perf_counter()
+import backend
+imported = time.perf_counter()
+heavy = [name for name in ('tensorflow', 'keras', 'langchain', 'langchain_groq') if name in sys.modules]
+from disease_predict import get_predictor, analyze_image
+predictor = get_predictor()
+loaded = time.perf_counter()
+with open(sys.argv[1], 'rb') as f:
+    result = analyze_image(f.read())
+predicted = time.perf_counter()
+print(json.dumps({
+    'import_s': imported - start,
+    'heavy_modules_at_import': heavy,
+    'model_load_s': predictor.load_seconds,
+    'model_warmup_s': predictor.warmup_seconds,
+    'get_predictor_s': loaded - imported,
+    'first_prediction_s': predicted - start,
+    'first_prediction_ok': result['status'] == 'success',
+}))
+'''
+
+
+def request(port, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    connection.request(method, path, body, headers or {})
+    response = connection.getresponse()
+    response.read()
+    return response.status
+
+
+def measure_in_process(image):
+    output = subprocess.run([sys.executable, '-c', IN_PROCESS, image], cwd=BACKEND_DIR,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure_server(image, port, timeout):
+    with open(image, 'rb') as f:
+        data = f.read()
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="image"; filename="{os.path.basename(image)}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n').encode() + data + f'\r\n--{boundary}--\r\n'.encode()
+    headers = {'Content-Type': f'multipart/form-data; boundary={boundary}'}
+
+    env = dict(os.environ, GREENGUARD_PORT=str(port), GREENGUARD_PREDICTION_CACHE_SIZE='0')
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, 'backend.py'], cwd=BACKEND_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    timings = {}
+    try:
+        deadline = start + timeout
+        while time.perf_counter() < deadline and 'server_first_prediction_s' not in timings:
+            try:
+                if 'server_live_s' not in timings and request(port, 'GET', '/api/health/live') == 200:
+                    timings['server_live_s'] = time.perf_counter() - start
+                if 'server_live_s' in timings and 'server_ready_s' not in timings and \
+                        request(port, 'GET', '/api/health/ready') == 200:
+                    timings['server_ready_s'] = time.perf_counter() - start
+                if 'server_ready_s' in timings and \
+                        request(port, 'POST', '/api/predict?fields=disease', body, headers) == 200:
+                    timings['server_first_prediction_s'] = time.perf_counter() - start
+            except OSError:
+                pass
+            time.sleep(0.05)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', required=True, help='Image used for the first prediction')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--port', type=int, default=5000, help='Port the server listens on')
+    parser.add_argument('--timeout', type=float, default=300.0, help='Give up on a server start after this long')
+    parser.add_argument('--skip-server', action='store_true', help='Only run the in-process measurements')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+    image = os.path.abspath(args.image)
+
+    runs = []
+    for run in range(args.runs):
+        result = measure_in_process(image)
+        if not args.skip_server:
+            result.update(measure_server(image, args.port, args.timeout))
+        runs.append(result)
+        print(f"run {run + 1}: " + ', '.join(f"{key} {value:.2f}s" for key, value in result.items()
+                                              if isinstance(value, float)))
+
+    print(f"\nheavy modules imported by 'import backend': {', '.join(runs[0]['heavy_modules_at_import']) or 'none'}")
+    print(f"{'phase':<26} {'median s':>9} {'min s':>8} {'max s':>8}")
+    summary = {}
+    for key in runs[0]:
+        values = [r[key] for r in runs if isinstance(r.get(key), float)]
+        if values:
+            summary[key] = {'median': statistics.median(values), 'min': min(values), 'max': max(values)}
+            print(f"{key:<26} {summary[key]['median']:>9.2f} {summary[key]['min']:>8.2f} {summary[key]['max']:>8.2f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'runs': runs, 'summary': summary}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
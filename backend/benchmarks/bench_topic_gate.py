@@ -0,0 +1,125 @@
+"""
+Accuracy and throughput of the chat topic gate (topic_gate.py) against the
+English keyword scan it replaced, and against scanning the same multilingual
+keywords one by one.
+
+For every language of the labeled message set it reports the false rejection
+rate (on-topic messages the gate turns away) and the false acceptance rate
+(off-topic messages that would reach the LLM), then times each gate over the
+whole set.
+
+Usage:
+    python benchmarks/bench_topic_gate.py --seconds 2 --json topic_gate.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from topic_gate import TOPIC_GATE, normalize
+
+DEFAULT_MESSAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'topic_gate_messages.json')
+
+# The keyword list of the previous is_disease_related, for comparison
+LEGACY_KEYWORDS = [
+    'disease', 'treatment', 'symptoms', 'cure', 'prevent', 'spread',
+    'control', 'causes', 'affected', 'infection', 'remedy', 'solution',
+    'manage', 'handle', 'rice', 'plant', 'crop', 'farm', 'field',
+]
+
+
+def legacy_gate(message, disease=None, crop_type=None):
+    message_lower = message.lower()
+    return any(keyword in message_lower for keyword in LEGACY_KEYWORDS)
+
+
+def linear_gate(message, disease=None, crop_type=None):
+    """The same multilingual keywords as the compiled gate, scanned one by one (no word-start check)."""
+    text = normalize(message)
+    return any(word in text for word in TOPIC_GATE.words)
+
+
+def compiled_gate(message, disease=None, crop_type=None):
+    return TOPIC_GATE.is_on_topic(message, disease, crop_type)
+
+
+GATES = {'legacy': legacy_gate, 'linear': linear_gate, 'compiled': compiled_gate}
+
+
+def rates(gate, messages, disease, crop_type):
+    """False rejection and false acceptance rate per language."""
+    result = {}
+    for language, sets in messages.items():
+        rejected = [m for m in sets['on_topic'] if not gate(m, disease, crop_type)]
+        accepted = [m for m in sets['off_topic'] if gate(m, disease, crop_type)]
+        result[language] = {
+            'false_rejection_rate': len(rejected) / len(sets['on_topic']),
+            'false_acceptance_rate': len(accepted) / len(sets['off_topic']),
+            'rejected': rejected,
+            'accepted': accepted,
+        }
+    return result
+
+
+def throughput(gate, texts, seconds, disease, crop_type):
+    """Messages checked per second, over repeated passes through the set."""
+    checked = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for text in texts:
+            gate(text, disease, crop_type)
+        checked += len(texts)
+    return checked / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', default=DEFAULT_MESSAGES, help='Labeled messages per language')
+    parser.add_argument('--disease', default='Blast', help='Detected disease passed to the gate')
+    parser.add_argument('--crop', default='Rice', help='Detected crop passed to the gate')
+    parser.add_argument('--seconds', type=float, default=2.0, help='Timing duration per gate')
+    parser.add_argument('--verbose', action='store_true', help='List the misclassified messages')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    with open(args.messages, encoding='utf-8') as f:
+        messages = json.load(f)
+    texts = [m for sets in messages.values() for m in sets['on_topic'] + sets['off_topic']]
+    print(f"{len(texts)} messages in {len(messages)} languages; compiled gate has {TOPIC_GATE.size} keywords\n")
+
+    results = {}
+    for name, gate in GATES.items():
+        results[name] = {
+            'languages': rates(gate, messages, args.disease, args.crop),
+            'messages_per_second': throughput(gate, texts, args.seconds, args.disease, args.crop),
+        }
+
+    print(f"{'language':<9} " + ' '.join(f"{name + ' FRR':>13} {name + ' FAR':>13}" for name in GATES))
+    for language in messages:
+        row = []
+        for name in GATES:
+            r = results[name]['languages'][language]
+            row.append(f"{r['false_rejection_rate'] * 100:>12.0f}% {r['false_acceptance_rate'] * 100:>12.0f}%")
+        print(f"{language:<9} " + ' '.join(row))
+    print()
+    for name in GATES:
+        print(f"{name:<9} {results[name]['messages_per_second']:>12,.0f} messages/s")
+
+    if args.verbose:
+        for name in GATES:
+            for language, r in results[name]['languages'].items():
+                for message in r['rejected']:
+                    print(f"[{name}] {language} rejected: {message}")
+                for message in r['accepted']:
+                    print(f"[{name}] {language} accepted: {message}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
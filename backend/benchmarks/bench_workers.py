@@ -0,0 +1,144 @@
+"""
+Throughput scaling of the pre-fork server from 1 to N workers.
+
+Starts prefork.py once per worker count and drives /api/predict with concurrent
+clients for a fixed time. The prediction cache is turned off and explanations are
+not requested, so every request is a full decode and forward pass.
+
+Usage:
+    python benchmarks/bench_workers.py --image leaf.jpg --workers 1,2,4,8 \\
+        --affinity auto --duration 20 --json workers.json
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import threading
+import subprocess
+import http.client
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def multipart_body(filename, data):
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="image"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n').encode() + data + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def wait_until_ready(port, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            connection.request('GET', '/api/health')
+            if connection.getresponse().status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def run_load(port, body, content_type, clients, duration):
+    """Send requests from `clients` threads for `duration` seconds; return latencies and error count."""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                connection.request('POST', '/api/predict?fields=disease,confidence', body,
+                                   {'Content-Type': content_type})
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == 200
+                connection.close()
+            except OSError:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), errors[0]
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(len(values) * q))] if values else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', required=True, help='Image sent with every request')
+    parser.add_argument('--workers', default='1,2,4', help='Comma-separated worker counts to test')
+    parser.add_argument('--clients', type=int, default=0, help='Concurrent clients (default: 4 per worker)')
+    parser.add_argument('--duration', type=float, default=15.0, help='Seconds of load per worker count')
+    parser.add_argument('--affinity', default='', help="GREENGUARD_CPU_AFFINITY for the server ('' or 'auto')")
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--startup-timeout', type=float, default=300.0)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    with open(args.image, 'rb') as f:
+        body, content_type = multipart_body(os.path.basename(args.image), f.read())
+
+    results = []
+    for workers in [int(w) for w in args.workers.split(',')]:
+        env = dict(os.environ,
+                   GREENGUARD_WORKERS=str(workers),
+                   GREENGUARD_PORT=str(args.port),
+                   GREENGUARD_CPU_AFFINITY=args.affinity,
+                   GREENGUARD_PREDICTION_CACHE_SIZE='0')
+        server = subprocess.Popen([sys.executable, 'prefork.py'], cwd=BACKEND_DIR, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_until_ready(args.port, args.startup_timeout):
+                raise SystemExit(f"Server with {workers} workers did not become ready")
+            # Give every worker time to finish loading; health answers as soon as one is up
+            time.sleep(2.0)
+            clients = args.clients or 4 * workers
+            latencies, errors = run_load(args.port, body, content_type, clients, args.duration)
+        finally:
+            server.terminate()
+            server.wait(timeout=60)
+
+        results.append({
+            'workers': workers,
+            'clients': clients,
+            'requests': len(latencies),
+            'errors': errors,
+            'throughput_rps': len(latencies) / args.duration,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+        })
+
+    base = results[0]['throughput_rps'] / results[0]['workers'] if results and results[0]['throughput_rps'] else None
+    print(f"{'workers':>7} {'clients':>7} {'req/s':>8} {'scaling':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for r in results:
+        r['scaling_efficiency'] = r['throughput_rps'] / (base * r['workers']) if base else None
+        efficiency = f"{r['scaling_efficiency']*100:.0f}%" if base else '-'
+        print(f"{r['workers']:>7} {r['clients']:>7} {r['throughput_rps']:>8.1f} {efficiency:>8} "
+              f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['errors']:>6}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
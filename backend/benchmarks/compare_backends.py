@@ -0,0 +1,105 @@
+"""
+Accuracy-versus-latency report for the available inference backends.
+
+The labeled folder must contain one sub-folder per class, named like the
+entries of DiseasePredictor.class_indices (e.g. data/val/Rice_Blast/*.jpg).
+
+Usage:
+    python benchmarks/compare_backends.py --data data/val \\
+        --backend keras=models/adgf_combinedagain60.keras \\
+        --backend tflite=models/disease_fp16.tflite \\
+        --backend tflite=models/disease_int8.tflite \\
+        --json report.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from disease_predict import DiseasePredictor, preprocess_image
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif')
+
+
+def load_labeled_images(data_dir, class_names):
+    """Return (preprocessed_image, label_index) pairs for every image in a known class folder."""
+    label_of = {name: index for index, name in enumerate(class_names)}
+    samples = []
+    for class_name in sorted(os.listdir(data_dir)):
+        class_dir = os.path.join(data_dir, class_name)
+        if class_name not in label_of or not os.path.isdir(class_dir):
+            continue
+        for name in sorted(os.listdir(class_dir)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                samples.append((preprocess_image(os.path.join(class_dir, name)), label_of[class_name]))
+    return samples
+
+
+def evaluate(predictor, samples, reference=None):
+    timings, predicted = [], []
+    for image, _ in samples:
+        start = time.perf_counter()
+        row = predictor.predict_batch(image)[0]
+        timings.append(time.perf_counter() - start)
+        predicted.append(int(np.argmax(row)))
+
+    labels = [label for _, label in samples]
+    timings_ms = sorted(t * 1000 for t in timings)
+    report = {
+        'accuracy': float(np.mean(np.equal(predicted, labels))),
+        'latency_ms_mean': statistics.mean(timings_ms),
+        'latency_ms_p50': statistics.median(timings_ms),
+        'latency_ms_p95': timings_ms[min(len(timings_ms) - 1, int(len(timings_ms) * 0.95))],
+        'load_seconds': predictor.load_seconds,
+    }
+    if reference is not None:
+        report['agreement_with_first'] = float(np.mean(np.equal(predicted, reference)))
+    return report, predicted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', required=True, help='Folder with one sub-folder of images per class')
+    parser.add_argument('--backend', action='append', required=True, metavar='NAME=PATH',
+                        help='Backend to evaluate (keras, tflite or onnx) and its model file; repeatable')
+    parser.add_argument('--json', help='Also write the report to this file')
+    args = parser.parse_args()
+
+    results = []
+    samples = None
+    reference = None
+    for spec in args.backend:
+        backend, path = spec.split('=', 1)
+        predictor = DiseasePredictor(path, backend=backend)
+        predictor.warmup()
+        if samples is None:
+            class_names = [predictor.class_indices[i] for i in range(len(predictor.class_indices))]
+            samples = load_labeled_images(args.data, class_names)
+            if not samples:
+                raise SystemExit(f"No labeled images found under {args.data}")
+            print(f"Evaluating {len(samples)} images")
+        report, predicted = evaluate(predictor, samples, reference)
+        if reference is None:
+            reference = predicted
+        report.update({'backend': backend, 'model': path, 'size_mb': os.path.getsize(path) / (1024 * 1024)})
+        results.append(report)
+
+    print(f"{'backend':<8} {'size MB':>8} {'accuracy':>9} {'agree':>7} {'p50 ms':>8} {'p95 ms':>8}  model")
+    for r in results:
+        print(f"{r['backend']:<8} {r['size_mb']:>8.1f} {r['accuracy']*100:>8.2f}% "
+              f"{r.get('agreement_with_first', 1.0)*100:>6.1f}% {r['latency_ms_p50']:>8.2f} "
+              f"{r['latency_ms_p95']:>8.2f}  {r['model']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
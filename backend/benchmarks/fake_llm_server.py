@@ -0,0 +1,137 @@
+"""
+Local fake of the Groq chat completions API, with injected latency and errors.
+
+It speaks the OpenAI-compatible protocol the Groq client uses (plain and
+streamed responses), generating tokens with the FakeLLM schedule. Point the
+backend at it to test retries, hedging and the circuit breaker with the real
+ChatGroq client:
+
+    python benchmarks/fake_llm_server.py --port 8090 --error-rate 0.2 --slow-rate 0.05
+    GROQ_API_BASE=http://127.0.0.1:8090 GROQ_API_KEY=fake python backend.py
+
+Injected errors are returned as HTTP --error-status responses before any token.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_llm import FakeChunk, FakeLLM, FakeLLMError
+
+COMPLETION_PATHS = ('/openai/v1/chat/completions', '/v1/chat/completions')
+
+
+def completion_chunk(completion_id, model, delta, finish_reason=None):
+    return {
+        'id': completion_id,
+        'object': 'chat.completion.chunk',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+    }
+
+
+class FakeCompletionsHandler(BaseHTTPRequestHandler):
+    llm = None
+    error_status = 503
+
+    def do_POST(self):
+        if self.path not in COMPLETION_PATHS:
+            return self.send_json(404, {'error': {'message': f'Unknown path {self.path}'}})
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        messages = [FakeChunk(message.get('content', '')) for message in request.get('messages', [])]
+        model = request.get('model', 'fake')
+        tokens = self.llm.stream(messages)
+        try:
+            first = next(tokens, None)
+        except FakeLLMError as e:
+            return self.send_json(self.error_status, {'error': {'message': str(e), 'type': 'internal_server_error'}})
+
+        completion_id = f'chatcmpl-{uuid.uuid4().hex}'
+        if not request.get('stream'):
+            chunks = ([first] if first is not None else []) + list(tokens)
+            text = ''.join(chunk.content for chunk in chunks)
+            return self.send_json(200, {
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': len(chunks), 'total_tokens': len(chunks)}
+            })
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        try:
+            self.send_event(completion_chunk(completion_id, model, {'role': 'assistant', 'content': ''}))
+            if first is not None:
+                self.send_event(completion_chunk(completion_id, model, {'content': first.content}))
+            for chunk in tokens:
+                self.send_event(completion_chunk(completion_id, model, {'content': chunk.content}))
+            self.send_event(completion_chunk(completion_id, model, {}, 'stop'))
+            self.wfile.write(b'data: [DONE]\n\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up, e.g. the losing side of a hedged request
+            pass
+        finally:
+            tokens.close()
+
+    def send_event(self, data):
+        self.wfile.write(f'data: {json.dumps(data)}\n\n'.encode())
+        self.wfile.flush()
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host='127.0.0.1', port=8090, error_status=503, **llm_options):
+    """A ready-to-serve fake server; llm_options are passed to FakeLLM."""
+    handler = type('Handler', (FakeCompletionsHandler,), {
+        'llm': FakeLLM(**llm_options),
+        'error_status': error_status
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--first-token-delay', type=float, default=0.2)
+    parser.add_argument('--token-interval', type=float, default=0.02)
+    parser.add_argument('--tokens', type=int, default=50)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with an error')
+    parser.add_argument('--error-status', type=int, default=503, help='HTTP status of the injected errors')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='Share of requests delayed by --slow-delay')
+    parser.add_argument('--slow-delay', type=float, default=5.0)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.error_status, first_token_delay=args.first_token_delay,
+                         token_interval=args.token_interval, num_tokens=args.tokens, error_rate=args.error_rate,
+                         slow_rate=args.slow_rate, slow_delay=args.slow_delay)
+    print(f"Fake LLM server on http://{args.host}:{args.port} "
+          f"(error rate {args.error_rate:.0%}, slow rate {args.slow_rate:.0%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,335 @@
+"""
+Offline load test of the prediction and chat APIs.
+
+Starts the backend with the stand-in model from standin_model.py and the fake
+LLM from fake_llm.py, so neither the real model file nor a Groq key is needed.
+Each endpoint is then driven by concurrent clients for a fixed time. The report
+has throughput and p50/p95/p99 latency per endpoint, time to first token for the
+streaming chat, and the server's own stage histograms from /api/metrics for each
+phase. Results are written as JSON so runs on different commits can be compared.
+
+Usage:
+    python benchmarks/load_test.py --duration 20 --concurrency 8 --json results/new.json
+    python benchmarks/load_test.py --json results/new.json --compare results/old.json
+    python benchmarks/load_test.py --url http://127.0.0.1:5000 --endpoints chat   # existing server
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import http.client
+import statistics
+from urllib.parse import urlparse
+
+from bench_workers import multipart_body, percentile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+
+SERVERS = {
+    'flask': lambda port: [sys.executable, 'backend.py'],
+    'asgi': lambda port: [sys.executable, '-m', 'uvicorn', 'asgi_app:app', '--port', str(port), '--log-level', 'warning'],
+    'prefork': lambda port: [sys.executable, 'prefork.py'],
+}
+
+CHAT_BODY = json.dumps({
+    'message': 'What is the treatment for this disease?',
+    'context': [{'type': 'bot', 'content': 'Disease detected: Blast\nConfidence: 91%'}]
+}).encode()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def get_json(host, port, path):
+    connection = http.client.HTTPConnection(host, port, timeout=10)
+    connection.request('GET', path)
+    response = connection.getresponse()
+    return response.status, json.loads(response.read() or b'{}')
+
+
+def wait_until_ready(host, port, timeout, server=None):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if server is not None and server.poll() is not None:
+            raise SystemExit(f"Server exited with status {server.returncode} before becoming ready")
+        try:
+            if get_json(host, port, '/api/health/ready')[0] == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.25)
+    raise SystemExit("Server did not become ready in time")
+
+
+# One request per call; each returns (ok, latency_seconds, time_to_first_token or None)
+
+def predict_request(host, port, body, content_type):
+    connection = http.client.HTTPConnection(host, port, timeout=120)
+    connection.request('POST', '/api/predict', body, {'Content-Type': content_type})
+    response = connection.getresponse()
+    response.read()
+    return response.status == 200, None
+
+
+def chat_request(host, port):
+    connection = http.client.HTTPConnection(host, port, timeout=120)
+    connection.request('POST', '/api/chat', CHAT_BODY, {'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    data = json.loads(response.read() or b'{}')
+    return response.status == 200 and not data.get('error'), None
+
+
+def chat_stream_request(host, port, start):
+    connection = http.client.HTTPConnection(host, port, timeout=120)
+    connection.request('POST', '/api/chat/stream', CHAT_BODY, {'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    first_token = None
+    ok = False
+    for line in response:
+        if first_token is None and line.startswith(b'event: token'):
+            first_token = time.perf_counter() - start
+        if line.startswith(b'event: done'):
+            ok = True
+        if line.startswith(b'event: error'):
+            break
+    return response.status == 200 and ok, first_token
+
+
+def run_phase(name, call, concurrency, duration):
+    """Run `call(start)` from `concurrency` threads for `duration` seconds."""
+    latencies, first_tokens, errors = [], [], [0]
+    lock = threading.Lock()
+    begin = time.perf_counter()
+    deadline = begin + duration
+
+    def client():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                ok, first_token = call(start)
+            except OSError:
+                ok, first_token = False, None
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                    if first_token is not None:
+                        first_tokens.append(first_token)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=client, name=f'{name}-{i}') for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - begin
+
+    latencies.sort()
+    first_tokens.sort()
+    result = {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'concurrency': concurrency,
+        'seconds': wall,
+        'throughput_rps': len(latencies) / wall if wall else 0.0,
+        'mean_ms': statistics.mean(latencies) * 1000 if latencies else None,
+        'p50_ms': percentile(latencies, 0.50) * 1000 if latencies else None,
+        'p95_ms': percentile(latencies, 0.95) * 1000 if latencies else None,
+        'p99_ms': percentile(latencies, 0.99) * 1000 if latencies else None,
+    }
+    if first_tokens:
+        result.update({
+            'ttft_p50_ms': percentile(first_tokens, 0.50) * 1000,
+            'ttft_p95_ms': percentile(first_tokens, 0.95) * 1000,
+            'ttft_p99_ms': percentile(first_tokens, 0.99) * 1000,
+        })
+    return result
+
+
+def histogram_delta(before, after):
+    """Count, mean and bucket-bound quantiles of what a histogram observed between two snapshots."""
+    count = after['count'] - (before or {}).get('count', 0)
+    if count <= 0:
+        return None
+    total = after['sum'] - (before or {}).get('sum', 0.0)
+    old_buckets = (before or {}).get('buckets', {})
+    buckets = [(float(bound), cumulative - old_buckets.get(bound, 0)) for bound, cumulative in after['buckets'].items()]
+    buckets.sort()
+
+    def quantile(q):
+        for bound, cumulative in buckets:
+            if cumulative >= q * count:
+                return None if bound == float('inf') else bound
+        return None
+
+    return {'count': count, 'mean': total / count, 'p50': quantile(0.5), 'p95': quantile(0.95), 'p99': quantile(0.99)}
+
+
+def stage_metrics(before, after):
+    """Per-phase view of every server histogram that moved during the phase."""
+    stages = {}
+    for key, value in after.items():
+        if isinstance(value, dict) and 'buckets' in value:
+            delta = histogram_delta(before.get(key), value)
+            if delta:
+                stages[key] = delta
+    return stages
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain'], cwd=BACKEND_DIR, capture_output=True,
+                                    text=True).stdout.strip())
+        return {'commit': commit, 'dirty': dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': None, 'dirty': None}
+
+
+def print_report(endpoints):
+    print(f"\n{'endpoint':<12} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ttft p50':>9} {'errors':>6}")
+    for name, r in endpoints.items():
+        def fmt(value):
+            return '-' if value is None else f"{value:.1f}"
+        print(f"{name:<12} {r['throughput_rps']:>8.1f} {fmt(r['p50_ms']):>8} {fmt(r['p95_ms']):>8} "
+              f"{fmt(r['p99_ms']):>8} {fmt(r.get('ttft_p50_ms')):>9} {r['errors']:>6}")
+        for stage, s in sorted(r.get('stages', {}).items()):
+            # Timing histograms are in seconds; others (like batch sizes) are printed as they are
+            scale, unit = (1000, ' ms') if 'seconds' in stage else (1, '')
+            p95 = '-' if s['p95'] is None else f"{s['p95'] * scale:.1f}"
+            print(f"    {stage:<58} n={s['count']:<6} mean {s['mean'] * scale:8.2f}{unit}  p95 <= {p95}{unit}")
+
+
+def compare(current, previous, tolerance):
+    """Print per-endpoint changes against a previous result file; return the regressions found."""
+    regressions = []
+    print(f"\nCompared with {previous['git'].get('commit') or 'previous run'}:")
+    for name, r in current['endpoints'].items():
+        old = previous['endpoints'].get(name)
+        if not old:
+            continue
+        for key, higher_is_better in (('throughput_rps', True), ('p50_ms', False), ('p95_ms', False), ('p99_ms', False)):
+            if not old.get(key) or r.get(key) is None:
+                continue
+            change = (r[key] - old[key]) / old[key]
+            worse = change < -tolerance if higher_is_better else change > tolerance
+            flag = '  REGRESSION' if worse else ''
+            print(f"  {name:<12} {key:<15} {old[key]:>9.1f} -> {r[key]:>9.1f} ({change * 100:+.1f}%){flag}")
+            if worse:
+                regressions.append((name, key, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices=sorted(SERVERS), default='flask', help='Serving mode to start')
+    parser.add_argument('--url', help='Load-test an already running server instead of starting one')
+    parser.add_argument('--endpoints', default='predict,chat,chat_stream', help='Comma-separated endpoints to test')
+    parser.add_argument('--duration', type=float, default=15.0, help='Seconds of load per endpoint')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients per endpoint')
+    parser.add_argument('--images', type=int, default=16, help='Distinct synthetic images to cycle through')
+    parser.add_argument('--model', help='Serve this .keras model instead of the stand-in')
+    parser.add_argument('--llm-first-token-delay', type=float, default=0.2)
+    parser.add_argument('--llm-token-interval', type=float, default=0.02)
+    parser.add_argument('--llm-tokens', type=int, default=50)
+    parser.add_argument('--llm-error-rate', type=float, default=0.0, help='Share of fake LLM calls that fail')
+    parser.add_argument('--llm-slow-rate', type=float, default=0.0, help='Share of fake LLM calls slowed down')
+    parser.add_argument('--llm-slow-delay', type=float, default=5.0)
+    parser.add_argument('--startup-timeout', type=float, default=300.0)
+    parser.add_argument('--json', help='Write the results to this file')
+    parser.add_argument('--compare', help='Previous result file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='Relative change counted as a regression')
+    parser.add_argument('--fail-on-regression', action='store_true', help='Exit with status 1 on a regression')
+    args = parser.parse_args()
+
+    from standin_model import DEFAULT_MODEL, save_standin_model, synthetic_images
+
+    server = None
+    workdir = tempfile.mkdtemp(prefix='greenguard-load-')
+    if args.url:
+        parsed = urlparse(args.url)
+        host, port = parsed.hostname, parsed.port or 80
+    else:
+        host, port = '127.0.0.1', free_port()
+        model = args.model or DEFAULT_MODEL
+        if not args.model and not os.path.exists(model):
+            print(f"Building the stand-in model at {model}")
+            save_standin_model(model)
+        env = dict(os.environ,
+                   GREENGUARD_MODEL_PATH=os.path.abspath(model),
+                   GREENGUARD_INFERENCE_BACKEND='keras',
+                   GREENGUARD_PORT=str(port),
+                   GREENGUARD_FAKE_LLM='1',
+                   GREENGUARD_FAKE_LLM_FIRST_TOKEN_DELAY=str(args.llm_first_token_delay),
+                   GREENGUARD_FAKE_LLM_TOKEN_INTERVAL=str(args.llm_token_interval),
+                   GREENGUARD_FAKE_LLM_TOKENS=str(args.llm_tokens),
+                   GREENGUARD_FAKE_LLM_ERROR_RATE=str(args.llm_error_rate),
+                   GREENGUARD_FAKE_LLM_SLOW_RATE=str(args.llm_slow_rate),
+                   GREENGUARD_FAKE_LLM_SLOW_DELAY=str(args.llm_slow_delay),
+                   # Every prediction and chat answer does the full work, and explanations start from an empty store
+                   GREENGUARD_PREDICTION_CACHE_SIZE='0',
+                   GREENGUARD_ANSWER_CACHE_SIZE='0',
+                   # All clients come from one address, so per-client LLM quotas would throttle the run
+                   GREENGUARD_LLM_QUOTA_PER_MINUTE='0',
+                   GREENGUARD_EXPLANATION_DB=os.path.join(workdir, 'explanations.db'))
+        log = open(os.path.join(workdir, 'server.log'), 'w')
+        server = subprocess.Popen(SERVERS[args.server](port), cwd=BACKEND_DIR, env=env, stdout=log, stderr=log)
+        print(f"Started {args.server} server on port {port} (log: {log.name})")
+
+    try:
+        wait_until_ready(host, port, args.startup_timeout, server)
+        images = [multipart_body(f'leaf_{i}.jpg', data) for i, data in enumerate(synthetic_images(args.images))]
+        counter = iter(range(10 ** 12))
+        calls = {
+            'predict': lambda start: predict_request(host, port, *images[next(counter) % len(images)]),
+            'chat': lambda start: chat_request(host, port),
+            'chat_stream': lambda start: chat_stream_request(host, port, start),
+        }
+
+        endpoints = {}
+        for name in args.endpoints.split(','):
+            before = get_json(host, port, '/api/metrics')[1]
+            print(f"Running {name} for {args.duration:g}s with {args.concurrency} clients")
+            endpoints[name] = run_phase(name, calls[name], args.concurrency, args.duration)
+            endpoints[name]['stages'] = stage_metrics(before, get_json(host, port, '/api/metrics')[1])
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    results = {
+        'git': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'platform': {'python': platform.python_version(), 'machine': platform.machine(), 'cpus': os.cpu_count()},
+        'config': {key: value for key, value in vars(args).items() if key not in ('json', 'compare')},
+        'endpoints': endpoints,
+    }
+    print_report(endpoints)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Deterministic local stand-ins for load testing without the real model file.
+
+  - A tiny Keras model with the same input (224x224x3) and output (one softmax
+    over labels.CLASS_NAMES) as the disease model. It goes through the same
+    AdaptiveLesionModule layer, so loading exercises the custom-object path.
+  - Synthetic leaf-like JPEG images, the same bytes for the same seed.
+
+Usage:
+    python benchmarks/standin_model.py --output benchmarks/standin/standin.keras \\
+        --images benchmarks/standin/images --count 16
+"""
+import os
+import io
+import sys
+import argparse
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from disease_predict import TARGET_SIZE
+from labels import CLASS_NAMES
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'standin')
+DEFAULT_MODEL = os.path.join(DEFAULT_DIR, 'standin.keras')
+
+
+def build_standin_model(seed=0, filters=8):
+    """Small convolutional model with the disease model's input and output shapes."""
+    import tensorflow as tf
+    from keras_model import AdaptiveLesionModule
+
+    tf.keras.utils.set_random_seed(seed)
+    inputs = tf.keras.Input(shape=(TARGET_SIZE[1], TARGET_SIZE[0], 3))
+    x = tf.keras.layers.Conv2D(filters, 3, strides=4, activation='relu')(inputs)
+    x = AdaptiveLesionModule(filters)(x)
+    x = tf.keras.layers.GlobalAveragePooling2D()(x)
+    outputs = tf.keras.layers.Dense(len(CLASS_NAMES), activation='softmax')(x)
+    return tf.keras.Model(inputs, outputs, name='standin')
+
+
+def save_standin_model(path=DEFAULT_MODEL, seed=0):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    build_standin_model(seed).save(path)
+    return path
+
+
+def synthetic_leaf(seed, size=(640, 480)):
+    """JPEG bytes of a green leaf shape with brown lesions, identical for the same seed."""
+    rng = np.random.default_rng(seed)
+    img = Image.new('RGB', size, tuple(int(v) for v in rng.integers(150, 220, 3)))
+    draw = ImageDraw.Draw(img)
+    w, h = size
+    green = (int(rng.integers(30, 80)), int(rng.integers(110, 180)), int(rng.integers(30, 70)))
+    draw.ellipse([w * 0.15, h * 0.1, w * 0.85, h * 0.9], fill=green)
+    for _ in range(int(rng.integers(3, 12))):
+        x, y = rng.uniform(0.25, 0.75) * w, rng.uniform(0.2, 0.8) * h
+        r = rng.uniform(0.01, 0.05) * w
+        draw.ellipse([x - r, y - r, x + r, y + r], fill=(int(rng.integers(90, 140)), int(rng.integers(60, 90)), 30))
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def synthetic_images(count, seed=0):
+    return [synthetic_leaf(seed + i) for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default=DEFAULT_MODEL, help='Where to save the stand-in .keras model')
+    parser.add_argument('--images', help='Also write synthetic JPEGs to this folder')
+    parser.add_argument('--count', type=int, default=16, help='Number of synthetic images')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"Saved stand-in model to {save_standin_model(args.output, args.seed)}")
+    if args.images:
+        os.makedirs(args.images, exist_ok=True)
+        for i, data in enumerate(synthetic_images(args.count, args.seed)):
+            with open(os.path.join(args.images, f'leaf_{i:03d}.jpg'), 'wb') as f:
+                f.write(data)
+        print(f"Wrote {args.count} images to {args.images}")
+
+
+if __name__ == '__main__':
+    main()
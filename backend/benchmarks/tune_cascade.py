@@ -0,0 +1,123 @@
+"""
+Choose the cascade threshold from a labeled folder.
+
+Runs the first-stage and the full model over every image once, then replays the
+cascade for a range of thresholds: images whose first-stage top-1 probability is
+below the threshold are answered by the full model. Reports accuracy, fallback
+rate and expected latency per threshold, and recommends the lowest threshold
+whose accuracy stays within --max-accuracy-drop of the full model alone.
+
+The labeled folder has the layout described in compare_backends.py.
+
+Usage:
+    python benchmarks/tune_cascade.py --data data/val \\
+        --first tflite=models/disease_int8.tflite \\
+        --full keras=models/adgf_combinedagain60.keras \\
+        --max-accuracy-drop 0.005 --json cascade.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from disease_predict import DiseasePredictor
+from labels import CLASS_NAMES
+from compare_backends import load_labeled_images
+
+DEFAULT_THRESHOLDS = [round(t, 3) for t in np.arange(0.5, 0.99, 0.02)] + [0.99, 0.995, 0.999]
+
+
+def run_model(spec, samples):
+    """Return the probability rows and the mean per-image latency (ms) of one model."""
+    backend, path = spec.split('=', 1)
+    predictor = DiseasePredictor(path, backend=backend)
+    predictor.warmup()
+    rows, timings = [], []
+    for image, _ in samples:
+        start = time.perf_counter()
+        rows.append(predictor.predict_full(image)[0])
+        timings.append(time.perf_counter() - start)
+    return np.asarray(rows, dtype=np.float32), float(np.mean(timings)) * 1000
+
+
+def sweep(first, full, labels, first_ms, full_ms, thresholds):
+    first_pred, full_pred = first.argmax(axis=1), full.argmax(axis=1)
+    confidence = first.max(axis=1)
+    results = []
+    for threshold in thresholds:
+        accepted = confidence >= threshold
+        predicted = np.where(accepted, first_pred, full_pred)
+        fallback_rate = 1.0 - float(accepted.mean())
+        results.append({
+            'threshold': threshold,
+            'accuracy': float(np.mean(predicted == labels)),
+            'fallback_rate': fallback_rate,
+            # Accuracy of each stage on the images it answers
+            'first_stage_accuracy': float(np.mean(first_pred[accepted] == labels[accepted])) if accepted.any() else None,
+            'full_stage_accuracy': float(np.mean(full_pred[~accepted] == labels[~accepted])) if (~accepted).any() else None,
+            'expected_ms': first_ms + fallback_rate * full_ms,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', required=True, help='Folder with one sub-folder of images per class')
+    parser.add_argument('--first', required=True, metavar='NAME=PATH', help='First-stage backend and model file')
+    parser.add_argument('--full', required=True, metavar='NAME=PATH', help='Full model backend and model file')
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.005,
+                        help='Largest accuracy loss versus the full model that is acceptable (fraction)')
+    parser.add_argument('--thresholds', type=lambda s: [float(t) for t in s.split(',')], default=DEFAULT_THRESHOLDS,
+                        help='Comma-separated thresholds to evaluate')
+    parser.add_argument('--json', help='Also write the report to this file')
+    args = parser.parse_args()
+
+    samples = load_labeled_images(args.data, CLASS_NAMES)
+    if not samples:
+        raise SystemExit(f"No labeled images found under {args.data}")
+    labels = np.array([label for _, label in samples])
+    print(f"Evaluating {len(samples)} images")
+
+    first, first_ms = run_model(args.first, samples)
+    full, full_ms = run_model(args.full, samples)
+    first_accuracy = float(np.mean(first.argmax(axis=1) == labels))
+    full_accuracy = float(np.mean(full.argmax(axis=1) == labels))
+    print(f"first stage alone: {first_accuracy*100:.2f}% in {first_ms:.2f} ms/image")
+    print(f"full model alone:  {full_accuracy*100:.2f}% in {full_ms:.2f} ms/image\n")
+
+    results = sweep(first, full, labels, first_ms, full_ms, args.thresholds)
+    print(f"{'threshold':>9} {'accuracy':>9} {'fallback':>9} {'first acc':>10} {'full acc':>9} {'ms/image':>9} {'speedup':>8}")
+    for r in results:
+        first_acc = '-' if r['first_stage_accuracy'] is None else f"{r['first_stage_accuracy']*100:.2f}%"
+        full_acc = '-' if r['full_stage_accuracy'] is None else f"{r['full_stage_accuracy']*100:.2f}%"
+        print(f"{r['threshold']:>9.3f} {r['accuracy']*100:>8.2f}% {r['fallback_rate']*100:>8.1f}% "
+              f"{first_acc:>10} {full_acc:>9} {r['expected_ms']:>9.2f} {full_ms / r['expected_ms']:>7.2f}x")
+
+    # Lowest threshold (fewest fallbacks) that keeps accuracy within the allowed drop
+    eligible = [r for r in results if r['accuracy'] >= full_accuracy - args.max_accuracy_drop]
+    recommended = min(eligible, key=lambda r: r['threshold']) if eligible else None
+    if recommended:
+        print(f"\nRecommended: GREENGUARD_CASCADE_THRESHOLD={recommended['threshold']:g} "
+              f"({recommended['fallback_rate']*100:.1f}% fallback, {recommended['accuracy']*100:.2f}% accuracy)")
+    else:
+        print("\nNo threshold keeps accuracy within the allowed drop; the first stage is too weak for a cascade")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'images': len(samples),
+                'first_stage': {'model': args.first, 'accuracy': first_accuracy, 'ms_per_image': first_ms},
+                'full': {'model': args.full, 'accuracy': full_accuracy, 'ms_per_image': full_ms},
+                'max_accuracy_drop': args.max_accuracy_drop,
+                'recommended_threshold': recommended['threshold'] if recommended else None,
+                'thresholds': results,
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
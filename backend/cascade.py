@@ -0,0 +1,107 @@
+import time
+import threading
+
+import numpy as np
+
+from metrics import REGISTRY
+
+# Buckets for the first stage's top-1 probability
+CONFIDENCE_BUCKETS = (0.3, 0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.98, 0.99, 1.0)
+
+
+class Cascade:
+    """
+    Two-stage inference. A small first-stage model answers the images it is
+    confident about, and only the rest are sent to the full model.
+
+    Both stages are callables mapping a (N, H, W, 3) batch to (N, classes)
+    probabilities in the same label order. A small share of the images the first
+    stage answers alone (audit_rate) is also run through the full model, so its
+    agreement with the full model can be tracked while serving.
+    """
+
+    def __init__(self, first_stage, full_stage, threshold=0.9, audit_rate=0.0, seed=None):
+        self.first_stage = first_stage
+        self.full_stage = full_stage
+        self.threshold = threshold
+        self.audit_rate = audit_rate
+        self._rng = np.random.default_rng(seed)
+        self._rng_lock = threading.Lock()
+
+        self.first_answers = REGISTRY.counter('cascade_images_total', 'Images answered by each cascade stage',
+                                              {'stage': 'first'})
+        self.full_answers = REGISTRY.counter('cascade_images_total', 'Images answered by each cascade stage',
+                                             {'stage': 'full'})
+        self.first_confidence = REGISTRY.histogram('cascade_first_stage_confidence',
+                                                   'Top-1 probability of the first stage',
+                                                   buckets=CONFIDENCE_BUCKETS)
+        self.first_seconds = REGISTRY.histogram('cascade_stage_seconds', 'Forward pass time per cascade stage',
+                                                labels={'stage': 'first'})
+        self.full_seconds = REGISTRY.histogram('cascade_stage_seconds', 'Forward pass time per cascade stage',
+                                               labels={'stage': 'full'})
+        # Agreement of the first stage with the full model, on audited images and on fallbacks
+        self.audit_agree = REGISTRY.counter('cascade_agreement_total', 'First-stage answers checked against the full model',
+                                            {'sample': 'audit', 'result': 'agree'})
+        self.audit_disagree = REGISTRY.counter('cascade_agreement_total', 'First-stage answers checked against the full model',
+                                               {'sample': 'audit', 'result': 'disagree'})
+        self.fallback_agree = REGISTRY.counter('cascade_agreement_total', 'First-stage answers checked against the full model',
+                                               {'sample': 'fallback', 'result': 'agree'})
+        self.fallback_disagree = REGISTRY.counter('cascade_agreement_total', 'First-stage answers checked against the full model',
+                                                  {'sample': 'fallback', 'result': 'disagree'})
+
+    def predict_batch(self, batch):
+        start = time.perf_counter()
+        first = np.asarray(self.first_stage(batch), dtype=np.float32)
+        self.first_seconds.observe(time.perf_counter() - start)
+
+        confidence = first.max(axis=1)
+        for value in confidence:
+            self.first_confidence.observe(float(value))
+        uncertain = confidence < self.threshold
+        audited = np.zeros_like(uncertain)
+        if self.audit_rate > 0:
+            with self._rng_lock:
+                audited = ~uncertain & (self._rng.random(len(batch)) < self.audit_rate)
+
+        self.first_answers.inc(int((~uncertain).sum()))
+        self.full_answers.inc(int(uncertain.sum()))
+        rerun = uncertain | audited
+        if not rerun.any():
+            return first
+
+        start = time.perf_counter()
+        full = np.asarray(self.full_stage(batch[rerun]), dtype=np.float32)
+        self.full_seconds.observe(time.perf_counter() - start)
+
+        agrees = first[rerun].argmax(axis=1) == full.argmax(axis=1)
+        fallback = uncertain[rerun]
+        self.fallback_agree.inc(int((agrees & fallback).sum()))
+        self.fallback_disagree.inc(int((~agrees & fallback).sum()))
+        self.audit_agree.inc(int((agrees & ~fallback).sum()))
+        self.audit_disagree.inc(int((~agrees & ~fallback).sum()))
+
+        # Audited images keep the first-stage answer, so the audit measures what clients get
+        outputs = first.copy()
+        outputs[np.flatnonzero(rerun)[fallback]] = full[fallback]
+        return outputs
+
+    def stats(self):
+        first, full = self.first_answers.value, self.full_answers.value
+        audited = self.audit_agree.value + self.audit_disagree.value
+        fallbacks = self.fallback_agree.value + self.fallback_disagree.value
+        return {
+            'threshold': self.threshold,
+            'audit_rate': self.audit_rate,
+            'images': first + full,
+            'fallback_rate': full / (first + full) if first + full else None,
+            # Share of first-stage-only answers the full model agreed with
+            'first_stage_agreement': self.audit_agree.value / audited if audited else None,
+            # How often the first stage was already right when it wasn't confident enough
+            'fallback_agreement': self.fallback_agree.value / fallbacks if fallbacks else None,
+            'first_stage_p50_ms': _ms(self.first_seconds.quantile(0.5)),
+            'full_stage_p50_ms': _ms(self.full_seconds.quantile(0.5)),
+        }
+
+
+def _ms(seconds):
+    return None if seconds is None or seconds == float('inf') else seconds * 1000
@@ -0,0 +1,106 @@
+"""
+Server-side chat sessions.
+
+A session is started by /api/predict and holds the detected crop and disease
+plus the last few chat messages, so /api/chat only needs the session id and the
+new message instead of the whole transcript. Sessions expire after a period of
+inactivity, and the least recently used ones are evicted once the store is full;
+with the history and message length limits that bounds the memory used.
+"""
+import time
+import uuid
+import threading
+from collections import OrderedDict, deque
+
+from metrics import REGISTRY
+
+
+class ChatSession:
+    """Detected crop and disease of one conversation and its most recent messages."""
+
+    def __init__(self, session_id, crop_type, disease, max_history):
+        self.id = session_id
+        self.crop_type = crop_type
+        self.disease = disease
+        self.history = deque(maxlen=max_history)
+        self.created_at = time.time()
+        self.last_used = self.created_at
+
+    def to_dict(self):
+        return {
+            'session_id': self.id,
+            'crop_type': self.crop_type,
+            'disease': self.disease,
+            'history': list(self.history),
+            'created_at': self.created_at,
+            'last_used': self.last_used
+        }
+
+
+class ChatSessionStore:
+    """In-memory sessions with an idle TTL and a maximum count (LRU eviction)."""
+
+    def __init__(self, max_sessions=10000, ttl_seconds=7200, max_history=20, max_message_chars=2000):
+        self.max_sessions = max_sessions
+        self.ttl = ttl_seconds
+        self.max_history = max_history
+        self.max_message_chars = max_message_chars
+        # Least recently used first, so expired sessions are always at the front
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.active = REGISTRY.gauge('chat_sessions_active', 'Chat sessions held in memory')
+        self.created = REGISTRY.counter('chat_sessions_created_total', 'Chat sessions started')
+        self.expired = REGISTRY.counter('chat_sessions_expired_total', 'Chat sessions dropped after the idle TTL')
+        self.evicted = REGISTRY.counter('chat_sessions_evicted_total', 'Chat sessions evicted to stay under the limit')
+
+    def start(self, crop_type, disease, history=()):
+        """Start a session for a detection, optionally seeded with earlier (role, content) messages."""
+        session = ChatSession(uuid.uuid4().hex, crop_type, disease, self.max_history)
+        for role, content in history:
+            session.history.append(self._message(role, content))
+        with self._lock:
+            self._prune()
+            while len(self._sessions) >= self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted.inc()
+            self._sessions[session.id] = session
+            self.active.set(len(self._sessions))
+        self.created.inc()
+        return session
+
+    def get(self, session_id):
+        """Return the live session with this id and mark it used, or None if it is unknown or expired."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if time.time() - session.last_used > self.ttl:
+                del self._sessions[session_id]
+                self.expired.inc()
+                self.active.set(len(self._sessions))
+                return None
+            session.last_used = time.time()
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def add_message(self, session, role, content):
+        """Append a 'user' or 'bot' message; only the last max_history messages are kept."""
+        with self._lock:
+            session.history.append(self._message(role, content))
+
+    def count(self):
+        return len(self._sessions)
+
+    def _message(self, role, content):
+        return {'type': role, 'content': content[:self.max_message_chars]}
+
+    def _prune(self):
+        """Drop sessions idle for longer than the TTL. Caller holds the lock."""
+        cutoff = time.time() - self.ttl
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.last_used > cutoff:
+                break
+            self._sessions.popitem(last=False)
+            self.expired.inc()
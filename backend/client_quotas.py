@@ -0,0 +1,68 @@
+"""
+Per-client token-bucket quotas for requests that call the LLM.
+
+Each client gets a bucket of `burst` tokens that refills at `rate` tokens per
+second, and every LLM call takes one. A client that runs dry is told how long to
+wait instead of its request reaching Groq, so one busy client can't use up the
+shared Groq rate limit. Answers served without the LLM (cached answers, stored
+explanations) don't count.
+
+Buckets of the least recently seen clients are dropped once max_clients is
+reached; a dropped client simply starts again with a full bucket.
+"""
+import time
+import threading
+from collections import OrderedDict
+
+from metrics import REGISTRY
+
+
+class ClientQuotas:
+    """Token buckets keyed by client id."""
+
+    def __init__(self, rate, burst, max_clients=100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        # client id -> [tokens, time of the last update], least recently seen first
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.throttled = REGISTRY.counter('llm_quota_throttled_total', 'LLM calls refused by a client quota')
+        self.clients = REGISTRY.gauge('llm_quota_clients', 'Clients with a quota bucket in memory')
+
+    def acquire(self, client_id):
+        """Take one token. Returns 0 if the call may go ahead, else the seconds until a token is available."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(client_id)
+            if bucket is None:
+                bucket = self._buckets[client_id] = [float(self.burst), now]
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+                self.clients.set(len(self._buckets))
+            else:
+                self._buckets.move_to_end(client_id)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+            retry_after = (1 - bucket[0]) / self.rate
+        self.throttled.inc()
+        return retry_after
+
+
+def client_id(headers, remote_addr, header=None, trusted_hops=1):
+    """
+    The id a quota is kept under. With a header like X-Forwarded-For, the address
+    trusted_hops entries from the right: each proxy appends the address it got the
+    request from, so the entries left of those come from the client and can be
+    anything. Without the header, or with fewer entries than trusted proxies, it is
+    the peer address.
+    """
+    if header and headers.get(header):
+        values = [value.strip() for value in headers.get(header).split(',')]
+        if len(values) >= trusted_hops > 0 and values[-trusted_hops]:
+            return values[-trusted_hops]
+    return remote_addr or 'unknown'
@@ -1,203 +1,532 @@
+import io
 import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from PIL import Image
-import tensorflow as tf
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing.image import img_to_array
-from tensorflow.keras.layers import Layer
+from batching import InferenceBatcher
+from cascade import Cascade
+from labels import (
+    CLASS_CONDITIONS, CLASS_CROP_INDEX, CLASS_CROPS, CLASS_NAMES, CROPS, VALID_CROPS, split_class_name
+)
+from inference_backends import create_backend
+from metrics import RequestTimer
+from prediction_cache import PredictionCache, file_fingerprint
 
-model_path = "D:/Darshan College/IPD/1. GreenGaurd/backend/models/adgf_combinedagain60.keras"
+logger = logging.getLogger(__name__)
 
-class AdaptiveLesionModule(Layer):
-    def __init__(self, filters, trainable=True, **kwargs):
-        super(AdaptiveLesionModule, self).__init__(trainable=trainable, **kwargs)
-        self.filters = filters
+# Keras model served by default; TensorFlow itself is only imported when a model is loaded
+MODEL_PATH = os.getenv('GREENGUARD_MODEL_PATH',
+                       os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'adgf_combinedagain60.keras'))
+
+# Micro-batching of concurrent requests (a max batch size of 1 disables it)
+BATCH_MAX_SIZE = int(os.getenv('GREENGUARD_BATCH_MAX_SIZE', '8'))
+BATCH_MAX_WAIT_MS = float(os.getenv('GREENGUARD_BATCH_MAX_WAIT_MS', '5'))
+
+# Cache of analysis results for byte-identical uploads (a size of 0 disables it)
+PREDICTION_CACHE_SIZE = int(os.getenv('GREENGUARD_PREDICTION_CACHE_SIZE', '1024'))
+PREDICTION_CACHE_TTL = float(os.getenv('GREENGUARD_PREDICTION_CACHE_TTL', '3600'))
+PREDICTION_CACHE_DB = os.getenv('GREENGUARD_PREDICTION_CACHE_DB', '')
+
+TARGET_SIZE = (224, 224)  # Standard input size
+
+# Cascade: a small first-stage model answers confident images; the rest go to the full model.
+# Enabled by setting the first-stage model path (backend inferred from the extension by default).
+CASCADE_MODEL_PATH = os.getenv('GREENGUARD_CASCADE_MODEL_PATH', '')
+CASCADE_BACKEND = os.getenv('GREENGUARD_CASCADE_BACKEND', '')
+CASCADE_THRESHOLD = float(os.getenv('GREENGUARD_CASCADE_THRESHOLD', '0.9'))
+# Share of first-stage answers also checked against the full model, for the agreement metrics
+CASCADE_AUDIT_RATE = float(os.getenv('GREENGUARD_CASCADE_AUDIT_RATE', '0.02'))
+
+# TensorFlow thread pools per process (0 keeps TensorFlow's default); the intra-op
+# count is also the thread count of the tflite/onnx backends
+TF_INTRA_OP_THREADS = int(os.getenv('GREENGUARD_TF_INTRA_OP_THREADS', '0'))
+TF_INTER_OP_THREADS = int(os.getenv('GREENGUARD_TF_INTER_OP_THREADS', '0'))
+
+# Threads decoding images for multi-image requests
+DECODE_WORKERS = int(os.getenv('GREENGUARD_DECODE_WORKERS', str(min(8, os.cpu_count() or 1))))
+
+# Inference engine: 'keras' serves MODEL_PATH, 'tflite'/'onnx' serve an artifact from export_model.py
+INFERENCE_BACKEND = os.getenv('GREENGUARD_INFERENCE_BACKEND', 'keras')
+EXPORTED_MODEL_PATH = os.getenv('GREENGUARD_EXPORTED_MODEL_PATH', '')
+
+# Compiled inference: batch sizes traced at startup (defaults to powers of two up to BATCH_MAX_SIZE)
+COMPILED_INFERENCE = os.getenv('GREENGUARD_COMPILED_INFERENCE', '1') == '1'
+TRACE_BATCH_SIZES = tuple(sorted({
+    int(size) for size in os.getenv('GREENGUARD_TRACE_BATCH_SIZES', '').split(',') if size.strip()
+} or {2 ** i for i in range(BATCH_MAX_SIZE.bit_length()) if 2 ** i <= BATCH_MAX_SIZE}))
+
+def open_image(source):
+    """Open an image from a file path, raw bytes, a file-like object or an existing PIL image."""
+    if isinstance(source, Image.Image):
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    return Image.open(source)
+
+def to_rgb(img):
+    """Convert an image in any PIL mode to 8-bit RGB."""
+    if img.mode == 'RGB':
+        return img
+    if img.mode.startswith('I;16'):
+        # 16-bit grayscale: rescale to 8 bits instead of letting convert() clip
+        img = Image.fromarray((np.asarray(img, dtype=np.uint16) >> 8).astype(np.uint8))
+    elif img.mode in ('I', 'F'):
+        array = np.asarray(img, dtype=np.float32)
+        low, high = float(array.min()), float(array.max())
+        scale = 255.0 / (high - low) if high > low else 0.0
+        img = Image.fromarray(((array - low) * scale).astype(np.uint8))
+    elif img.mode == 'P':
+        # Go through RGBA so palette transparency is handled like RGBA uploads
+        img = img.convert('RGBA')
+    # Covers RGBA/LA (alpha dropped), L, 1, CMYK and YCbCr
+    return img.convert('RGB')
+
+def decode_image(source, target_size=TARGET_SIZE):
+    """Open and decode an image, letting the JPEG decoder downscale by up to 8x towards target_size."""
+    try:
+        img = open_image(source)
+        if img.format == 'JPEG':
+            img.draft('RGB', target_size)
+        img.load()
+        return img
+    except Exception as e:
+        raise ValueError(f"Error decoding image: {e}")
+
+def preprocess_image(source, target_size=TARGET_SIZE, out=None):
+    """
+    Load and preprocess image for Keras model.
+
+    The normalized pixels are written into `out` when given (a float32 array
+    shaped (1, H, W, 3) or (H, W, 3)), so batch callers can fill rows of one buffer.
+    """
+    try:
+        # Load image (a no-op for images already returned by decode_image)
+        img = open_image(source)
+        
+        # Let the JPEG decoder downscale by up to 8x so large photos are never fully expanded
+        if img.format == 'JPEG':
+            img.draft('RGB', target_size)
         
-    def build(self, input_shape):
-        self.spatial_conv = tf.keras.layers.Conv2D(1, (1, 1), padding='same', activation='sigmoid')
-        self.channel_pool = tf.keras.layers.GlobalAveragePooling2D()
-        self.channel_attention = tf.keras.layers.Dense(self.filters, activation='sigmoid')
+        # Convert to RGB if needed
+        img = to_rgb(img)
         
-        super().build(input_shape)
+        # Resize, reducing by whole factors first for large images
+        img = img.resize(target_size, reducing_gap=3.0)
         
-    def call(self, inputs):
-        # Spatial attention
-        spatial_att = self.spatial_conv(inputs)
+        # Normalize to [0,1] in a single pass, straight into the float32 buffer
+        if out is None:
+            out = np.empty((1, target_size[1], target_size[0], 3), dtype=np.float32)
+        np.divide(np.asarray(img), np.float32(255.0), out=out[0] if out.ndim == 4 else out)
         
-        # Channel attention
-        channel_att = self.channel_pool(inputs)
-        channel_att = self.channel_attention(channel_att)
-        channel_att = tf.reshape(channel_att, [-1, 1, 1, self.filters])
+        return out
         
-        # Combined attention
-        return inputs * spatial_att * channel_att
-    
-    def get_config(self):
-        config = super().get_config()
-        config.update({
-            "filters": self.filters
-        })
-        return config
-
-def adaptive_focal_loss(y_true, y_pred, gamma=2.0):
-    epsilon = tf.keras.backend.epsilon()
-    y_pred = tf.clip_by_value(y_pred, epsilon, 1.0 - epsilon)
-    
-    cross_entropy = -y_true * tf.math.log(y_pred)
-    
-    pt = tf.where(y_true == 1, y_pred, 1 - y_pred)
-    difficulty_weight = tf.pow(1. - pt, gamma)
-    
-    class_weight = 1 + tf.reduce_max(y_true[:, 1:], axis=1) * 0.5
-    
-    final_loss = difficulty_weight * cross_entropy * tf.expand_dims(class_weight, -1)
-    
-    return tf.reduce_mean(final_loss)
+    except Exception as e:
+        raise ValueError(f"Error preprocessing image: {e}")
 
 class DiseasePredictor:
-    def __init__(self, model_path):
-        self.model = self.initialize_model(model_path)
-        self.target_size = (224, 224)  # Standard input size
-        self.class_indices = {
-            i: name for i, name in enumerate(['Bean_Healthy', 'Bean_Rust', 'Bean_Angular_Leaf_Spot', 
-               'Cotton_Aphids', 'Cotton_Army_worm', 'Cotton_Bacterial_Blight', 
-               'Cotton_Curl_virus', 'Cotton_Fussarium_wilt', 'Cotton_Healthy', 
-               'Cotton_Powdery_Mildew', 'Cotton_Target_spot',
-               'Groundnut_Early_leaf_spot', 'Groundnut_Early_rust', 
-               'Groundnut_Healthy_leaf', 'Groundnut_Late_leaf_spot', 
-               'Groundnut_Nutrition_deficiency', 'Groundnut_Rust',
-               'Maize_Blight', 'Maize_Common_Rust', 'Maize_Gray_Leaf_Spot', 
-               'Maize_Healthy', 'Pepper_bell_Bacterial_spot', 'Pepper_bell_Healthy',
-               'Potato_Early_Blight', 'Potato_Healthy', 'Potato_Late_Blight',  
-               'Rice_Bacterialblight', 'Rice_Blast', 'Rice_Brownspot', 'Rice_Tungro',
-               'Spinach_Anthracnose', 'Spinach_Bacterial_Spot', 'Spinach_Downy_Mildew', 
-               'Spinach_Healthy_Leaf', 'Spinach_Pest_Damage', 'Spinach_Straw_Mite',
-               'Sugarcane_Bacterial_Blights', 'Sugarcane_Brown_Rust', 
-               'Sugarcane_Dried_Leaves', 'Sugarcane_Healthy', 'Sugarcane_Mawa', 
-               'Sugarcane_Mites', 'Sugarcane_Mosaic', 'Sugarcane_Red_Spot', 
-               'Sugarcane_Yellow_Leaf', 'Tomato_Bacterial_spot', 'Tomato_Early_blight', 
-               'Tomato_healthy', 'Tomato_Late_blight', 'Tomato_Leaf_Mold', 
-               'Tomato_mosaic_virus', 'Tomato_Septoria_leaf_spot', 
-               'Tomato_Spider_mites Two-spotted_spider_mite', 'Tomato_Target_Spot', 
-               'Tomato_Yellow_Leaf_Curl_Virus', 'Turmeric_Aphids_Disease',
-               'Turmeric_Dry_Leaf', 'Turmeric_Healthy_Leaf', 'Turmeric_Leaf_Blotch', 
-               'Turmeric_Leaf_Spot', 'Turmeric_Rhizome_Rot'
-            ])
-        }
-        self.valid_crops = {'Bean','Cotton','Groundnut', 'Maize', 'Pepper','Potato','Rice', 'Spinach', 'Sugarcane', 'Tomato' ,'Turmeric'}
+    def __init__(self, model_path, backend='keras'):
+        self.model_path = model_path
+        self.backend = backend
+        # Changes whenever the model file is replaced, which invalidates cached predictions
+        self.model_version = f"{backend}-{file_fingerprint(model_path)}"
+        self.model = None
+        self.engine = None
+        start = time.perf_counter()
+        if backend == 'keras':
+            self.model = self.initialize_model(model_path)
+        else:
+            self.engine = create_backend(backend, model_path, num_threads=thread_config['intra_op'] or None)
+            logger.info("Loaded %s model from %s", backend, model_path)
+        self.load_seconds = time.perf_counter() - start
+        self.warmup_seconds = None
+        self.target_size = TARGET_SIZE
+        # Serialize access to the model across Flask request threads
+        self._lock = threading.Lock()
+        self.batcher = None
+        self.cascade = None
+        self._compiled = {}
+        self.class_indices = {i: name for i, name in enumerate(CLASS_NAMES)}
+        self.valid_crops = set(VALID_CROPS)
 
     def initialize_model(self, model_path):
         try:
-            # Define custom objects dictionary
-            custom_objects = {
-                'AdaptiveLesionModule': AdaptiveLesionModule,
-                'adaptive_focal_loss': adaptive_focal_loss
-            }
-            # Load the model with custom objects
-            model = tf.keras.models.load_model(model_path, custom_objects=custom_objects)
-            print("Model loaded successfully!")
+            # Load the model with custom objects (this is where TensorFlow gets imported)
+            apply_tensorflow_threads()
+            from keras_model import load_keras_model
+            model = load_keras_model(model_path)
+            logger.info("Model loaded successfully")
             return model
             
         except Exception as e:
             raise RuntimeError(f"Error loading model: {e}")
 
-    def preprocess_image(self, image_path):
+    def compile_inference(self, batch_sizes=TRACE_BATCH_SIZES):
+        """
+        Trace a graph-mode forward pass for each batch size.
+
+        Calling the concrete functions skips the per-call setup of model.predict
+        (data adapters, callbacks, progress bar) which dominates for small batches.
+        """
+        import tensorflow as tf
+        infer = tf.function(lambda images: self.model(images, training=False))
+        for size in batch_sizes:
+            spec = tf.TensorSpec([size, *self.target_size, 3], tf.float32)
+            self._compiled[size] = infer.get_concrete_function(spec)
+        logger.info("Traced inference for batch sizes %s", sorted(self._compiled))
+
+    def warmup(self):
+        """Run one dummy forward pass so the first real request doesn't pay for graph setup."""
+        start = time.perf_counter()
+        if COMPILED_INFERENCE and self.model is not None:
+            self.compile_inference()
+        for size in sorted(self._compiled) or [1]:
+            dummy = np.zeros((size, *self.target_size, 3), dtype=np.float32)
+            self.predict_batch(dummy)
+        self.warmup_seconds = time.perf_counter() - start
+        logger.info("Model warmed up in %.2fs", self.warmup_seconds)
+
+    def enable_batching(self, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS):
+        """Route single-image predictions through a shared micro-batching queue."""
+        if self.batcher is None:
+            self.batcher = InferenceBatcher(self.predict_batch, max_batch_size, max_wait_ms).start()
+        return self.batcher
+
+    def enable_cascade(self, first_stage, threshold=CASCADE_THRESHOLD, audit_rate=CASCADE_AUDIT_RATE):
+        """Answer confident images with a smaller first-stage DiseasePredictor and fall back to this model."""
+        self.cascade = Cascade(first_stage.predict_batch, self.predict_full, threshold, audit_rate)
+        # Cached results depend on the first stage and the threshold too
+        self.model_version = f"{self.model_version}+{first_stage.model_version}@{threshold:g}"
+        logger.info("Cascade enabled: %s model %s, threshold %g", first_stage.backend, first_stage.model_path, threshold)
+        return self.cascade
+
+    def predict_batch(self, batch):
+        """Return the (N, classes) probabilities for a (N, H, W, 3) batch, through the cascade if enabled."""
+        if self.cascade is not None:
+            return self.cascade.predict_batch(batch)
+        return self.predict_full(batch)
+
+    def predict_full(self, batch):
+        """Run one forward pass of this model over a (N, H, W, 3) batch."""
+        if self.engine is not None:
+            return self.engine.predict_batch(batch)
+
+        count = len(batch)
+        # Smallest traced batch size that fits; pad with zeros and drop the extra rows
+        size = next((size for size in sorted(self._compiled) if size >= count), None)
+        if size is not None:
+            if size > count:
+                padding = np.zeros((size - count, *batch.shape[1:]), dtype=np.float32)
+                batch = np.concatenate([batch, padding])
+            import tensorflow as tf
+            outputs = self._compiled[size](tf.constant(batch, dtype=tf.float32))
+            return outputs.numpy()[:count]
+
+        # Fall back to Keras for batch sizes that weren't traced
+        return self.predict_batch_keras(batch)
+
+    def predict_batch_keras(self, batch):
+        """Run the batch through model.predict; also the baseline for benchmarking the compiled path."""
+        with self._lock:
+            return self.model.predict(batch, verbose=0)
+
+    def predict_one(self, preprocessed_image):
+        """Return the probability row for a single preprocessed (1, H, W, 3) image."""
+        if self.batcher is not None:
+            return self.batcher.predict(preprocessed_image[0])
+        return self.predict_batch(preprocessed_image)[0]
+
+    def preprocess_image(self, image, out=None):
         """
         Load and preprocess image for Keras model.
         """
-        try:
-            # Load image
-            img = Image.open(image_path)
-            
-            # Convert to RGB if needed
-            if img.mode == 'RGBA':
-                img = img.convert('RGB')
-            
-            # Resize
-            img = img.resize(self.target_size)
-            
-            # Convert to array and preprocess
-            img_array = img_to_array(img)
-            
-            # Expand dimensions for batch
-            img_array = np.expand_dims(img_array, axis=0)
-            
-            # Normalize to [0,1]
-            img_array = img_array / 255.0
-            
-            return img_array
-            
-        except Exception as e:
-            raise ValueError(f"Error preprocessing image: {e}")
+        return preprocess_image(image, self.target_size, out)
 
     def get_crop_and_condition(self, class_name):
         """Extract crop type and condition from the full class name."""
-        parts = class_name.split('_')
-        crop = parts[0]
-        condition = '_'.join(parts[1:])
-        return crop, condition
+        return split_class_name(class_name)
+
+    def interpret_predictions(self, predictions):
+        """Turn one row of class probabilities into the analysis result dict."""
+        predictions = np.asarray(predictions, dtype=np.float32)
+
+        # Get the class with highest probability
+        predicted_class_index = int(np.argmax(predictions))
+        crop_type = CLASS_CROPS[predicted_class_index]
+        condition = CLASS_CONDITIONS[predicted_class_index]
+        
+        # Sum the class probabilities of each crop in one pass over the precomputed crop indices
+        crop_probabilities = np.bincount(CLASS_CROP_INDEX, weights=predictions, minlength=len(CROPS))
+        
+        return {
+            'status': 'success',
+            'crop_type': crop_type,
+            'condition': condition,
+            'confidence': float(predictions[predicted_class_index]),
+            'crop_confidence': float(crop_probabilities[CLASS_CROP_INDEX[predicted_class_index]]),
+            'class_probabilities': dict(zip(CLASS_NAMES, predictions.tolist())),
+            'crop_probabilities': dict(zip(CROPS, crop_probabilities.tolist()))
+        }
 
-    def analyze_image(self, image_path):
+    def analyze_image(self, image, timer=None):
         """
         Analyze an image to detect crop type and disease condition.
         
         Args:
-            image_path (str): Path to the image file
+            image (str | bytes | PIL.Image.Image): Path to the image file, encoded image bytes or a PIL image
+            timer (metrics.RequestTimer): Records the decode, preprocess and inference stages
         
         Returns:
             dict: Analysis results containing crop type, disease, and confidence levels
         """
+        timer = timer or RequestTimer()
         try:
             # Validate image path
-            if not os.path.exists(image_path):
-                raise FileNotFoundError(f"Image file not found at {image_path}")
+            if isinstance(image, str) and not os.path.exists(image):
+                raise FileNotFoundError(f"Image file not found at {image}")
 
             # Process image and get predictions
-            preprocessed_image = self.preprocess_image(image_path)
-            predictions = self.model.predict(preprocessed_image)
-            
-            # Get the class with highest probability
-            predicted_class_index = np.argmax(predictions[0])
-            predicted_class = self.class_indices[predicted_class_index]
-            confidence = float(predictions[0][predicted_class_index])
-            
-            # Extract crop type and condition
-            crop_type, condition = self.get_crop_and_condition(predicted_class)
-            
-            # Calculate probabilities for each class
-            class_probabilities = {}
-            crop_probabilities = {crop: 0.0 for crop in self.valid_crops}
+            with timer.stage('decode'):
+                image = decode_image(image, self.target_size)
+            with timer.stage('preprocess'):
+                preprocessed_image = self.preprocess_image(image)
+            with timer.stage('inference'):
+                predictions = self.predict_one(preprocessed_image)
+                result = self.interpret_predictions(predictions)
             
-            for idx, prob in enumerate(predictions[0]):
-                class_name = self.class_indices[idx]
-                class_probabilities[class_name] = float(prob)
-                crop, _ = self.get_crop_and_condition(class_name)
-                crop_probabilities[crop] += float(prob)
-            
-            result = {
-                'status': 'success',
-                'crop_type': crop_type,
-                'condition': condition,
-                'confidence': confidence,
-                'class_probabilities': class_probabilities,
-                'crop_probabilities': crop_probabilities
-            }
-            
-            print("Analysis completed successfully")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Class probabilities: %s", result['class_probabilities'])
             return result
 
         except Exception as e:
             error_msg = f"Error during analysis: {str(e)}"
-            print(error_msg)
+            logger.warning(error_msg)
             return {
                 'status': 'failed',
                 'error': error_msg
             }
 
-def analyze_image(image_path):
-    """Global function to analyze image using a new DiseasePredictor instance."""
+    def analyze_batch(self, images, batch_size=None, decode_workers=DECODE_WORKERS):
+        """
+        Analyze many images, yielding (index, result) pairs as each model batch finishes.
+
+        Images are decoded on a thread pool while the previous batch is on the model,
+        and at most two batches of decoded pixels are held in memory at a time.
+        Images that fail to decode yield a failed result without stopping the rest.
+        """
+        # Largest traced batch size, so no batch falls back to model.predict
+        batch_size = batch_size or max(self._compiled, default=max(BATCH_MAX_SIZE, 1))
+        images = iter(enumerate(images))
+        pending = deque()
+
+        with ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix='decode') as pool:
+            def fill():
+                while len(pending) < 2 * batch_size:
+                    item = next(images, None)
+                    if item is None:
+                        return
+                    index, image = item
+                    pending.append((index, pool.submit(self.preprocess_image, image)))
+
+            fill()
+            while pending:
+                indices, rows = [], []
+                while pending and len(rows) < batch_size:
+                    index, decoded = pending.popleft()
+                    try:
+                        rows.append(decoded.result()[0])
+                        indices.append(index)
+                    except Exception as e:
+                        yield index, {'status': 'failed', 'error': f"Error during analysis: {str(e)}"}
+                # Start decoding the next batch before running this one
+                fill()
+                if not rows:
+                    continue
+                try:
+                    predictions = self.predict_batch(np.stack(rows))
+                except Exception as e:
+                    for index in indices:
+                        yield index, {'status': 'failed', 'error': f"Error during analysis: {str(e)}"}
+                    continue
+                for index, row in zip(indices, predictions):
+                    yield index, self.interpret_predictions(row)
+
+# Thread pool sizes applied in this process, see configure_threads
+thread_config = {'intra_op': TF_INTRA_OP_THREADS, 'inter_op': TF_INTER_OP_THREADS, 'applied': False}
+
+def configure_threads(intra_op=None, inter_op=None):
+    """Set the thread pool sizes for this process; they apply to models loaded afterwards."""
+    if intra_op is not None:
+        thread_config['intra_op'] = intra_op
+    if inter_op is not None:
+        thread_config['inter_op'] = inter_op
+
+def apply_tensorflow_threads():
+    """Hand the thread pool sizes to TensorFlow. Runs once, before the first Keras model is loaded."""
+    if thread_config['applied']:
+        return
+    thread_config['applied'] = True
+    if not (thread_config['intra_op'] or thread_config['inter_op']):
+        return
+    import tensorflow as tf
     try:
-        predictor = DiseasePredictor(model_path)
-        return predictor.analyze_image(image_path)
+        if thread_config['intra_op']:
+            tf.config.threading.set_intra_op_parallelism_threads(thread_config['intra_op'])
+        if thread_config['inter_op']:
+            tf.config.threading.set_inter_op_parallelism_threads(thread_config['inter_op'])
+    except RuntimeError as e:
+        logger.warning("Could not set TensorFlow thread pools, TensorFlow is already initialized: %s", e)
+
+# Process-wide predictor registry, keyed by model path
+_predictors = {}
+_predictors_lock = threading.Lock()
+
+prediction_cache = None
+if PREDICTION_CACHE_SIZE > 0:
+    prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL, PREDICTION_CACHE_DB or None)
+
+def _predictor_key(path=None, backend=None):
+    backend = backend or INFERENCE_BACKEND
+    if not path:
+        path = MODEL_PATH if backend == 'keras' else EXPORTED_MODEL_PATH
+    return path, backend
+
+def model_files(path=None, backend=None):
+    """(path, backend) of every model the shared predictor loads, including the cascade's first stage."""
+    files = [_predictor_key(path, backend)]
+    if CASCADE_MODEL_PATH:
+        files.append((CASCADE_MODEL_PATH, CASCADE_BACKEND or backend_for_path(CASCADE_MODEL_PATH)))
+    return files
+
+def backend_for_path(path):
+    """Guess the inference backend of a model file from its extension."""
+    extension = os.path.splitext(path)[1].lower()
+    return {'.tflite': 'tflite', '.onnx': 'onnx'}.get(extension, 'keras')
+
+def get_predictor(path=None, backend=None):
+    """Return the shared DiseasePredictor for a model, loading and warming it up on first use."""
+    key = _predictor_key(path, backend)
+    predictor = _predictors.get(key)
+    if predictor is None:
+        with _predictors_lock:
+            # Another thread may have finished loading while we waited
+            predictor = _predictors.get(key)
+            if predictor is None:
+                predictor = DiseasePredictor(*key)
+                predictor.warmup()
+                if CASCADE_MODEL_PATH:
+                    first_stage = DiseasePredictor(*model_files(*key)[1])
+                    first_stage.warmup()
+                    predictor.enable_cascade(first_stage)
+                if BATCH_MAX_SIZE > 1:
+                    predictor.enable_batching()
+                if prediction_cache is not None:
+                    prediction_cache.set_model_version(predictor.model_version)
+                logger.info("Model ready (load %.2fs, warmup %.2fs)", predictor.load_seconds, predictor.warmup_seconds)
+                _predictors[key] = predictor
+    return predictor
+
+# Background load started by load_in_background, for the readiness endpoint
+_background_load = {'thread': None, 'error': None}
+
+def load_in_background(path=None, backend=None):
+    """Load the shared predictor on a daemon thread so the server answers liveness checks meanwhile."""
+    with _predictors_lock:
+        if _background_load['thread'] is not None:
+            return _background_load['thread']
+
+        def load():
+            start = time.perf_counter()
+            try:
+                get_predictor(path, backend)
+                logger.info("Model loaded in the background in %.2fs", time.perf_counter() - start)
+            except Exception as e:
+                _background_load['error'] = str(e)
+                logger.exception("Error loading model: %s", e)
+
+        _background_load['thread'] = threading.Thread(target=load, name='model-loader', daemon=True)
+        _background_load['thread'].start()
+        return _background_load['thread']
+
+def is_model_ready(path=None, backend=None):
+    """Check whether the model has been loaded and warmed up."""
+    return _predictor_key(path, backend) in _predictors
+
+def model_status(path=None, backend=None):
+    """Describe the loading state of the shared predictor for readiness checks."""
+    predictor = _predictors.get(_predictor_key(path, backend))
+    if predictor is None:
+        if _background_load['error']:
+            return {'ready': False, 'state': 'failed', 'error': _background_load['error']}
+        return {'ready': False, 'state': 'loading' if _background_load['thread'] else 'not_loaded'}
+    return {
+        'ready': True,
+        'state': 'ready',
+        'backend': predictor.backend,
+        'model_version': predictor.model_version,
+        'load_seconds': predictor.load_seconds,
+        'warmup_seconds': predictor.warmup_seconds,
+        'batching': predictor.batcher.stats() if predictor.batcher else None,
+        'cascade': predictor.cascade.stats() if predictor.cascade else None,
+        'threads': {'intra_op': thread_config['intra_op'], 'inter_op': thread_config['inter_op']},
+        'prediction_cache': prediction_cache.stats() if prediction_cache else None
+    }
+
+def analyze_image(image, timer=None):
+    """Global function to analyze an image path, bytes or PIL image using the shared DiseasePredictor instance."""
+    try:
+        predictor = get_predictor()
+        # Byte-identical uploads (e.g. resubmitted camera frames) are served from the cache
+        if prediction_cache is None or not isinstance(image, (bytes, bytearray)):
+            return predictor.analyze_image(image, timer)
+
+        key = prediction_cache.key(image, predictor.model_version)
+        result = prediction_cache.get(key)
+        if result is None:
+            result = predictor.analyze_image(image, timer)
+            if result['status'] == 'success':
+                prediction_cache.put(key, result)
+        return result
     except Exception as e:
-        return {'status': 'failed', 'error': str(e)}
\ No newline at end of file
+        return {'status': 'failed', 'error': str(e)}
+
+def analyze_images(images):
+    """
+    Analyze a list of images with the shared DiseasePredictor, yielding (index, result)
+    pairs in completion order. Cached results are yielded first.
+    """
+    predictor = get_predictor()
+    misses = []
+    for index, image in enumerate(images):
+        key = None
+        if prediction_cache is not None and isinstance(image, (bytes, bytearray)):
+            key = prediction_cache.key(image, predictor.model_version)
+            result = prediction_cache.get(key)
+            if result is not None:
+                yield index, result
+                continue
+        misses.append((index, image, key))
+
+    for position, result in predictor.analyze_batch([image for _, image, _ in misses]):
+        index, _, key = misses[position]
+        if key is not None and result['status'] == 'success':
+            prediction_cache.put(key, result)
+        yield index, result
+
+def top_classes(analysis_result, k):
+    """The k most likely classes of an analysis result, most likely first."""
+    # class_probabilities is always built in CLASS_NAMES order
+    probabilities = np.fromiter(analysis_result['class_probabilities'].values(), dtype=np.float32,
+                                count=len(CLASS_NAMES))
+    k = min(k, len(probabilities))
+    top = np.argpartition(probabilities, -k)[-k:]
+    top = top[np.argsort(probabilities[top])[::-1]]
+    return [{
+        'class_name': CLASS_NAMES[i],
+        'crop_type': CLASS_CROPS[i],
+        'disease': CLASS_CONDITIONS[i],
+        'probability': float(probabilities[i])
+    } for i in top]
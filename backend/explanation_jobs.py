@@ -0,0 +1,233 @@
+import time
+import uuid
+import base64
+import binascii
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+
+def make_job_id(class_name, prompt_version, created_at):
+    """
+    Job id carrying the class, prompt version and start time, so any worker can follow the
+    job through the shared explanation store: the URL-safe base64 of the class name, the
+    prompt version, the start time in hex and a random part, separated by dots.
+    """
+    name = base64.urlsafe_b64encode(class_name.encode()).decode().rstrip('=')
+    return f"{name}.{prompt_version}.{int(created_at):x}.{uuid.uuid4().hex[:16]}"
+
+
+def parse_job_id(job_id):
+    """(class name, prompt version, start time) of a job id, or None if it isn't one."""
+    parts = job_id.split('.')
+    if len(parts) != 4:
+        return None
+    name, prompt_version, created_at, _ = parts
+    try:
+        class_name = base64.urlsafe_b64decode(name + '=' * (-len(name) % 4)).decode()
+        return class_name, prompt_version, int(created_at, 16)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+class ExplanationJob:
+    """One explanation being generated in the background; text arrives in chunks."""
+
+    def __init__(self, job_id, class_name):
+        self.id = job_id
+        self.class_name = class_name
+        self.status = 'pending'
+        self.chunks = []
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._changed = threading.Condition()
+
+    @property
+    def text(self):
+        return ''.join(self.chunks)
+
+    def append(self, chunk):
+        with self._changed:
+            self.chunks.append(chunk)
+            self._changed.notify_all()
+
+    def finish(self, text=None):
+        with self._changed:
+            if text is not None:
+                self.chunks = [text]
+            self.status = 'done'
+            self.finished_at = time.time()
+            self._changed.notify_all()
+
+    def fail(self, error):
+        with self._changed:
+            self.status = 'failed'
+            self.error = str(error)
+            self.finished_at = time.time()
+            self._changed.notify_all()
+
+    def wait(self, timeout=None):
+        """Block until the job has finished or failed; returns False on timeout."""
+        with self._changed:
+            return self._changed.wait_for(lambda: self.status != 'pending', timeout)
+
+    def events(self, timeout=60.0):
+        """
+        Yield ('chunk', text) as text arrives, then ('done', full_text) or ('error', message).
+
+        Gives up with an error event if nothing changes for `timeout` seconds.
+        """
+        sent = 0
+        while True:
+            with self._changed:
+                changed = self._changed.wait_for(
+                    lambda: len(self.chunks) > sent or self.status != 'pending', timeout
+                )
+                new_chunks = self.chunks[sent:]
+                sent = len(self.chunks)
+                status = self.status
+            if not changed:
+                yield 'error', 'Timed out waiting for the explanation'
+                return
+            if status == 'pending':
+                for chunk in new_chunks:
+                    yield 'chunk', chunk
+            elif status == 'done':
+                yield 'done', self.text
+                return
+            else:
+                yield 'error', self.error
+                return
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'explanation': self.text if self.status == 'done' else None,
+            'partial': self.text if self.status == 'pending' and self.chunks else None,
+            'error': self.error
+        }
+
+
+class SharedExplanationJob(ExplanationJob):
+    """
+    A job started by another worker process, followed through the shared explanation store:
+    it is done once the explanation is stored, and pending until then for up to `timeout`
+    seconds after it started.
+    """
+
+    def __init__(self, job_id, class_name, created_at, store, timeout):
+        super().__init__(job_id, class_name)
+        self.created_at = created_at
+        self.store = store
+        self.timeout = timeout
+
+    def refresh(self):
+        """Check the store; returns False if the job can't still be running."""
+        explanation = self.store.get(self.class_name)
+        if explanation is not None:
+            self.finish(explanation)
+            return True
+        return time.time() - self.created_at < self.timeout
+
+    def events(self, timeout=60.0, poll_interval=0.5):
+        """Like ExplanationJob.events, polling the store; the text comes in one piece."""
+        deadline = time.monotonic() + timeout
+        while True:
+            if not self.refresh():
+                yield 'error', 'Unknown or expired explanation id'
+                return
+            if self.status == 'done':
+                yield 'done', self.text
+                return
+            if time.monotonic() > deadline:
+                yield 'error', 'Timed out waiting for the explanation'
+                return
+            time.sleep(poll_interval)
+
+
+class ExplanationJobs:
+    """
+    Run explanation generation on a dedicated thread pool so request threads
+    return as soon as the classification is ready.
+
+    Concurrent requests for the same class share one pending job. With a
+    stream function the text is appended to the job token by token, so
+    /api/explanations/<id>/stream and the `partial` field show it while it is
+    generated; otherwise the job gets the whole text from generate at once.
+
+    Job ids name their class, so under prefork a worker that didn't start the
+    job answers from the shared store (see SharedExplanationJob) instead of 404.
+    """
+
+    def __init__(self, store, generate, stream=None, max_workers=4, ttl_seconds=600, shared_timeout=120):
+        self.store = store
+        self.generate = generate
+        self.stream = stream
+        self.ttl = ttl_seconds
+        self.shared_timeout = shared_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='explanation')
+        self._jobs = {}
+        self._pending_by_class = {}
+        self._lock = threading.Lock()
+
+        self.submitted = REGISTRY.counter('explanation_jobs_submitted_total', 'Explanation jobs started')
+        self.shared = REGISTRY.counter('explanation_jobs_shared_total', 'Requests that joined a pending job')
+        self.failed = REGISTRY.counter('explanation_jobs_failed_total', 'Explanation jobs that failed')
+        self.duration = REGISTRY.histogram('explanation_job_seconds', 'Time to generate one explanation')
+
+    def submit(self, crop_type, condition):
+        class_name = f"{crop_type}_{condition}"
+        with self._lock:
+            self._prune()
+            job = self._pending_by_class.get(class_name)
+            if job is not None:
+                self.shared.inc()
+                return job
+            job = ExplanationJob(make_job_id(class_name, self.store.prompt_version, time.time()), class_name)
+            self._jobs[job.id] = job
+            self._pending_by_class[class_name] = job
+        self.submitted.inc()
+        self._executor.submit(self._run, job, crop_type, condition)
+        return job
+
+    def get(self, job_id):
+        """The job with this id, another worker's from the store, or None if it is unknown or expired."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        parsed = parse_job_id(job_id)
+        if parsed is None or parsed[1] != self.store.prompt_version:
+            return None
+        job = SharedExplanationJob(job_id, parsed[0], parsed[2], self.store, self.shared_timeout)
+        return job if job.refresh() else None
+
+    def _run(self, job, crop_type, condition):
+        start = time.perf_counter()
+        try:
+            if self.stream is not None:
+                job.finish(self.store.get_or_stream(crop_type, condition, self.stream, job.append))
+            else:
+                job.finish(self.store.get_or_generate(crop_type, condition, self.generate))
+        except Exception as e:
+            logger.warning("Error generating explanation for %s: %s", job.class_name, e)
+            self.failed.inc()
+            job.fail(e)
+        finally:
+            self.duration.observe(time.perf_counter() - start)
+            with self._lock:
+                if self._pending_by_class.get(job.class_name) is job:
+                    del self._pending_by_class[job.class_name]
+
+    def _prune(self):
+        """Forget finished jobs older than the TTL. Caller holds the lock."""
+        cutoff = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
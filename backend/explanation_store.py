@@ -0,0 +1,186 @@
+"""
+Persistent store of the disease explanations shown after a prediction.
+
+The explanation only depends on the predicted class and the prompt template,
+so each one is generated by the LLM once and then served from SQLite.
+
+Pre-generate every class with:
+    python explanation_store.py warm
+"""
+import os
+import time
+import hashlib
+import sqlite3
+import argparse
+import threading
+
+from labels import CLASS_NAMES, split_class_name
+from metrics import REGISTRY
+
+EXPLANATION_PROMPT = (
+    "What is {condition} in {crop_type} plants? Please provide a detailed response covering: "
+    "1. Disease description and symptoms "
+    "2. Spreadability "
+    "3. Common causes "
+    "4. Treatment methods "
+    "5. Prevention measures"
+)
+
+# Editing the template changes the version, so stale explanations are regenerated
+PROMPT_VERSION = hashlib.sha1(EXPLANATION_PROMPT.encode()).hexdigest()[:12]
+
+EXPLANATION_DB = os.getenv(
+    'GREENGUARD_EXPLANATION_DB',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'explanations.db')
+)
+
+
+def build_explanation_prompt(crop_type, condition):
+    return EXPLANATION_PROMPT.format(crop_type=crop_type, condition=condition)
+
+
+class ExplanationStore:
+    """SQLite-backed explanations keyed by class name and prompt version, with an in-memory copy."""
+
+    def __init__(self, db_path=EXPLANATION_DB, prompt_version=PROMPT_VERSION):
+        self.db_path = db_path
+        self.prompt_version = prompt_version
+        self._memory = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS explanations ("
+            "class_name TEXT, prompt_version TEXT, explanation TEXT, created_at REAL, "
+            "PRIMARY KEY (class_name, prompt_version))"
+        )
+        self._db.commit()
+
+        self.hits = REGISTRY.counter('explanation_store_hits_total', 'Explanations served from the store')
+        self.misses = REGISTRY.counter('explanation_store_misses_total', 'Explanations generated by the LLM')
+
+    def get(self, class_name):
+        explanation = self._memory.get(class_name)
+        if explanation is not None:
+            return explanation
+        with self._lock:
+            row = self._db.execute(
+                "SELECT explanation FROM explanations WHERE class_name = ? AND prompt_version = ?",
+                (class_name, self.prompt_version)
+            ).fetchone()
+        if row is None:
+            return None
+        self._memory[class_name] = row[0]
+        return row[0]
+
+    def put(self, class_name, explanation):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO explanations VALUES (?, ?, ?, ?)",
+                (class_name, self.prompt_version, explanation, time.time())
+            )
+            self._db.commit()
+        self._memory[class_name] = explanation
+
+    def lookup(self, crop_type, condition):
+        """Return the stored explanation for a class, or None without generating one."""
+        explanation = self.get(f"{crop_type}_{condition}")
+        if explanation is not None:
+            self.hits.inc()
+        return explanation
+
+    def get_or_generate(self, crop_type, condition, generate):
+        """Return the stored explanation for a class, calling generate(prompt) only on a miss."""
+        class_name = f"{crop_type}_{condition}"
+        explanation = self.get(class_name)
+        if explanation is not None:
+            self.hits.inc()
+            return explanation
+        self.misses.inc()
+        explanation = generate(build_explanation_prompt(crop_type, condition))
+        self.put(class_name, explanation)
+        return explanation
+
+    def get_or_stream(self, crop_type, condition, stream, on_chunk):
+        """
+        Like get_or_generate, but on a miss the text comes from stream(prompt) and each chunk is
+        passed to on_chunk as it arrives. The explanation is stored once the stream completes.
+        """
+        class_name = f"{crop_type}_{condition}"
+        explanation = self.get(class_name)
+        if explanation is not None:
+            self.hits.inc()
+            return explanation
+        self.misses.inc()
+        chunks = []
+        for chunk in stream(build_explanation_prompt(crop_type, condition)):
+            chunks.append(chunk)
+            on_chunk(chunk)
+        explanation = ''.join(chunks)
+        self.put(class_name, explanation)
+        return explanation
+
+    def invalidate(self, class_name=None):
+        """Drop one class (or every class) so it is regenerated on next use."""
+        with self._lock:
+            if class_name is None:
+                self._db.execute("DELETE FROM explanations")
+                self._memory.clear()
+            else:
+                self._db.execute("DELETE FROM explanations WHERE class_name = ?", (class_name,))
+                self._memory.pop(class_name, None)
+            self._db.commit()
+
+    def purge_old_versions(self):
+        """Delete explanations generated from previous prompt templates."""
+        with self._lock:
+            deleted = self._db.execute(
+                "DELETE FROM explanations WHERE prompt_version != ?", (self.prompt_version,)
+            ).rowcount
+            self._db.commit()
+        return deleted
+
+    def count(self):
+        """Number of classes with an explanation for the current prompt version."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM explanations WHERE prompt_version = ?", (self.prompt_version,)
+            ).fetchone()[0]
+
+    def missing_classes(self, class_names=CLASS_NAMES):
+        return [name for name in class_names if self.get(name) is None]
+
+
+def warm(store, generate, force=False):
+    """Pre-generate the explanation of every model class."""
+    class_names = CLASS_NAMES if force else store.missing_classes()
+    for index, class_name in enumerate(class_names, 1):
+        crop_type, condition = split_class_name(class_name)
+        start = time.perf_counter()
+        store.put(class_name, generate(build_explanation_prompt(crop_type, condition)))
+        print(f"[{index}/{len(class_names)}] {class_name} ({time.perf_counter() - start:.1f}s)")
+    print(f"Explanation store ready: {len(CLASS_NAMES) - len(store.missing_classes())}/{len(CLASS_NAMES)} classes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['warm', 'status', 'purge'])
+    parser.add_argument('--db', default=EXPLANATION_DB)
+    parser.add_argument('--force', action='store_true', help='Regenerate classes that are already stored')
+    args = parser.parse_args()
+
+    store = ExplanationStore(args.db)
+    if args.command == 'warm':
+        from groq_demo import generate_response
+        print(f"Removed {store.purge_old_versions()} explanations from older prompt versions")
+        warm(store, generate_response, args.force)
+    elif args.command == 'purge':
+        print(f"Removed {store.purge_old_versions()} explanations from older prompt versions")
+    else:
+        missing = store.missing_classes()
+        print(f"Prompt version {store.prompt_version}: {len(CLASS_NAMES) - len(missing)}/{len(CLASS_NAMES)} classes stored")
+        for class_name in missing:
+            print(f"  missing: {class_name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Export the Keras disease model (including AdaptiveLesionModule) to a
+post-training-quantized TFLite or ONNX artifact for CPU-only serving.
+
+Usage:
+    python export_model.py --format tflite --quantization float16 --output models/disease_fp16.tflite
+    python export_model.py --format tflite --quantization int8 --calibration-dir data/val --output models/disease_int8.tflite
+    python export_model.py --format onnx --quantization int8 --output models/disease_int8.onnx
+
+Serve the result with GREENGUARD_INFERENCE_BACKEND=tflite|onnx and
+GREENGUARD_EXPORTED_MODEL_PATH=<output>.
+"""
+import os
+import argparse
+
+import numpy as np
+import tensorflow as tf
+
+from disease_predict import MODEL_PATH, preprocess_image
+from keras_model import load_keras_model
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif')
+
+
+def calibration_images(calibration_dir, limit):
+    """Yield preprocessed (1, 224, 224, 3) images from a folder for INT8 calibration."""
+    count = 0
+    for root, _, files in os.walk(calibration_dir):
+        for name in sorted(files):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            yield preprocess_image(os.path.join(root, name)).astype(np.float32)
+            count += 1
+            if count >= limit:
+                return
+
+
+def serving_function(model):
+    """Concrete inference function with a dynamic batch dimension."""
+    infer = tf.function(lambda images: model(images, training=False))
+    return infer.get_concrete_function(tf.TensorSpec([None, 224, 224, 3], tf.float32, name='images'))
+
+
+def export_tflite(model, output, quantization, calibration_dir=None, calibration_samples=200):
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([serving_function(model)], model)
+    if quantization == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == 'dynamic':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif quantization == 'int8':
+        if not calibration_dir:
+            raise ValueError("INT8 quantization needs --calibration-dir with representative images")
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([image] for image in calibration_images(calibration_dir, calibration_samples))
+        # Integer kernels throughout, but keep float input/output so callers don't change
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    elif quantization != 'none':
+        raise ValueError(f"Unsupported TFLite quantization: {quantization}")
+
+    with open(output, 'wb') as f:
+        f.write(converter.convert())
+
+
+def export_onnx(model, output, quantization):
+    import tf2onnx
+
+    spec = (tf.TensorSpec([None, 224, 224, 3], tf.float32, name='images'),)
+    infer = tf.function(lambda images: model(images, training=False))
+    if quantization == 'none':
+        tf2onnx.convert.from_function(infer, input_signature=spec, output_path=output)
+    elif quantization in ('int8', 'dynamic'):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        float_path = output + '.fp32.onnx'
+        tf2onnx.convert.from_function(infer, input_signature=spec, output_path=float_path)
+        quantize_dynamic(float_path, output, weight_type=QuantType.QInt8)
+        os.remove(float_path)
+    else:
+        raise ValueError(f"Unsupported ONNX quantization: {quantization}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=MODEL_PATH, help='Path to the .keras model')
+    parser.add_argument('--format', choices=['tflite', 'onnx'], default='tflite')
+    parser.add_argument('--quantization', choices=['none', 'dynamic', 'float16', 'int8'], default='float16')
+    parser.add_argument('--calibration-dir', help='Image folder used to calibrate INT8 quantization')
+    parser.add_argument('--calibration-samples', type=int, default=200)
+    parser.add_argument('--output', required=True)
+    args = parser.parse_args()
+
+    model = load_keras_model(args.model)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    if args.format == 'tflite':
+        export_tflite(model, args.output, args.quantization, args.calibration_dir, args.calibration_samples)
+    else:
+        export_onnx(model, args.output, args.quantization)
+
+    size_mb = os.path.getsize(args.output) / (1024 * 1024)
+    print(f"Exported {args.format} ({args.quantization}) model to {args.output} ({size_mb:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
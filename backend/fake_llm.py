@@ -0,0 +1,116 @@
+"""
+Local stand-in for ChatGroq that produces tokens on a fixed schedule, for
+exercising streaming, timeouts and load tests without a Groq key.
+
+It can also inject faults: a share of calls fails before the first token
+(GREENGUARD_FAKE_LLM_ERROR_RATE) and a share is slowed down by an extra delay
+(GREENGUARD_FAKE_LLM_SLOW_RATE, GREENGUARD_FAKE_LLM_SLOW_DELAY), to exercise the
+retries, hedging and circuit breaker of llm_client.py.
+"""
+import os
+import time
+import random
+import asyncio
+import threading
+
+
+class FakeLLMError(RuntimeError):
+    """Injected upstream failure; status_code mimics the HTTP error of the Groq client."""
+
+    def __init__(self, status_code=503):
+        super().__init__(f"Injected fake LLM error (HTTP {status_code})")
+        self.status_code = status_code
+
+
+class FakeChunk:
+    def __init__(self, content):
+        self.content = content
+
+    def __add__(self, other):
+        # Chunks of a LangChain stream add up to the whole message
+        return FakeChunk(self.content + other.content)
+
+
+class FakeLLM:
+    """
+    Mimics the invoke()/stream() interface of a LangChain chat model.
+
+    The first token arrives after first_token_delay seconds and each following
+    token after token_interval seconds.
+    """
+
+    def __init__(self, first_token_delay=None, token_interval=None, num_tokens=None, response=None,
+                 error_rate=None, slow_rate=None, slow_delay=None):
+        self.first_token_delay = float(first_token_delay if first_token_delay is not None
+                                       else os.getenv('GREENGUARD_FAKE_LLM_FIRST_TOKEN_DELAY', '0.2'))
+        self.token_interval = float(token_interval if token_interval is not None
+                                    else os.getenv('GREENGUARD_FAKE_LLM_TOKEN_INTERVAL', '0.02'))
+        self.num_tokens = int(num_tokens if num_tokens is not None
+                              else os.getenv('GREENGUARD_FAKE_LLM_TOKENS', '50'))
+        self.response = response
+        self.error_rate = float(error_rate if error_rate is not None
+                                else os.getenv('GREENGUARD_FAKE_LLM_ERROR_RATE', '0'))
+        self.slow_rate = float(slow_rate if slow_rate is not None
+                               else os.getenv('GREENGUARD_FAKE_LLM_SLOW_RATE', '0'))
+        self.slow_delay = float(slow_delay if slow_delay is not None
+                                else os.getenv('GREENGUARD_FAKE_LLM_SLOW_DELAY', '5'))
+        self.calls = 0
+        self.errors = 0
+        self.cancelled = 0
+        self._lock = threading.Lock()
+
+    def _tokens(self, messages):
+        prompt = messages[-1].content if messages else ''
+        if self.response is not None:
+            words = self.response.split(' ')
+        else:
+            base = f"This is a simulated answer to: {prompt}".split(' ')
+            words = [base[i % len(base)] for i in range(self.num_tokens)]
+        return [word if i == 0 else ' ' + word for i, word in enumerate(words)]
+
+    def _first_token_delay(self):
+        """Count a call and pick its fault: raises an injected error, or returns the delay before the first token."""
+        with self._lock:
+            self.calls += 1
+            if random.random() < self.error_rate:
+                self.errors += 1
+                raise FakeLLMError()
+        if random.random() < self.slow_rate:
+            return self.first_token_delay + self.slow_delay
+        return self.first_token_delay
+
+    def stream(self, messages, **kwargs):
+        delay = self._first_token_delay()
+        finished = False
+        try:
+            time.sleep(delay)
+            for i, token in enumerate(self._tokens(messages)):
+                if i:
+                    time.sleep(self.token_interval)
+                yield FakeChunk(token)
+            finished = True
+        finally:
+            if not finished:
+                with self._lock:
+                    self.cancelled += 1
+
+    def invoke(self, messages, **kwargs):
+        return FakeChunk(''.join(chunk.content for chunk in self.stream(messages)))
+
+    async def astream(self, messages, **kwargs):
+        delay = self._first_token_delay()
+        finished = False
+        try:
+            await asyncio.sleep(delay)
+            for i, token in enumerate(self._tokens(messages)):
+                if i:
+                    await asyncio.sleep(self.token_interval)
+                yield FakeChunk(token)
+            finished = True
+        finally:
+            if not finished:
+                with self._lock:
+                    self.cancelled += 1
+
+    async def ainvoke(self, messages, **kwargs):
+        return FakeChunk(''.join([chunk.content async for chunk in self.astream(messages)]))
@@ -0,0 +1,192 @@
+"""
+Spatial index over the professionals' coordinates for the map.
+
+Points are projected to Web Mercator, the projection of the map tiles, and
+sorted by the Z-order (Morton) code of their cell in a 2^24 x 2^24 grid. A
+cell of any coarser level of that grid is then one contiguous run of the
+sorted codes, found with two binary searches, like a quadtree flattened into
+an array:
+
+- a bounding box is covered with a few hundred cells and only the points of
+  those runs are checked against it. A box with west > east crosses the
+  antimeridian and is covered by the cells of both of its sides;
+- a radius search is a bounding box search followed by the exact distance;
+- clustering for a zoom level groups points by cells of about 64 pixels at
+  that zoom. The count and centroid of a cell come from prefix sums over the
+  sorted coordinates, so the cost depends on the number of cells in the
+  viewport, not on the number of points in it.
+"""
+import math
+
+import numpy as np
+
+# Levels of the grid; at level L the world is 2^L x 2^L cells
+MAX_LEVEL = 24
+# Map tiles are 256 pixels, so cells two levels below the zoom level are 64 pixels wide
+CLUSTER_LEVEL_OFFSET = 2
+# Cells covering a bounding box search
+MAX_SEARCH_CELLS_PER_SIDE = 16
+MAX_LATITUDE = 85.05112878
+EARTH_RADIUS_KM = 6371.0088
+
+
+def mercator(lat, lon):
+    """Web Mercator coordinates in [0, 1), y growing southwards."""
+    lat = np.radians(np.clip(lat, -MAX_LATITUDE, MAX_LATITUDE))
+    x = (np.asarray(lon, dtype=np.float64) + 180) / 360
+    y = (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / math.pi) / 2
+    return x, y
+
+
+def latitude(y):
+    """Latitude of a Web Mercator y coordinate."""
+    return np.degrees(np.arctan(np.sinh(math.pi * (1 - 2 * np.asarray(y, dtype=np.float64)))))
+
+
+def cell(v, level):
+    """Cell number along one axis of a coordinate in [0, 1]."""
+    cells = 1 << level
+    return np.clip(np.floor(np.asarray(v) * cells), 0, cells - 1).astype(np.uint64)
+
+
+def spread_bits(v):
+    """Insert a zero bit before each of the low 24 bits."""
+    v = v.astype(np.uint64)
+    for shift, mask in ((16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF), (4, 0x0F0F0F0F0F0F0F0F),
+                        (2, 0x3333333333333333), (1, 0x5555555555555555)):
+        v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+    return v
+
+
+def morton(cx, cy):
+    return spread_bits(cx) | (spread_bits(cy) << np.uint64(1))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(v) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1)))
+
+
+class GeoIndex:
+    """Points sorted along a Z-order curve, with prefix sums of their coordinates."""
+
+    def __init__(self, lat, lon):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        ids = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon)))
+        x, y = mercator(lat[ids], lon[ids])
+        codes = morton(cell(x, MAX_LEVEL), cell(y, MAX_LEVEL))
+        order = np.argsort(codes, kind='stable')
+
+        # Everything below is in Z-order
+        self._codes = codes[order]
+        self._ids = ids[order].astype(np.int32)
+        self._lat = lat[ids][order]
+        self._lon = lon[ids][order]
+        self._lat_sums = np.concatenate(([0.0], np.cumsum(self._lat)))
+        self._lon_sums = np.concatenate(([0.0], np.cumsum(self._lon)))
+        # Position in Z-order of each record id, -1 for records without coordinates
+        self._position = np.full(len(lat), -1, dtype=np.int64)
+        self._position[self._ids] = np.arange(len(self._ids))
+
+    def __len__(self):
+        return len(self._ids)
+
+    @staticmethod
+    def _cells(west, south, east, north, level):
+        """Cell numbers along x and y of the cells at a level overlapping a bounding box."""
+        if west > east:
+            # Across the antimeridian: the columns of [west, 180] and [-180, east]
+            xs, ys = GeoIndex._cells(west, south, 180.0, north, level)
+            return np.union1d(xs, GeoIndex._cells(-180.0, south, east, north, level)[0]), ys
+        (x0, x1), (y1, y0) = mercator(np.array([south, north]), np.array([west, east]))
+        return (np.arange(cell(x0, level), cell(x1, level) + np.uint64(1), dtype=np.uint64),
+                np.arange(cell(y0, level), cell(y1, level) + np.uint64(1), dtype=np.uint64))
+
+    def _runs(self, codes, xs, ys, level):
+        """Start and end positions in the sorted codes of each cell, row by row."""
+        shift = np.uint64(2 * (MAX_LEVEL - level))
+        cells = morton(np.tile(xs, len(ys)), np.repeat(ys, len(xs)))
+        starts = np.searchsorted(codes, cells << shift)
+        ends = np.searchsorted(codes, (cells + np.uint64(1)) << shift)
+        return starts, ends
+
+    def _bbox_positions(self, west, south, east, north):
+        """Z-order positions of the points inside a bounding box."""
+        x0, y0 = mercator(north, west)
+        x1, y1 = mercator(south, east)
+        width = float(x1 - x0) if west <= east else float(x1 - x0) + 1
+        span = max(width, float(y1 - y0), 1.0 / (1 << MAX_LEVEL))
+        level = int(min(MAX_LEVEL, max(0, math.floor(math.log2(MAX_SEARCH_CELLS_PER_SIDE / span)))))
+        xs, ys = self._cells(west, south, east, north, level)
+        starts, ends = self._runs(self._codes, xs, ys, level)
+        nonempty = ends > starts
+        if not nonempty.any():
+            return np.empty(0, dtype=np.int64)
+        positions = np.concatenate([np.arange(s, e) for s, e in zip(starts[nonempty], ends[nonempty])])
+        lat, lon = self._lat[positions], self._lon[positions]
+        in_lon = (lon >= west) & (lon <= east) if west <= east else (lon >= west) | (lon <= east)
+        return positions[(lat >= south) & (lat <= north) & in_lon]
+
+    def within_bbox(self, west, south, east, north):
+        """Sorted record ids of the points inside a bounding box; west > east crosses the antimeridian."""
+        return np.sort(self._ids[self._bbox_positions(west, south, east, north)])
+
+    def within_radius(self, lat, lon, radius_km):
+        """Record ids of the points within radius_km of a point, nearest first, and their distances."""
+        dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+        dlon = dlat / max(math.cos(math.radians(min(abs(lat) + dlat, 90))), 1e-6)
+        if dlon >= 180:
+            west, east = -180.0, 180.0
+        else:
+            # Wrapped around the antimeridian, which _bbox_positions reads as west > east
+            west, east = lon - dlon, lon + dlon
+            west, east = (west + 360 if west < -180 else west), (east - 360 if east > 180 else east)
+        positions = self._bbox_positions(west, max(lat - dlat, -90), east, min(lat + dlat, 90))
+        distances = haversine_km(lat, lon, self._lat[positions], self._lon[positions])
+        inside = distances <= radius_km
+        positions, distances = positions[inside], distances[inside]
+        order = np.argsort(distances, kind='stable')
+        return self._ids[positions[order]], distances[order]
+
+    def clusters(self, west, south, east, north, zoom, ids=None, max_cells=1024):
+        """
+        Group the points of the cells overlapping a bounding box by cells of about 64 pixels at
+        a zoom level, or coarser ones if that would take more than max_cells cells. ids restricts
+        the points to a subset of record ids.
+
+        Returns (counts, latitudes, longitudes, record ids, bounds) for the non-empty cells. The
+        latitude and longitude are the centroid of the cell's points, the record id is that of the
+        cell's first point (its only one when the count is 1), and bounds are the cell's
+        south, west, north and east edges.
+        """
+        level = min(MAX_LEVEL, max(0, int(zoom) + CLUSTER_LEVEL_OFFSET))
+        xs, ys = self._cells(west, south, east, north, level)
+        while level > 0 and len(xs) * len(ys) > max_cells:
+            level -= 1
+            xs, ys = self._cells(west, south, east, north, level)
+
+        if ids is None:
+            codes, lat_sums, lon_sums, record_ids = self._codes, self._lat_sums, self._lon_sums, self._ids
+        else:
+            # The subset in Z-order, with its own prefix sums
+            positions = np.sort(self._position[ids])
+            positions = positions[positions >= 0]
+            codes, record_ids = self._codes[positions], self._ids[positions]
+            lat_sums = np.concatenate(([0.0], np.cumsum(self._lat[positions])))
+            lon_sums = np.concatenate(([0.0], np.cumsum(self._lon[positions])))
+
+        starts, ends = self._runs(codes, xs, ys, level)
+        nonempty = ends > starts
+        starts, ends = starts[nonempty], ends[nonempty]
+        counts = ends - starts
+        lats = (lat_sums[ends] - lat_sums[starts]) / counts
+        lons = (lon_sums[ends] - lon_sums[starts]) / counts
+
+        size = 1.0 / (1 << level)
+        cx = np.tile(xs, len(ys))[nonempty].astype(np.float64)
+        cy = np.repeat(ys, len(xs))[nonempty].astype(np.float64)
+        bounds = np.stack([latitude((cy + 1) * size), cx * size * 360 - 180,
+                           latitude(cy * size), (cx + 1) * size * 360 - 180], axis=1)
+        return counts, lats, lons, record_ids[starts], bounds
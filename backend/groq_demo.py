@@ -1,13 +1,50 @@
 import os
+import time
+import threading
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
-from langchain.schema import HumanMessage
+from metrics import REGISTRY
+from llm_client import CircuitBreaker, CircuitOpenError, ResilientLLM, SingleFlight
+
+# Read .env first so the settings below (and GROQ_API_KEY) can come from it
+load_dotenv()
+
+# LLM settings; the LangChain modules are only imported when the first response is generated
+LLM_MODEL = os.getenv('GREENGUARD_LLM_MODEL', 'llama3-70b-8192')
+LLM_TEMPERATURE = float(os.getenv('GREENGUARD_LLM_TEMPERATURE', '0.7'))
+LLM_TIMEOUT = float(os.getenv('GREENGUARD_LLM_TIMEOUT', '30'))
+
+# Retries, hedging and circuit breaking around every LLM call, see llm_client.py
+LLM_RETRIES = int(os.getenv('GREENGUARD_LLM_RETRIES', '2'))
+LLM_BACKOFF = float(os.getenv('GREENGUARD_LLM_BACKOFF', '0.25'))
+# Percentile of recent latencies after which a second request is sent (unset disables hedging)
+LLM_HEDGE_PERCENTILE = float(os.getenv('GREENGUARD_LLM_HEDGE_PERCENTILE') or 0) or None
+LLM_MAX_HEDGES = int(os.getenv('GREENGUARD_LLM_MAX_HEDGES', '4'))
+LLM_BREAKER_FAILURES = int(os.getenv('GREENGUARD_LLM_BREAKER_FAILURES', '5'))
+LLM_BREAKER_COOLDOWN = float(os.getenv('GREENGUARD_LLM_BREAKER_COOLDOWN', '30'))
+
+def resilient(llm):
+    return ResilientLLM(llm, retries=LLM_RETRIES, backoff_base=LLM_BACKOFF, hedge_percentile=LLM_HEDGE_PERCENTILE,
+                        max_hedges=LLM_MAX_HEDGES,
+                        breaker=CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN))
+
+class Message:
+    """Stand-in for LangChain's HumanMessage, for LLMs that only read .content (e.g. fake_llm.FakeLLM)."""
+
+    def __init__(self, content):
+        self.content = content
 
 class ResponseGenerator:
-    def __init__(self):
+    def __init__(self, llm=None):
         # Load environment variables
         load_dotenv()
 
+        # A ready-made LLM (e.g. the local stand-in in fake_llm.py) skips the Groq setup
+        if llm is not None:
+            self.api_key = None
+            self.llm = resilient(llm)
+            self.message_class = Message
+            return
+
         # Fetch the API key from environment
         self.api_key = os.getenv('GROQ_API_KEY')
 
@@ -16,28 +53,155 @@ class ResponseGenerator:
             raise ValueError("GROQ_API_KEY not found in environment variables")
         
         # Initialize the ChatGroq model
-        self.llm = ChatGroq(
+        # Retries are done by the resilient wrapper; GROQ_API_BASE can point the client at a local fake server
+        from langchain_groq import ChatGroq
+        from langchain.schema import HumanMessage
+        self.message_class = HumanMessage
+        self.llm = resilient(ChatGroq(
             groq_api_key=self.api_key,
-            model_name="llama3-70b-8192",
-            temperature=0.7,
-            timeout=30
-        )
+            model_name=LLM_MODEL,
+            temperature=LLM_TEMPERATURE,
+            timeout=LLM_TIMEOUT,
+            max_retries=0
+        ))
+
+    def to_messages(self, prompt):
+        return [self.message_class(content=prompt)]
 
     def generate_response(self, prompt):
         # Prepare the input message
-        messages = [HumanMessage(content=prompt)]
+        messages = self.to_messages(prompt)
         
         try:
             # Generate a response using the model
             response = self.llm.invoke(messages)
             return response.content
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Error generating response: {e}")
+
+    async def agenerate_response(self, prompt):
+        """Async variant of generate_response for the ASGI serving mode."""
+        messages = self.to_messages(prompt)
+        try:
+            response = await self.llm.ainvoke(messages)
+            return response.content
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Error generating response: {e}")
+
+    def stream_response(self, prompt, endpoint='chat'):
+        """
+        Yield the response text chunk by chunk as the model produces it.
+
+        Closing the generator (e.g. when the client disconnects) closes the
+        upstream stream too, so abandoned generations stop consuming tokens.
+        """
+        timer = StreamTimer(endpoint)
+        stream = self.llm.stream(self.to_messages(prompt))
+        try:
+            for chunk in stream:
+                if chunk.content:
+                    timer.token()
+                    yield chunk.content
+            timer.completed = True
+        except Exception as e:
+            timer.errored = True
+            raise RuntimeError(f"Error generating response: {e}")
+        finally:
+            stream.close()
+            timer.finish()
+
+    async def astream_response(self, prompt, endpoint='chat'):
+        """Async variant of stream_response; cancelling the task closes the upstream stream."""
+        timer = StreamTimer(endpoint)
+        stream = self.llm.astream(self.to_messages(prompt))
+        try:
+            async for chunk in stream:
+                if chunk.content:
+                    timer.token()
+                    yield chunk.content
+            timer.completed = True
         except Exception as e:
+            timer.errored = True
             raise RuntimeError(f"Error generating response: {e}")
+        finally:
+            await stream.aclose()
+            timer.finish()
+
+class StreamTimer:
+    """Records time to first token, total latency and cancellation of one streamed response."""
+
+    def __init__(self, endpoint):
+        self.labels = {'endpoint': endpoint}
+        self.start = time.perf_counter()
+        self.first_token_seen = False
+        self.completed = False
+        self.errored = False
 
-# Instantiate the generator class
-generator = ResponseGenerator()
+    def token(self):
+        if not self.first_token_seen:
+            self.first_token_seen = True
+            REGISTRY.histogram('llm_time_to_first_token_seconds', 'Time until the first streamed token',
+                               labels=self.labels).observe(time.perf_counter() - self.start)
+
+    def finish(self):
+        REGISTRY.histogram('llm_response_seconds', 'Total time of a streamed LLM response',
+                           labels=self.labels).observe(time.perf_counter() - self.start)
+        if not self.completed and not self.errored:
+            REGISTRY.counter('llm_streams_cancelled_total', 'Streams stopped before the model finished',
+                             self.labels).inc()
+
+# The shared generator is built on first use, so importing this module never needs the API key
+_generator = None
+_generator_error = None
+_generator_lock = threading.Lock()
+
+def get_generator():
+    """Return the shared ResponseGenerator (GREENGUARD_FAKE_LLM=1 uses the local stand-in instead of Groq)."""
+    global _generator, _generator_error
+    if _generator is None:
+        with _generator_lock:
+            if _generator is None:
+                try:
+                    if os.getenv('GREENGUARD_FAKE_LLM') == '1':
+                        from fake_llm import FakeLLM
+                        _generator = ResponseGenerator(llm=FakeLLM())
+                    else:
+                        _generator = ResponseGenerator()
+                    _generator_error = None
+                except Exception as e:
+                    _generator_error = str(e)
+                    raise
+    return _generator
+
+def llm_status():
+    """Describe the LLM client for readiness checks without creating it."""
+    fake = os.getenv('GREENGUARD_FAKE_LLM') == '1'
+    return {
+        'ready': _generator is not None,
+        'configured': fake or bool(os.getenv('GROQ_API_KEY')),
+        'provider': 'fake' if fake else 'groq',
+        'model': None if fake else LLM_MODEL,
+        'error': _generator_error,
+        'circuit': _generator.llm.status() if _generator is not None else None
+    }
+
+# Identical prompts generated at the same time (e.g. one explanation requested by many uploads) share one call
+in_flight = SingleFlight()
 
 # Standalone function to call the method in ResponseGenerator class
 def generate_response(prompt):
-    return generator.generate_response(prompt)
+    return in_flight.do(prompt, get_generator().generate_response, prompt)
+
+def stream_response(prompt, endpoint='chat'):
+    return get_generator().stream_response(prompt, endpoint)
+
+async def agenerate_response(prompt):
+    return await in_flight.ado(prompt, get_generator().agenerate_response, prompt)
+
+def astream_response(prompt, endpoint='chat'):
+    return get_generator().astream_response(prompt, endpoint)
 
@@ -0,0 +1,110 @@
+import threading
+
+import numpy as np
+
+# Model files read into memory before workers fork (see prefork.py). The TFLite
+# interpreter uses these bytes in place, so forked workers share the weights copy-on-write.
+PRELOADED_MODELS = {}
+
+
+def preload_model(model_path):
+    """Read a model file into memory so forked workers can build their backend from it."""
+    with open(model_path, 'rb') as f:
+        PRELOADED_MODELS[model_path] = f.read()
+    return len(PRELOADED_MODELS[model_path])
+
+
+class TFLiteBackend:
+    """Serve a (optionally quantized) .tflite export of the disease model."""
+
+    name = 'tflite'
+
+    def __init__(self, model_path, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        self.model_path = model_path
+        # The interpreter reads weights straight from a preloaded buffer without copying it
+        content = PRELOADED_MODELS.get(model_path)
+        if content is not None:
+            self.interpreter = Interpreter(model_content=content, num_threads=num_threads)
+        else:
+            self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input_detail = self.interpreter.get_input_details()[0]
+        self.output_detail = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self.input_detail['shape'][0])
+        # The interpreter keeps per-call state, so only one thread may use it at a time
+        self._lock = threading.Lock()
+
+    def _resize(self, batch_size):
+        if batch_size != self._batch_size:
+            shape = list(self.input_detail['shape'])
+            shape[0] = batch_size
+            self.interpreter.resize_tensor_input(self.input_detail['index'], shape)
+            self.interpreter.allocate_tensors()
+            self.input_detail = self.interpreter.get_input_details()[0]
+            self.output_detail = self.interpreter.get_output_details()[0]
+            self._batch_size = batch_size
+
+    def predict_batch(self, batch):
+        batch = self._quantize(batch, self.input_detail)
+        with self._lock:
+            self._resize(len(batch))
+            self.interpreter.set_tensor(self.input_detail['index'], batch)
+            self.interpreter.invoke()
+            outputs = self.interpreter.get_tensor(self.output_detail['index'])
+        return self._dequantize(outputs, self.output_detail)
+
+    @staticmethod
+    def _quantize(batch, detail):
+        """Map float inputs onto an integer input tensor for full-integer exports."""
+        dtype = detail['dtype']
+        if np.issubdtype(dtype, np.integer):
+            scale, zero_point = detail['quantization']
+            info = np.iinfo(dtype)
+            batch = np.clip(np.round(batch / scale + zero_point), info.min, info.max)
+        return batch.astype(dtype)
+
+    @staticmethod
+    def _dequantize(outputs, detail):
+        if np.issubdtype(outputs.dtype, np.integer):
+            scale, zero_point = detail['quantization']
+            return (outputs.astype(np.float32) - zero_point) * scale
+        return outputs.astype(np.float32)
+
+
+class OnnxBackend:
+    """Serve an ONNX export of the disease model through onnxruntime."""
+
+    name = 'onnx'
+
+    def __init__(self, model_path, num_threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.model_path = model_path
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict_batch(self, batch):
+        # InferenceSession.run is thread-safe
+        return self.session.run(None, {self.input_name: batch.astype(np.float32)})[0]
+
+
+BACKENDS = {
+    'tflite': TFLiteBackend,
+    'onnx': OnnxBackend,
+}
+
+
+def create_backend(name, model_path, num_threads=None):
+    """Build a non-Keras inference backend by name."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}'. Choose from: keras, {', '.join(BACKENDS)}")
+    return BACKENDS[name](model_path, num_threads=num_threads)
@@ -0,0 +1,62 @@
+"""
+The Keras disease model: its custom layer, its training loss and the loader.
+
+Kept apart from disease_predict.py so TensorFlow is only imported when a Keras
+model is actually loaded.
+"""
+import tensorflow as tf
+from tensorflow.keras.layers import Layer
+
+class AdaptiveLesionModule(Layer):
+    def __init__(self, filters, trainable=True, **kwargs):
+        super(AdaptiveLesionModule, self).__init__(trainable=trainable, **kwargs)
+        self.filters = filters
+        
+    def build(self, input_shape):
+        self.spatial_conv = tf.keras.layers.Conv2D(1, (1, 1), padding='same', activation='sigmoid')
+        self.channel_pool = tf.keras.layers.GlobalAveragePooling2D()
+        self.channel_attention = tf.keras.layers.Dense(self.filters, activation='sigmoid')
+        
+        super().build(input_shape)
+        
+    def call(self, inputs):
+        # Spatial attention
+        spatial_att = self.spatial_conv(inputs)
+        
+        # Channel attention
+        channel_att = self.channel_pool(inputs)
+        channel_att = self.channel_attention(channel_att)
+        channel_att = tf.reshape(channel_att, [-1, 1, 1, self.filters])
+        
+        # Combined attention
+        return inputs * spatial_att * channel_att
+    
+    def get_config(self):
+        config = super().get_config()
+        config.update({
+            "filters": self.filters
+        })
+        return config
+
+def adaptive_focal_loss(y_true, y_pred, gamma=2.0):
+    epsilon = tf.keras.backend.epsilon()
+    y_pred = tf.clip_by_value(y_pred, epsilon, 1.0 - epsilon)
+    
+    cross_entropy = -y_true * tf.math.log(y_pred)
+    
+    pt = tf.where(y_true == 1, y_pred, 1 - y_pred)
+    difficulty_weight = tf.pow(1. - pt, gamma)
+    
+    class_weight = 1 + tf.reduce_max(y_true[:, 1:], axis=1) * 0.5
+    
+    final_loss = difficulty_weight * cross_entropy * tf.expand_dims(class_weight, -1)
+    
+    return tf.reduce_mean(final_loss)
+
+def load_keras_model(model_path):
+    """Load the .keras model together with its custom layer and loss."""
+    custom_objects = {
+        'AdaptiveLesionModule': AdaptiveLesionModule,
+        'adaptive_focal_loss': adaptive_focal_loss
+    }
+    return tf.keras.models.load_model(model_path, custom_objects=custom_objects)
@@ -0,0 +1,43 @@
+import numpy as np
+
+# Output classes of the disease model, in the order of its softmax
+CLASS_NAMES = [
+    'Bean_Healthy', 'Bean_Rust', 'Bean_Angular_Leaf_Spot',
+    'Cotton_Aphids', 'Cotton_Army_worm', 'Cotton_Bacterial_Blight',
+    'Cotton_Curl_virus', 'Cotton_Fussarium_wilt', 'Cotton_Healthy',
+    'Cotton_Powdery_Mildew', 'Cotton_Target_spot',
+    'Groundnut_Early_leaf_spot', 'Groundnut_Early_rust',
+    'Groundnut_Healthy_leaf', 'Groundnut_Late_leaf_spot',
+    'Groundnut_Nutrition_deficiency', 'Groundnut_Rust',
+    'Maize_Blight', 'Maize_Common_Rust', 'Maize_Gray_Leaf_Spot',
+    'Maize_Healthy', 'Pepper_bell_Bacterial_spot', 'Pepper_bell_Healthy',
+    'Potato_Early_Blight', 'Potato_Healthy', 'Potato_Late_Blight',
+    'Rice_Bacterialblight', 'Rice_Blast', 'Rice_Brownspot', 'Rice_Tungro',
+    'Spinach_Anthracnose', 'Spinach_Bacterial_Spot', 'Spinach_Downy_Mildew',
+    'Spinach_Healthy_Leaf', 'Spinach_Pest_Damage', 'Spinach_Straw_Mite',
+    'Sugarcane_Bacterial_Blights', 'Sugarcane_Brown_Rust',
+    'Sugarcane_Dried_Leaves', 'Sugarcane_Healthy', 'Sugarcane_Mawa',
+    'Sugarcane_Mites', 'Sugarcane_Mosaic', 'Sugarcane_Red_Spot',
+    'Sugarcane_Yellow_Leaf', 'Tomato_Bacterial_spot', 'Tomato_Early_blight',
+    'Tomato_healthy', 'Tomato_Late_blight', 'Tomato_Leaf_Mold',
+    'Tomato_mosaic_virus', 'Tomato_Septoria_leaf_spot',
+    'Tomato_Spider_mites Two-spotted_spider_mite', 'Tomato_Target_Spot',
+    'Tomato_Yellow_Leaf_Curl_Virus', 'Turmeric_Aphids_Disease',
+    'Turmeric_Dry_Leaf', 'Turmeric_Healthy_Leaf', 'Turmeric_Leaf_Blotch',
+    'Turmeric_Leaf_Spot', 'Turmeric_Rhizome_Rot'
+]
+
+VALID_CROPS = {'Bean','Cotton','Groundnut', 'Maize', 'Pepper','Potato','Rice', 'Spinach', 'Sugarcane', 'Tomato' ,'Turmeric'}
+
+def split_class_name(class_name):
+    """Extract crop type and condition from the full class name."""
+    parts = class_name.split('_')
+    crop = parts[0]
+    condition = '_'.join(parts[1:])
+    return crop, condition
+
+# Label metadata precomputed once, so per-image code works on index arrays
+CROPS = sorted(VALID_CROPS)
+CLASS_CROPS, CLASS_CONDITIONS = (list(column) for column in zip(*map(split_class_name, CLASS_NAMES)))
+# Position in CROPS of each class's crop, in softmax order
+CLASS_CROP_INDEX = np.array([CROPS.index(crop) for crop in CLASS_CROPS], dtype=np.intp)
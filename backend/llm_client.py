@@ -0,0 +1,406 @@
+"""
+Resilient wrapper around the chat model: jittered retries, optional hedged
+requests and a circuit breaker.
+
+ResilientLLM has the invoke()/ainvoke()/stream()/astream() interface of a
+LangChain chat model, so ResponseGenerator uses it in place of ChatGroq.
+
+- Failed calls are retried with full-jitter exponential backoff, unless the
+  error is a client error that would fail again (4xx other than 408/409/429).
+- With hedging on, a call still running after the given percentile of recent
+  latencies gets a second identical request, and whichever finishes first wins.
+  The slower one is stopped: async calls are cancelled, and threaded calls are
+  made as streams that give up at their next chunk. Only the winner's latency
+  counts towards the percentile, and at most max_hedges hedged requests are in
+  flight at once. Streams aren't hedged, as both copies would be billed for the
+  whole answer.
+- After a run of consecutive failures the breaker opens and calls fail at once
+  with CircuitOpenError; after the cooldown one trial call is let through, and
+  its result closes or reopens the breaker.
+
+A stream is retried only until its first token; once text has reached the
+client a failure is passed on.
+
+SingleFlight lets concurrent identical prompts share one call, e.g. the
+explanation prompt when many farmers upload photos of the same disease at once.
+"""
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(RuntimeError):
+    """The upstream LLM failed repeatedly and calls are being refused until the cooldown ends."""
+
+
+def is_retryable(error):
+    """Whether a failed call may succeed when repeated; invalid requests and auth errors won't."""
+    if isinstance(error, CircuitOpenError):
+        return False
+    status = getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    if isinstance(status, int) and 400 <= status < 500:
+        return status in (408, 409, 429)
+    return True
+
+
+class CircuitBreaker:
+    """Closed -> open after failure_threshold consecutive failures -> half-open after reset_timeout."""
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._trial_started = None
+        self._lock = threading.Lock()
+
+        self.open_gauge = REGISTRY.gauge('llm_circuit_open', '1 while the LLM circuit breaker refuses calls')
+        self.opened = REGISTRY.counter('llm_circuit_opened_total', 'Times the LLM circuit breaker opened')
+        self.rejected = REGISTRY.counter('llm_circuit_rejected_total', 'LLM calls refused by the open breaker')
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call must not be made."""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.CLOSED:
+                return
+            # Half-open: a single trial call decides whether the upstream is back. A trial that
+            # never reported (e.g. its request was cancelled) is replaced after another cooldown.
+            now = time.monotonic()
+            if self.state == self.HALF_OPEN and (self._trial_started is None
+                                                 or now - self._trial_started >= self.reset_timeout):
+                self._trial_started = now
+                return
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+        self.rejected.inc()
+        raise CircuitOpenError(f"LLM temporarily unavailable after repeated failures; retry in {retry_in:.0f}s")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial_started = None
+            if self.state != self.CLOSED:
+                logger.info("LLM circuit breaker closed")
+            self.state = self.CLOSED
+            self.open_gauge.set(0)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_started = None
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning("LLM circuit breaker opened after %d consecutive failures", self.failures)
+                    self.opened.inc()
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.open_gauge.set(1)
+
+    def status(self):
+        return {'state': self.state, 'consecutive_failures': self.failures}
+
+
+class ResilientLLM:
+    """
+    Chat model wrapper adding retries, hedging and circuit breaking.
+
+    retries is the number of extra attempts after a failure; backoff_base and
+    backoff_max bound the jittered delay between them. hedge_percentile (e.g. 95)
+    turns hedging on once hedge_min_samples latencies have been seen, with at most
+    max_hedges hedged requests in flight.
+    """
+
+    def __init__(self, llm, retries=2, backoff_base=0.25, backoff_max=4.0, hedge_percentile=None,
+                 hedge_min_samples=20, breaker=None, hedge_workers=8, max_hedges=4):
+        self.llm = llm
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker()
+        # Latencies of recent successful calls (the winner's, for hedged ones), for the hedging delay
+        self._latencies = deque(maxlen=500)
+        self._hedge_slots = threading.BoundedSemaphore(max_hedges) if max_hedges else None
+        self._executor = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix='llm-hedge') \
+            if hedge_percentile else None
+
+        self.attempts = REGISTRY.histogram('llm_attempt_seconds', 'Duration of each LLM call attempt')
+        self.failures = REGISTRY.counter('llm_attempt_failures_total', 'LLM call attempts that raised')
+        self.retried = REGISTRY.counter('llm_retries_total', 'LLM calls repeated after a failure')
+        self.hedges = REGISTRY.counter('llm_hedges_total', 'Hedged second requests sent')
+        self.hedge_wins = REGISTRY.counter('llm_hedge_wins_total', 'Hedged requests that finished first')
+
+    def hedge_delay(self):
+        """Seconds to wait before sending a hedged request, or None while hedging is off."""
+        if not self.hedge_percentile or len(self._latencies) < self.hedge_min_samples:
+            return None
+        latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * self.hedge_percentile / 100))]
+
+    def backoff(self, attempt):
+        """Full jitter: a random delay up to the exponential backoff of this attempt."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def status(self):
+        return dict(self.breaker.status(), hedge_delay=self.hedge_delay())
+
+    def invoke(self, messages, **kwargs):
+        for attempt in range(self.retries + 1):
+            self.breaker.before_call()
+            try:
+                result = self._hedged_invoke(messages, kwargs)
+            except Exception as e:
+                if not self._failed(e, attempt):
+                    raise
+                time.sleep(self.backoff(attempt))
+                continue
+            self.breaker.record_success()
+            return result
+
+    async def ainvoke(self, messages, **kwargs):
+        for attempt in range(self.retries + 1):
+            self.breaker.before_call()
+            try:
+                result = await self._ahedged_invoke(messages, kwargs)
+            except Exception as e:
+                if not self._failed(e, attempt):
+                    raise
+                await asyncio.sleep(self.backoff(attempt))
+                continue
+            self.breaker.record_success()
+            return result
+
+    def stream(self, messages, **kwargs):
+        for attempt in range(self.retries + 1):
+            self.breaker.before_call()
+            stream = self.llm.stream(messages, **kwargs)
+            try:
+                first = next(stream, None)
+            except Exception as e:
+                stream.close()
+                if not self._failed(e, attempt):
+                    raise
+                time.sleep(self.backoff(attempt))
+                continue
+            break
+        # A first token shows the upstream is answering; a later failure still counts against it
+        self.breaker.record_success()
+        try:
+            if first is not None:
+                yield first
+                yield from stream
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        finally:
+            stream.close()
+
+    async def astream(self, messages, **kwargs):
+        for attempt in range(self.retries + 1):
+            self.breaker.before_call()
+            stream = self.llm.astream(messages, **kwargs)
+            try:
+                first = await stream.__anext__()
+            except StopAsyncIteration:
+                first = None
+            except Exception as e:
+                await stream.aclose()
+                if not self._failed(e, attempt):
+                    raise
+                await asyncio.sleep(self.backoff(attempt))
+                continue
+            break
+        self.breaker.record_success()
+        try:
+            if first is not None:
+                yield first
+                async for chunk in stream:
+                    yield chunk
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        finally:
+            await stream.aclose()
+
+    def _failed(self, error, attempt):
+        """Count a failed attempt; returns whether it should be retried."""
+        if not is_retryable(error):
+            # The upstream answered, it just refused this request
+            self.breaker.record_success()
+            return False
+        self.breaker.record_failure()
+        if attempt >= self.retries:
+            return False
+        self.retried.inc()
+        logger.warning("LLM call failed (attempt %d of %d), retrying: %s", attempt + 1, self.retries + 1, error)
+        return True
+
+    def _timed_invoke(self, messages, kwargs, stop=None):
+        """
+        One attempt; returns (result, seconds). With a stop event the call is made as a stream
+        and abandoned at the next chunk once the event is set, which closes its upstream request.
+        """
+        start = time.perf_counter()
+        try:
+            if stop is None:
+                result = self.llm.invoke(messages, **kwargs)
+            else:
+                result = None
+                stream = self.llm.stream(messages, **kwargs)
+                try:
+                    for chunk in stream:
+                        if stop.is_set():
+                            break
+                        result = chunk if result is None else result + chunk
+                finally:
+                    stream.close()
+        except Exception:
+            self.failures.inc()
+            raise
+        finally:
+            self.attempts.observe(time.perf_counter() - start)
+        return result, time.perf_counter() - start
+
+    async def _atimed_invoke(self, messages, kwargs):
+        start = time.perf_counter()
+        try:
+            result = await self.llm.ainvoke(messages, **kwargs)
+        except Exception:
+            self.failures.inc()
+            raise
+        finally:
+            self.attempts.observe(time.perf_counter() - start)
+        return result, time.perf_counter() - start
+
+    def _take_hedge_slot(self):
+        """Whether another hedged request may be sent; the slot is given back when it finishes."""
+        if self._hedge_slots is None or not self._hedge_slots.acquire(blocking=False):
+            return False
+        self.hedges.inc()
+        return True
+
+    def _won(self, outcome, hedged):
+        result, seconds = outcome
+        if hedged:
+            self.hedge_wins.inc()
+        self._latencies.append(seconds)
+        return result
+
+    def _hedged_invoke(self, messages, kwargs):
+        delay = self.hedge_delay()
+        if delay is None:
+            return self._won(self._timed_invoke(messages, kwargs), False)
+        stop = threading.Event()
+        first = self._executor.submit(self._timed_invoke, messages, kwargs, stop)
+        try:
+            done, pending = wait([first], timeout=delay)
+            if not done and self._take_hedge_slot():
+                hedge = self._executor.submit(self._timed_invoke, messages, kwargs, stop)
+                hedge.add_done_callback(lambda _: self._hedge_slots.release())
+                pending.add(hedge)
+            error = None
+            while True:
+                for future in done:
+                    if future.exception() is None:
+                        return self._won(future.result(), future is not first)
+                    error = future.exception()
+                if not pending:
+                    raise error
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        finally:
+            # The slower request stops at its next chunk
+            stop.set()
+
+    async def _ahedged_invoke(self, messages, kwargs):
+        delay = self.hedge_delay()
+        if delay is None:
+            return self._won(await self._atimed_invoke(messages, kwargs), False)
+        first = asyncio.ensure_future(self._atimed_invoke(messages, kwargs))
+        pending = {first}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done and self._take_hedge_slot():
+                hedge = asyncio.ensure_future(self._atimed_invoke(messages, kwargs))
+                hedge.add_done_callback(lambda _: self._hedge_slots.release())
+                pending.add(hedge)
+            error = None
+            while True:
+                # Every finished task's exception is retrieved, so asyncio doesn't report it as lost
+                winner = None
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                    else:
+                        error = task.exception()
+                if winner is not None:
+                    return self._won(winner.result(), winner is not first)
+                if not pending:
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            # Cancelling the slower request (or both, if this call is cancelled) closes its upstream connection
+            for task in pending:
+                task.cancel()
+
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one execution: the first caller runs
+    it, later callers wait for its result (or its exception) instead of repeating it.
+    Only calls in flight are shared; nothing is kept once the call returns.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self.coalesced = REGISTRY.counter('llm_coalesced_total', 'LLM calls that joined an identical call in flight')
+
+    def do(self, key, fn, *args):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+        if not leader:
+            self.coalesced.inc()
+            return call.result()
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+        call.set_result(result)
+        return result
+
+    async def ado(self, key, fn, *args):
+        """Async variant for coroutine functions. A caller that is cancelled doesn't cancel the shared call."""
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(fn(*args))
+            task.add_done_callback(lambda _: self._finished(key, task))
+        else:
+            self.coalesced.inc()
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        self._tasks.pop(key, None)
+        # Retrieve the exception even if every caller was cancelled, so asyncio doesn't log it as lost
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,254 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Default latency buckets in seconds (1ms .. 30s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Counter:
+    """Monotonically increasing value, e.g. requests served."""
+
+    def __init__(self, name, help_text='', labels=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def snapshot(self):
+        return self._value
+
+
+class Gauge:
+    """Value that can go up and down, e.g. queue depth."""
+
+    def __init__(self, name, help_text='', labels=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self._value -= amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def snapshot(self):
+        return self._value
+
+
+class Histogram:
+    """Cumulative bucketed distribution of observed values."""
+
+    def __init__(self, name, help_text='', buckets=DEFAULT_BUCKETS, labels=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def sum(self):
+        return self._sum
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket that contains it."""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._count
+        if total == 0:
+            return None
+        target = q * total
+        running = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            running += count
+            if running >= target:
+                return bound
+        return float('inf')
+
+    def cumulative_buckets(self):
+        """Return (upper_bound, cumulative_count) pairs including +Inf."""
+        with self._lock:
+            counts = list(self._counts)
+        pairs = []
+        running = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            running += count
+            pairs.append((bound, running))
+        return pairs
+
+    def snapshot(self):
+        # +Inf isn't valid JSON, so report quantiles past the last bucket as None
+        def finite(value):
+            return None if value == float('inf') else value
+
+        return {
+            'count': self._count,
+            'sum': self._sum,
+            'p50': finite(self.quantile(0.5)),
+            'p95': finite(self.quantile(0.95)),
+            'p99': finite(self.quantile(0.99)),
+            'buckets': {str(bound): count for bound, count in self.cumulative_buckets()}
+        }
+
+
+class MetricsRegistry:
+    """Get-or-create store for all metrics in the process."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, help_text, labels, **kwargs):
+        key = (name, tuple(sorted((labels or {}).items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = cls(name, help_text, labels=labels, **kwargs)
+                    self._metrics[key] = metric
+        return metric
+
+    def counter(self, name, help_text='', labels=None):
+        return self._get_or_create(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text='', labels=None):
+        return self._get_or_create(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text='', buckets=DEFAULT_BUCKETS, labels=None):
+        return self._get_or_create(Histogram, name, help_text, labels, buckets=buckets)
+
+    def metrics(self):
+        return list(self._metrics.values())
+
+    def snapshot(self):
+        """Return all metrics as a JSON-serializable dict."""
+        result = {}
+        for metric in self.metrics():
+            key = metric.name
+            if metric.labels:
+                key += '{' + ','.join(f'{k}="{v}"' for k, v in sorted(metric.labels.items())) + '}'
+            result[key] = metric.snapshot()
+        return result
+
+    def prometheus(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        by_name = {}
+        for metric in self.metrics():
+            by_name.setdefault(metric.name, []).append(metric)
+
+        lines = []
+        for name in sorted(by_name):
+            family = by_name[name]
+            kind = {Counter: 'counter', Gauge: 'gauge', Histogram: 'histogram'}[type(family[0])]
+            lines.append(f'# HELP {name} {family[0].help}')
+            lines.append(f'# TYPE {name} {kind}')
+            for metric in family:
+                if kind != 'histogram':
+                    lines.append(f'{name}{format_labels(metric.labels)} {format_value(metric.value)}')
+                    continue
+                for bound, count in metric.cumulative_buckets():
+                    labels = dict(metric.labels, le='+Inf' if bound == float('inf') else format_value(bound))
+                    lines.append(f'{name}_bucket{format_labels(labels)} {count}')
+                lines.append(f'{name}_sum{format_labels(metric.labels)} {format_value(metric.sum)}')
+                lines.append(f'{name}_count{format_labels(metric.labels)} {metric.count}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in sorted(labels.items())) + '}'
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+# Shared registry for the whole backend
+REGISTRY = MetricsRegistry()
+
+# Content type of MetricsRegistry.prometheus() output
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class RequestTimer:
+    """
+    Durations of the stages of one request (upload_receive, decode, preprocess,
+    inference, explanation, serialization). Each stage is observed in the
+    request_stage_seconds histogram and listed in the Server-Timing header.
+    """
+
+    def __init__(self, registry=REGISTRY):
+        self.registry = registry
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        self.stages.append((name, seconds))
+        self.registry.histogram('request_stage_seconds', 'Time spent in each stage of a request',
+                                labels={'stage': name}).observe(seconds)
+
+    def server_timing(self, total=None):
+        """Value of the Server-Timing response header, durations in milliseconds."""
+        entries = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in self.stages]
+        if total is not None:
+            entries.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(entries)
+
+
+def record_request(endpoint, method, status, seconds, registry=REGISTRY):
+    """Count a finished HTTP request and observe its latency."""
+    labels = {'endpoint': endpoint, 'method': method, 'status': str(status)}
+    registry.counter('http_requests_total', 'HTTP requests by endpoint and status code', labels).inc()
+    if status >= 400:
+        registry.counter('http_request_errors_total', 'HTTP requests that ended in a 4xx or 5xx status',
+                         labels).inc()
+    registry.histogram('http_request_seconds', 'Time until the response headers were ready',
+                       labels={'endpoint': endpoint}).observe(seconds)
@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from metrics import REGISTRY
+
+
+def file_fingerprint(path):
+    """Cheap model version: hash of the file's path, size and modification time."""
+    try:
+        stat = os.stat(path)
+        raw = f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+    except OSError:
+        raw = str(path)
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache with TTL for analysis results, keyed by a hash of the
+    image bytes and the model version.
+
+    An optional SQLite file acts as a second tier that survives restarts.
+    Changing the model version drops every entry made by another model.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600, db_path=None, model_version=''):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.model_version = model_version
+        self._entries = OrderedDict()  # key -> (expires_at, result)
+        self._lock = threading.Lock()
+
+        self.db_path = db_path
+        self._connection = None
+        self._connection_pid = None
+        if db_path:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "key TEXT PRIMARY KEY, model_version TEXT, expires_at REAL, result TEXT)"
+            )
+            self._db.commit()
+
+        self.hits = REGISTRY.counter('prediction_cache_hits_total', 'Prediction cache hits', {'tier': 'memory'})
+        self.disk_hits = REGISTRY.counter('prediction_cache_hits_total', 'Prediction cache hits', {'tier': 'disk'})
+        self.misses = REGISTRY.counter('prediction_cache_misses_total', 'Prediction cache misses')
+        self.evictions = REGISTRY.counter('prediction_cache_evictions_total', 'Entries evicted by the size bound')
+        self.expirations = REGISTRY.counter('prediction_cache_expirations_total', 'Entries dropped after their TTL')
+
+    @property
+    def _db(self):
+        """SQLite connection of the current process; forked workers open their own."""
+        if not self.db_path:
+            return None
+        if self._connection_pid != os.getpid():
+            self._connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def key(self, image_bytes, model_version=None):
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        return f"{model_version or self.model_version}:{digest}"
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, result = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits.inc()
+                    return result
+                del self._entries[key]
+                self.expirations.inc()
+
+        result = self._get_from_disk(key, now)
+        if result is not None:
+            self.disk_hits.inc()
+            self._put_in_memory(key, result, now + self.ttl)
+            return result
+
+        self.misses.inc()
+        return None
+
+    def put(self, key, result):
+        expires_at = time.time() + self.ttl
+        self._put_in_memory(key, result, expires_at)
+        if self._db is not None:
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)",
+                    (key, self.model_version, expires_at, json.dumps(result))
+                )
+                self._db.commit()
+
+    def _put_in_memory(self, key, result, expires_at):
+        with self._lock:
+            self._entries[key] = (expires_at, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions.inc()
+
+    def _get_from_disk(self, key, now):
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT expires_at, result FROM predictions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[0] <= now:
+                self._db.execute("DELETE FROM predictions WHERE key = ?", (key,))
+                self._db.commit()
+                self.expirations.inc()
+                return None
+        return json.loads(row[1])
+
+    def set_model_version(self, model_version):
+        """Switch to a new model, dropping every entry produced by a different one."""
+        with self._lock:
+            if model_version != self.model_version:
+                self._entries.clear()
+            self.model_version = model_version
+            if self._db is not None:
+                self._db.execute("DELETE FROM predictions WHERE model_version != ?", (model_version,))
+                self._db.execute("DELETE FROM predictions WHERE expires_at <= ?", (time.time(),))
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM predictions")
+                self._db.commit()
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl,
+            'model_version': self.model_version,
+            'hits': self.hits.value,
+            'disk_hits': self.disk_hits.value,
+            'misses': self.misses.value,
+            'evictions': self.evictions.value,
+            'expirations': self.expirations.value
+        }
@@ -0,0 +1,187 @@
+"""
+Pre-fork multi-process serving mode for the GreenGuard backend.
+
+The master process imports the backend modules, reads exported model files into
+memory and binds the listening socket, then forks the workers. Everything loaded
+before the fork is shared copy-on-write, including the weights of tflite models,
+which the interpreter reads in place. TensorFlow is not fork-safe once it has
+run an op, so Keras models are still loaded by each worker after the fork; serve
+a tflite export to share the weights.
+
+Each worker gets its own TensorFlow thread pool sizes and, optionally, its own
+CPU set. By default the available CPUs are split evenly across the workers.
+
+Follow-up requests can reach any worker. Explanation job ids name their class,
+so a worker that didn't start a job answers from the shared explanation store;
+chat sessions fall back to the transcript the client sends (session_expired).
+
+Run with:
+    GREENGUARD_WORKERS=8 GREENGUARD_CPU_AFFINITY=auto python prefork.py
+
+Settings:
+    GREENGUARD_WORKERS              number of worker processes (default 2)
+    GREENGUARD_HOST, GREENGUARD_PORT  listen address (default 127.0.0.1:5000)
+    GREENGUARD_CPU_AFFINITY         '' (off), 'auto', or CPU sets per worker like '0-7;8-15'
+    GREENGUARD_TF_INTRA_OP_THREADS  per-worker override (default: the worker's share of CPUs)
+    GREENGUARD_TF_INTER_OP_THREADS  per-worker override (default: 2)
+"""
+import os
+import sys
+import time
+import signal
+import socket
+import logging
+
+WORKERS = int(os.getenv('GREENGUARD_WORKERS', '2'))
+HOST = os.getenv('GREENGUARD_HOST', '127.0.0.1')
+PORT = int(os.getenv('GREENGUARD_PORT', '5000'))
+CPU_AFFINITY = os.getenv('GREENGUARD_CPU_AFFINITY', '')
+
+logger = logging.getLogger(__name__)
+
+# Don't respawn in a tight loop when workers crash right after starting
+RESPAWN_DELAY_SECONDS = 1.0
+
+
+def parse_cpu_list(spec):
+    """Parse a CPU list like '0-3,8,10-11' into a set of CPU ids."""
+    cpus = set()
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            low, high = part.split('-', 1)
+            cpus.update(range(int(low), int(high) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+def available_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def worker_cpu_sets(spec, workers):
+    """The CPU set of each worker, or None for each worker when affinity is off."""
+    if not spec:
+        return [None] * workers
+    if spec == 'auto':
+        cpus = available_cpus()
+        share = max(1, len(cpus) // workers)
+        return [set(cpus[(i * share) % len(cpus):][:share]) for i in range(workers)]
+    sets = [parse_cpu_list(part) for part in spec.split(';')]
+    return [sets[i % len(sets)] for i in range(workers)]
+
+
+def worker_threads(cpus, workers):
+    """Intra-op and inter-op thread counts for one worker."""
+    share = len(cpus) if cpus else max(1, len(available_cpus()) // workers)
+    intra_op = int(os.getenv('GREENGUARD_TF_INTRA_OP_THREADS') or share)
+    inter_op = int(os.getenv('GREENGUARD_TF_INTER_OP_THREADS') or min(2, intra_op))
+    return intra_op, inter_op
+
+
+def run_worker(index, listener, cpus, workers):
+    """Body of a forked worker: pin, size the thread pools, load the model and serve."""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+    intra_op, inter_op = worker_threads(cpus, workers)
+
+    from werkzeug.serving import make_server
+    from disease_predict import configure_threads, get_predictor
+    from backend import app
+
+    configure_threads(intra_op, inter_op)
+    start = time.perf_counter()
+    get_predictor()
+    cpu_note = f", cpus {sorted(cpus)}" if cpus else ''
+    logger.info("Worker %d (pid %d) ready in %.2fs: %d intra-op / %d inter-op threads%s",
+                index, os.getpid(), time.perf_counter() - start, intra_op, inter_op, cpu_note)
+
+    server = make_server(HOST, PORT, app, threaded=True, fd=listener.fileno())
+    server.serve_forever()
+
+
+def main():
+    # Same format as backend.py, which the workers import; basicConfig there is then a no-op
+    logging.basicConfig(level=os.getenv('GREENGUARD_LOG_LEVEL', 'INFO').upper(),
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    workers = WORKERS
+    cpu_sets = worker_cpu_sets(CPU_AFFINITY, workers)
+
+    # Imported before forking so the modules (TensorFlow included) are shared copy-on-write.
+    # Nothing here may run a TensorFlow op, open the caches' SQLite files or start threads.
+    from disease_predict import model_files
+    from inference_backends import preload_model
+    for path, backend in model_files():
+        if backend == 'tflite':
+            size = preload_model(path)
+            logger.info("Preloaded %s (%.1f MB) for all workers", path, size / (1024 * 1024))
+        else:
+            if backend == 'keras':
+                # Importing TensorFlow is fork-safe as long as no op runs before the fork
+                import keras_model  # noqa: F401
+            logger.info("%s model %s is loaded by each worker", backend, path)
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((HOST, PORT))
+    listener.listen(1024)
+    listener.set_inheritable(True)
+    logger.info("Listening on http://%s:%d with %d workers", HOST, PORT, workers)
+
+    children = {}
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(index, listener, cpu_sets[index], workers)
+            except BaseException:
+                logger.exception("Worker %d failed", index)
+            finally:
+                os._exit(1)
+        children[pid] = index
+
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for index in range(workers):
+        spawn(index)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = children.pop(pid, None)
+        if index is None or stopping:
+            continue
+        logger.warning("Worker %d (pid %d) exited with status %d, restarting",
+                       index, pid, os.waitstatus_to_exitcode(status))
+        time.sleep(RESPAWN_DELAY_SECONDS)
+        spawn(index)
+
+    listener.close()
+    logger.info("All workers stopped")
+
+
+if __name__ == '__main__':
+    if not hasattr(os, 'fork'):
+        sys.exit("prefork.py needs a platform with fork(); use backend.py or asgi_app.py instead")
+    main()
@@ -0,0 +1,250 @@
+"""
+In-memory search over the agricultural professionals shown on the Connect page.
+
+The dataset (GREENGUARD_PROFESSIONALS_PATH, a JSON array or JSON lines file) is
+loaded into columns: the expertise, location and crop of each professional are
+small integer codes into a list of distinct values, and the coordinates are
+float32 arrays. Records are only turned back into dicts for the page returned.
+
+Each facet value has an inverted index (the sorted ids of the professionals
+with that value), and every word of the searchable fields has one too, so a
+query intersects a few sorted arrays instead of scanning every record:
+
+- expertise, location and cropType are exact, case-insensitive matches and are
+  all required;
+- keywords match the start of words in the name, expertise, location, crop and
+  address, and a professional needs to match any one of them, like the search on
+  the page. Professionals matching more of the keywords come first.
+
+Coordinates are indexed by geo_index.GeoIndex for bounding box and radius
+searches, and for clustering the professionals on the map.
+"""
+import os
+import re
+import json
+import bisect
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+from geo_index import GeoIndex
+
+PROFESSIONALS_PATH = os.getenv(
+    'GREENGUARD_PROFESSIONALS_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'professionals.json')
+)
+
+# Query parameter -> record field of the facet filters
+FACETS = {'expertise': 'expertise', 'location': 'location', 'cropType': 'cropSpecialization'}
+# Free-text fields indexed for keywords, besides the facet fields
+TEXT_FIELDS = ('name', 'address')
+# Fields kept as plain strings
+STRING_FIELDS = ('id', 'name', 'contact', 'link', 'address', 'gender')
+
+TOKEN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower()) if text else []
+
+
+def coordinate(value):
+    """A latitude or longitude as a float, NaN when missing (0.0 is a valid coordinate)."""
+    return np.nan if value is None or value == '' else float(value)
+
+
+def contains_sorted(values, sorted_array):
+    """Boolean mask of the values present in a sorted array."""
+    if not len(sorted_array):
+        return np.zeros(len(values), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_array, values), len(sorted_array) - 1)
+    return sorted_array[positions] == values
+
+
+def intersect(postings):
+    """Ids present in every sorted id array, checking the shortest one against the others."""
+    postings = sorted(postings, key=len)
+    ids = postings[0]
+    for other in postings[1:]:
+        ids = ids[contains_sorted(ids, other)]
+    return ids
+
+
+class ProfessionalIndex:
+    """Column store of professionals with inverted indexes per facet value and per keyword."""
+
+    def __init__(self, records):
+        self.size = len(records)
+        self._strings = {field: [record.get(field) for record in records] for field in STRING_FIELDS}
+        self._lat = np.array([coordinate(record.get('lat')) for record in records], dtype=np.float32)
+        self._lon = np.array([coordinate(record.get('lon')) for record in records], dtype=np.float32)
+
+        # Facets: a code per record and the sorted ids of each value
+        self._values = {}
+        self._codes = {}
+        self._facet_postings = {}
+        for facet, field in FACETS.items():
+            values = sorted({record.get(field) for record in records if record.get(field)})
+            code_of = {value: code for code, value in enumerate(values, start=1)}
+            # 0 stands for a missing value
+            codes = np.array([code_of.get(record.get(field), 0) for record in records],
+                             dtype=np.uint16 if len(values) < 2 ** 16 else np.int32)
+            self._values[facet] = [None] + values
+            self._codes[facet] = codes
+            self._facet_postings[facet] = {
+                value.lower(): np.flatnonzero(codes == code).astype(np.int32) for value, code in code_of.items()
+            }
+
+        # Keywords: words of the free-text fields per record, plus the words of each facet value
+        words = {}
+        tokens_of = {}
+        for i, record in enumerate(records):
+            for field in TEXT_FIELDS:
+                text = record.get(field)
+                if not text:
+                    continue
+                # Names and addresses repeat a lot, so each distinct string is tokenized once
+                tokens = tokens_of.get(text)
+                if tokens is None:
+                    tokens = tokens_of[text] = set(tokenize(text))
+                for token in tokens:
+                    words.setdefault(token, []).append(i)
+        parts = {token: [np.unique(np.array(ids, dtype=np.int32))] for token, ids in words.items()}
+        for facet_postings in self._facet_postings.values():
+            for value, ids in facet_postings.items():
+                for token in set(tokenize(value)):
+                    parts.setdefault(token, []).append(ids)
+        self._keyword_postings = {
+            token: arrays[0] if len(arrays) == 1 else np.unique(np.concatenate(arrays))
+            for token, arrays in parts.items()
+        }
+        self._vocabulary = sorted(self._keyword_postings)
+        self.keyword_ids = lru_cache(maxsize=4096)(self._keyword_ids)
+
+        self.geo = GeoIndex(self._lat, self._lon)
+
+    @classmethod
+    def from_file(cls, path=PROFESSIONALS_PATH):
+        with open(path, encoding='utf-8') as f:
+            if path.endswith('.jsonl'):
+                records = [json.loads(line) for line in f if line.strip()]
+            else:
+                records = json.load(f)
+        return cls(records)
+
+    def _keyword_ids(self, prefix):
+        """Sorted ids of the professionals with a word starting with the prefix."""
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        arrays = []
+        for token in self._vocabulary[start:]:
+            if not token.startswith(prefix):
+                break
+            arrays.append(self._keyword_postings[token])
+        if not arrays:
+            return np.empty(0, dtype=np.int32)
+        return arrays[0] if len(arrays) == 1 else np.unique(np.concatenate(arrays))
+
+    def match(self, expertise=None, location=None, crop_type=None, keywords=''):
+        """
+        Ids of the professionals matching the filters, best keyword matches first, or None when
+        nothing is filtered.
+        """
+        postings = []
+        for facet, value in (('expertise', expertise), ('location', location), ('cropType', crop_type)):
+            if value and value.lower() != 'any':
+                ids = self._facet_postings[facet].get(value.lower())
+                if ids is None:
+                    return np.empty(0, dtype=np.int32)
+                postings.append(ids)
+        ids = intersect(postings) if postings else None
+
+        terms = set(tokenize(keywords))
+        if terms:
+            # Count how many of the keywords each professional matches, for the ranking
+            matched, counts = np.unique(np.concatenate([self.keyword_ids(term) for term in terms]),
+                                        return_counts=True)
+            if ids is not None:
+                mask = contains_sorted(matched, ids)
+                matched, counts = matched[mask], counts[mask]
+            ids = matched[np.argsort(-counts, kind='stable')]
+        return ids
+
+    def search(self, expertise=None, location=None, crop_type=None, keywords='', bbox=None, near=None,
+               page=1, page_size=50):
+        """
+        Return (total number of matches, the professionals of the requested page).
+
+        bbox (west, south, east, north) keeps the professionals inside a bounding box, which
+        crosses the antimeridian when west > east. near (lat, lon, radius_km) keeps those within
+        the radius, nearest first, and adds their distanceKm.
+        """
+        ids = self.match(expertise, location, crop_type, keywords)
+        distances = None
+        if bbox:
+            inside = self.geo.within_bbox(*bbox)
+            ids = inside if ids is None else ids[contains_sorted(ids, inside)]
+        if near:
+            nearby, distances = self.geo.within_radius(*near)
+            if ids is not None:
+                mask = contains_sorted(nearby, np.sort(ids))
+                nearby, distances = nearby[mask], distances[mask]
+            ids = nearby
+
+        total = self.size if ids is None else len(ids)
+        start = (page - 1) * page_size
+        page_ids = range(start, min(start + page_size, total)) if ids is None else ids[start:start + page_size]
+        professionals = [self.record(int(i)) for i in page_ids]
+        if distances is not None:
+            for professional, distance in zip(professionals, distances[start:start + page_size]):
+                professional['distanceKm'] = round(float(distance), 2)
+        return total, professionals
+
+    def map_view(self, bbox, zoom, expertise=None, location=None, crop_type=None, keywords='',
+                 max_cells=1024, max_points=1000, cluster_max_zoom=16):
+        """
+        What the map shows for a viewport: clusters of the matching professionals for the zoom
+        level, and the professionals that are alone in their cluster cell. From cluster_max_zoom
+        on the professionals in the viewport are returned one by one, unless there are more than
+        max_points of them.
+
+        Returns (total number of professionals in the clusters and points, clusters, professionals).
+        """
+        ids = self.match(expertise, location, crop_type, keywords)
+        if zoom >= cluster_max_zoom:
+            inside = self.geo.within_bbox(*bbox)
+            if ids is not None:
+                inside = inside[contains_sorted(inside, np.sort(ids))]
+            if len(inside) <= max_points:
+                return len(inside), [], [self.record(int(i)) for i in inside]
+
+        counts, lats, lons, first_ids, bounds = self.geo.clusters(*bbox, zoom, ids=ids, max_cells=max_cells)
+        clusters = [
+            {'count': int(count), 'lat': round(float(lat), 5), 'lon': round(float(lon), 5),
+             'bounds': [[round(float(s), 5), round(float(w), 5)], [round(float(n), 5), round(float(e), 5)]]}
+            for count, lat, lon, (s, w, n, e) in zip(counts, lats, lons, bounds) if count > 1
+        ]
+        professionals = [self.record(int(i)) for i, count in zip(first_ids, counts) if count == 1]
+        return int(counts.sum()), clusters, professionals
+
+    def record(self, i):
+        record = {field: self._strings[field][i] for field in STRING_FIELDS}
+        for facet, field in FACETS.items():
+            record[field] = self._values[facet][self._codes[facet][i]]
+        record['lat'] = None if np.isnan(self._lat[i]) else round(float(self._lat[i]), 5)
+        record['lon'] = None if np.isnan(self._lon[i]) else round(float(self._lon[i]), 5)
+        return record
+
+
+# The index is built on first use, so startup doesn't read the dataset
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ProfessionalIndex.from_file(PROFESSIONALS_PATH)
+    return _index
@@ -0,0 +1,19 @@
+"""
+Shared setup for the backend tests: the modules are imported flat from backend/,
+and the LLM is the local stand-in of fake_llm.py with short delays, so no Groq
+key or network is needed.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Read when the backend modules are imported, so they are set before any test module imports them
+os.environ.setdefault('GREENGUARD_FAKE_LLM', '1')
+os.environ.setdefault('GREENGUARD_FAKE_LLM_FIRST_TOKEN_DELAY', '0.01')
+os.environ.setdefault('GREENGUARD_FAKE_LLM_TOKEN_INTERVAL', '0.001')
+os.environ.setdefault('GREENGUARD_FAKE_LLM_TOKENS', '10')
+os.environ.setdefault('GREENGUARD_EXPLANATION_DB', os.path.join(tempfile.mkdtemp(), 'explanations.db'))
+os.environ.setdefault('GREENGUARD_ANSWER_CACHE_SIZE', '0')
+os.environ.setdefault('GREENGUARD_LLM_QUOTA_PER_MINUTE', '0')
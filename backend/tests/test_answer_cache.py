@@ -0,0 +1,52 @@
+import pytest
+
+from answer_cache import AnswerCache
+
+CROP, DISEASE = 'Tomato', 'Late_blight'
+
+# Rewordings that ask the same thing and may share a cached answer
+SAME_QUESTION = [
+    ('How do I treat late blight?', 'how can I cure it?'),
+    ('Is it contagious?', 'does it spread?'),
+    ('What are the symptoms?', 'what are the signs?'),
+    ('Which fungicide should I spray?', 'which fungicide should I spray on it'),
+    ('iska ilaj kya hai', 'iska upchar kya hai'),
+    ('इसका इलाज क्या है?', 'इसका उपचार क्या है?'),
+]
+
+# Questions that look alike but ask something else, and must not get the cached answer
+DIFFERENT_QUESTION = [
+    ('Which fungicide should I spray?', 'When should I spray fungicide?'),
+    ('What causes it?', 'What does it cause?'),
+    ('Why are the leaves yellow?', 'What causes yellow leaves?'),
+    ('How do I treat it?', 'When should I treat it?'),
+    ('How do I prevent it?', 'How do I stop it from spreading?'),
+    ('What medicine should I use?', 'What pesticide should I use?'),
+    ('How do I treat it?', 'iska ilaj kaise kare?'),
+]
+
+
+def cache_with(question):
+    cache = AnswerCache()
+    cache.put(CROP, DISEASE, question, 'cached answer')
+    return cache
+
+
+@pytest.mark.parametrize('cached, asked', SAME_QUESTION)
+def test_reworded_question_hits(cached, asked):
+    assert cache_with(cached).get(CROP, DISEASE, asked) == 'cached answer'
+
+
+@pytest.mark.parametrize('cached, asked', DIFFERENT_QUESTION)
+def test_look_alike_question_misses(cached, asked):
+    assert cache_with(cached).get(CROP, DISEASE, asked) is None
+
+
+def test_answers_are_kept_per_disease():
+    cache = cache_with('How do I treat it?')
+    assert cache.get(CROP, 'Early_blight', 'How do I treat it?') is None
+
+
+def test_exact_question_hits_after_normalization():
+    cache = cache_with('How do I treat Late Blight?')
+    assert cache.get(CROP, DISEASE, 'how do i treat late blight') == 'cached answer'
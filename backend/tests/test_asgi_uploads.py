@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+from starlette.testclient import TestClient
+
+import asgi_app
+
+BOUNDARY = 'greenguard-test'
+
+
+def chunked_upload(field, size, chunk_size=64 * 1024):
+    """A multipart body sent as a generator, so the client uses chunked encoding without Content-Length."""
+    head = (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{field}"; filename="leaf.jpg"\r\n'
+            'Content-Type: image/jpeg\r\n\r\n').encode()
+
+    def body():
+        yield head
+        for start in range(0, size, chunk_size):
+            yield b'x' * min(chunk_size, size - start)
+        yield f'\r\n--{BOUNDARY}--\r\n'.encode()
+
+    return body()
+
+
+def post(path, field, size):
+    with TestClient(asgi_app.app) as client:
+        return client.post(path, content=chunked_upload(field, size),
+                           headers={'Content-Type': f'multipart/form-data; boundary={BOUNDARY}'})
+
+
+def test_chunked_upload_over_the_limit_is_rejected():
+    response = post('/api/predict', 'image', asgi_app.MAX_UPLOAD_BYTES + 1)
+    assert response.status_code == 413
+
+
+def test_chunked_batch_over_the_limit_is_rejected():
+    response = post('/api/predict/batch', 'images', asgi_app.BATCH_MAX_BYTES + 1)
+    assert response.status_code == 413
+
+
+def test_chunked_upload_under_the_limit_is_read():
+    response = post('/api/predict', 'image', 1024)
+    assert response.status_code == 400
+    assert response.json()['error'] == 'The uploaded file is not a valid image.'
+
+
+def test_limit_body_stops_reading_at_the_limit():
+    chunks = []
+
+    async def receive():
+        chunks.append(1)
+        return {'type': 'http.request', 'body': b'x' * 1024, 'more_body': True}
+
+    scope = {'type': 'http', 'method': 'POST', 'path': '/api/predict', 'headers': [
+        (b'content-type', f'multipart/form-data; boundary={BOUNDARY}'.encode())]}
+    request = asgi_app.limit_body(asgi_app.Request(scope, receive), 10 * 1024)
+
+    with pytest.raises(asgi_app.UploadTooLarge):
+        asyncio.run(request.body())
+    assert len(chunks) == 11
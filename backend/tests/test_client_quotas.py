@@ -0,0 +1,31 @@
+import uuid
+
+import backend
+from client_quotas import ClientQuotas, client_id
+
+
+def test_client_id_is_the_address_appended_by_the_trusted_proxies():
+    headers = {'X-Forwarded-For': '1.2.3.4, 203.0.113.7, 10.0.0.2'}
+    assert client_id(headers, '10.0.0.3', 'X-Forwarded-For') == '10.0.0.2'
+    assert client_id(headers, '10.0.0.3', 'X-Forwarded-For', trusted_hops=2) == '203.0.113.7'
+    # Fewer entries than proxies: the header didn't come through all of them
+    assert client_id(headers, '10.0.0.3', 'X-Forwarded-For', trusted_hops=4) == '10.0.0.3'
+    assert client_id({}, '10.0.0.3', 'X-Forwarded-For') == '10.0.0.3'
+    assert client_id(headers, '10.0.0.3') == '10.0.0.3'
+
+
+def test_spoofed_leading_values_share_the_client_bucket(monkeypatch):
+    monkeypatch.setattr(backend, 'llm_quotas', ClientQuotas(2 / 60, 2))
+    monkeypatch.setattr(backend, 'CLIENT_ID_HEADER', 'X-Forwarded-For')
+    session = backend.chat_sessions.start('Tomato', 'Late Blight')
+    client = backend.app.test_client()
+
+    statuses = []
+    for _ in range(4):
+        # The proxy appends the address it got the request from to whatever the client sent
+        response = client.post('/api/chat', json={
+            'message': 'How do I treat late blight on my tomato plants?', 'session_id': session.id
+        }, headers={'X-Forwarded-For': f'{uuid.uuid4().hex}, 203.0.113.7'})
+        statuses.append(response.status_code)
+    assert statuses == [200, 200, 429, 429]
+    assert int(response.headers['Retry-After']) > 0
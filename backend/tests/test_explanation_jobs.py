@@ -0,0 +1,46 @@
+import os
+import time
+import threading
+
+from explanation_jobs import ExplanationJobs, make_job_id, parse_job_id
+from explanation_store import ExplanationStore
+
+
+def worker_jobs(tmp_path, generate):
+    """Jobs of one prefork worker: its own store connection to the shared SQLite file."""
+    return ExplanationJobs(ExplanationStore(os.path.join(tmp_path, 'explanations.db')), generate)
+
+
+def test_job_resolves_through_another_worker(tmp_path):
+    release = threading.Event()
+
+    def generate(prompt):
+        release.wait(5)
+        return 'Late blight spreads in cool, wet weather.'
+
+    first = worker_jobs(tmp_path, generate)
+    second = worker_jobs(tmp_path, generate)
+    job = first.submit('Tomato', 'Late_blight')
+    assert parse_job_id(job.id)[:2] == ('Tomato_Late_blight', first.store.prompt_version)
+
+    # Still generating in the first worker
+    pending = second.get(job.id)
+    assert pending is not None and pending.to_dict()['status'] == 'pending'
+
+    release.set()
+    assert job.wait(5)
+    done = second.get(job.id)
+    assert done.to_dict()['status'] == 'done'
+    assert done.to_dict()['explanation'] == 'Late blight spreads in cool, wet weather.'
+    assert list(second.get(job.id).events()) == [('done', 'Late blight spreads in cool, wet weather.')]
+
+
+def test_unknown_and_expired_job_ids(tmp_path):
+    jobs = worker_jobs(tmp_path, lambda prompt: 'text')
+    version = jobs.store.prompt_version
+    assert jobs.get('not-a-job') is None
+    # Another worker's job that may still be running, one that would have finished by now,
+    # and one from a previous prompt template
+    assert jobs.get(make_job_id('Rice_Blast', version, time.time())).status == 'pending'
+    assert jobs.get(make_job_id('Rice_Blast', version, time.time() - jobs.shared_timeout - 1)) is None
+    assert jobs.get(make_job_id('Rice_Blast', 'oldversion00', time.time())) is None
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from geo_index import GeoIndex, haversine_km
+
+rng = np.random.default_rng(0)
+LAT = rng.uniform(-80, 80, 20000)
+LON = rng.uniform(-180, 180, 20000)
+# Points on both sides of the antimeridian, and on it
+LAT[:3] = [10.0, 10.0, -5.0]
+LON[:3] = [179.9, -179.9, 180.0]
+INDEX = GeoIndex(LAT, LON)
+
+
+def scan_bbox(west, south, east, north):
+    in_lon = (LON >= west) & (LON <= east) if west <= east else (LON >= west) | (LON <= east)
+    return np.flatnonzero(in_lon & (LAT >= south) & (LAT <= north))
+
+
+@pytest.mark.parametrize('bbox', [
+    (70.0, 5.0, 95.0, 35.0),
+    (170.0, -20.0, -170.0, 20.0),
+    (179.0, 0.0, -179.0, 15.0),
+    (10.0, -60.0, 5.0, 60.0),
+    (-180.0, -90.0, 180.0, 90.0),
+])
+def test_within_bbox_matches_a_scan(bbox):
+    assert INDEX.within_bbox(*bbox).tolist() == scan_bbox(*bbox).tolist()
+
+
+def test_within_bbox_across_the_antimeridian_keeps_both_sides():
+    ids = INDEX.within_bbox(179.0, 0.0, -179.0, 15.0)
+    assert {0, 1} <= set(ids.tolist())
+
+
+@pytest.mark.parametrize('lat, lon, radius_km', [
+    (20.0, 78.0, 300.0),
+    (10.0, 179.95, 50.0),
+    (10.0, -179.95, 50.0),
+    (-30.0, 175.0, 2000.0),
+    (75.0, -170.0, 1500.0),
+])
+def test_within_radius_matches_a_scan(lat, lon, radius_km):
+    ids, distances = INDEX.within_radius(lat, lon, radius_km)
+    expected = np.flatnonzero(haversine_km(lat, lon, LAT, LON) <= radius_km)
+    assert sorted(ids.tolist()) == expected.tolist()
+    assert np.all(np.diff(distances) >= 0)
+
+
+def test_clusters_across_the_antimeridian_cover_the_box_once():
+    bbox = (170.0, -20.0, -170.0, 20.0)
+    for zoom in (0, 2, 5):
+        counts, lats, lons, first_ids, bounds = INDEX.clusters(*bbox, zoom)
+        cells = {tuple(b) for b in bounds.round(6).tolist()}
+        assert len(cells) == len(bounds)
+        assert counts.sum() >= len(scan_bbox(*bbox))
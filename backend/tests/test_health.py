@@ -0,0 +1,24 @@
+import backend
+
+
+def test_readiness_check_starts_the_model_load(monkeypatch):
+    # As under gunicorn or waitress, where backend.py's __main__ doesn't run
+    state = {'state': 'not_loaded'}
+    started = []
+
+    def load_in_background():
+        started.append(True)
+        state['state'] = 'loading'
+
+    monkeypatch.setattr(backend, 'model_status', lambda: {'ready': False, 'state': state['state']})
+    monkeypatch.setattr(backend, 'load_in_background', load_in_background)
+    client = backend.app.test_client()
+
+    response = client.get('/api/health/ready')
+    assert response.status_code == 503
+    assert response.get_json()['status'] == 'loading'
+    assert started == [True]
+
+    # Once loading, later checks don't start it again
+    assert client.get('/api/health').get_json()['status'] == 'loading'
+    assert started == [True]
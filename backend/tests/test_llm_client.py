@@ -0,0 +1,172 @@
+import time
+import asyncio
+
+import pytest
+
+from fake_llm import FakeLLM, FakeLLMError
+from groq_demo import Message
+from llm_client import CircuitBreaker, CircuitOpenError, ResilientLLM
+
+MESSAGES = [Message('How do I treat leaf rust?')]
+
+
+class ScriptedLLM(FakeLLM):
+    """FakeLLM whose calls fail or are slow in a set order: each entry of script is an error status or a delay."""
+
+    def __init__(self, script=(), **kwargs):
+        kwargs.setdefault('first_token_delay', 0)
+        kwargs.setdefault('token_interval', 0)
+        kwargs.setdefault('num_tokens', 3)
+        super().__init__(**kwargs)
+        self.script = list(script)
+
+    def _first_token_delay(self):
+        delay = super()._first_token_delay()
+        step = self.script.pop(0) if self.script else None
+        if isinstance(step, int):
+            raise FakeLLMError(step)
+        return delay if step is None else step
+
+
+class FailsMidStream(FakeLLM):
+    """FakeLLM whose streams break after the first token."""
+
+    def stream(self, messages, **kwargs):
+        stream = super().stream(messages, **kwargs)
+        yield next(stream)
+        stream.close()
+        raise FakeLLMError(503)
+
+
+def resilient(llm, **kwargs):
+    kwargs.setdefault('backoff_base', 0)
+    kwargs.setdefault('breaker', CircuitBreaker(failure_threshold=100, reset_timeout=60))
+    return ResilientLLM(llm, **kwargs)
+
+
+def test_failed_call_is_retried():
+    llm = ScriptedLLM([503, 503])
+    assert resilient(llm, retries=2).invoke(MESSAGES).content
+    assert llm.calls == 3
+
+
+def test_gives_up_after_the_last_retry():
+    llm = ScriptedLLM([503, 503, 503])
+    with pytest.raises(FakeLLMError):
+        resilient(llm, retries=2).invoke(MESSAGES)
+    assert llm.calls == 3
+
+
+def test_client_error_is_not_retried():
+    llm = ScriptedLLM([400])
+    with pytest.raises(FakeLLMError):
+        resilient(llm, retries=2).invoke(MESSAGES)
+    assert llm.calls == 1
+
+
+def test_breaker_opens_half_opens_and_closes():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    llm = ScriptedLLM([503, 503])
+    client = resilient(llm, retries=0, breaker=breaker)
+
+    for _ in range(2):
+        with pytest.raises(FakeLLMError):
+            client.invoke(MESSAGES)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # Refused without reaching the upstream
+    with pytest.raises(CircuitOpenError):
+        client.invoke(MESSAGES)
+    assert llm.calls == 2
+
+    time.sleep(0.06)
+    # The trial call after the cooldown succeeds and closes the breaker
+    assert client.invoke(MESSAGES).content
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert llm.calls == 3
+
+
+def test_failed_trial_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    llm = ScriptedLLM([503, 503])
+    client = resilient(llm, retries=0, breaker=breaker)
+
+    with pytest.raises(FakeLLMError):
+        client.invoke(MESSAGES)
+    time.sleep(0.06)
+    with pytest.raises(FakeLLMError):
+        client.invoke(MESSAGES)
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        client.invoke(MESSAGES)
+
+
+def test_stream_is_retried_before_the_first_token():
+    llm = ScriptedLLM([503])
+    chunks = list(resilient(llm, retries=2).stream(MESSAGES))
+    assert len(chunks) == 3
+    assert llm.calls == 2
+
+
+def test_stream_is_not_retried_after_the_first_token():
+    llm = FailsMidStream(first_token_delay=0, token_interval=0, num_tokens=5)
+    received = []
+    with pytest.raises(FakeLLMError):
+        for chunk in resilient(llm, retries=2).stream(MESSAGES):
+            received.append(chunk.content)
+    assert len(received) == 1
+    assert llm.calls == 1
+
+
+def primed(llm, **kwargs):
+    """A hedging client that has seen one fast call, so the hedge fires after about that long."""
+    client = resilient(llm, retries=0, hedge_percentile=50, hedge_min_samples=1, **kwargs)
+    client.invoke(MESSAGES)
+    return client
+
+
+def test_hedge_fires_for_a_slow_call_and_wins():
+    llm = ScriptedLLM([None, 1.0], token_interval=0.01)
+    client = primed(llm)
+    hedges, wins = client.hedges.value, client.hedge_wins.value
+
+    start = time.perf_counter()
+    assert client.invoke(MESSAGES).content
+    assert time.perf_counter() - start < 0.5
+    assert client.hedges.value == hedges + 1
+    assert client.hedge_wins.value == wins + 1
+    assert llm.calls == 3
+
+    # The slower request is stopped at its next chunk and its latency is never recorded
+    deadline = time.monotonic() + 3
+    while llm.cancelled < 1 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert llm.cancelled == 1
+    assert len(client._latencies) == 2
+    assert max(client._latencies) < 0.5
+
+
+def test_hedges_are_capped():
+    llm = ScriptedLLM([None, 0.3])
+    client = primed(llm, max_hedges=0)
+    hedges = client.hedges.value
+    assert client.invoke(MESSAGES).content
+    assert client.hedges.value == hedges
+    assert llm.calls == 2
+
+
+def test_async_hedge_cancels_the_slower_call():
+    llm = ScriptedLLM([None, 1.0], token_interval=0.01)
+    client = resilient(llm, retries=0, hedge_percentile=50, hedge_min_samples=1)
+
+    async def run():
+        await client.ainvoke(MESSAGES)
+        wins = client.hedge_wins.value
+        assert (await client.ainvoke(MESSAGES)).content
+        assert client.hedge_wins.value == wins + 1
+        # Let the cancellation reach the slower call
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+    assert llm.cancelled == 1
+    assert len(client._latencies) == 2
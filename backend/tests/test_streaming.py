@@ -0,0 +1,88 @@
+import json
+
+from fake_llm import FakeLLM
+from groq_demo import ResponseGenerator
+from metrics import REGISTRY
+
+
+def ttft_count(endpoint):
+    return REGISTRY.histogram('llm_time_to_first_token_seconds', labels={'endpoint': endpoint}).count
+
+
+def cancelled_count(endpoint):
+    return REGISTRY.counter('llm_streams_cancelled_total', labels={'endpoint': endpoint}).value
+
+
+def sse_events(body):
+    """(event, data) pairs of a Server-Sent Events body."""
+    events = []
+    for block in body.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def test_stream_yields_tokens_in_order():
+    llm = FakeLLM(first_token_delay=0, token_interval=0, response='blight spreads in wet weather')
+    tokens = list(ResponseGenerator(llm=llm).stream_response('prompt', endpoint='test-order'))
+    assert tokens == ['blight', ' spreads', ' in', ' wet', ' weather']
+
+
+def test_stream_records_time_to_first_token():
+    before = ttft_count('test-ttft')
+    llm = FakeLLM(first_token_delay=0.01, token_interval=0, num_tokens=3)
+    list(ResponseGenerator(llm=llm).stream_response('prompt', endpoint='test-ttft'))
+    assert ttft_count('test-ttft') == before + 1
+
+
+def test_closing_the_stream_cancels_upstream():
+    llm = FakeLLM(first_token_delay=0, token_interval=0, num_tokens=10)
+    stream = ResponseGenerator(llm=llm).stream_response('prompt', endpoint='test-cancel')
+    next(stream)
+    stream.close()
+    assert cancelled_count('test-cancel') == 1
+    assert llm.cancelled == 1
+
+
+def test_finished_stream_is_not_counted_as_cancelled():
+    llm = FakeLLM(first_token_delay=0, token_interval=0, num_tokens=3)
+    list(ResponseGenerator(llm=llm).stream_response('prompt', endpoint='test-complete'))
+    assert cancelled_count('test-complete') == 0
+    assert llm.cancelled == 0
+
+
+def start_session(backend):
+    return backend.chat_sessions.start('Tomato', 'Late Blight')
+
+
+def test_chat_stream_sends_tokens_then_done():
+    import backend
+    session = start_session(backend)
+    before = ttft_count('chat')
+    response = backend.app.test_client().post('/api/chat/stream', json={
+        'message': 'How do I treat late blight on my tomato plants?', 'session_id': session.id
+    })
+    assert response.status_code == 200
+    events = sse_events(response.get_data(as_text=True))
+
+    names = [event for event, _ in events]
+    assert names[-1] == 'done'
+    assert set(names[:-1]) == {'token'}
+    tokens = ''.join(data['text'] for _, data in events[:-1])
+    assert events[-1][1]['message'] == tokens
+    assert events[-1][1]['session_id'] == session.id
+    assert ttft_count('chat') == before + 1
+
+
+def test_chat_stream_client_disconnect_cancels_the_stream():
+    import backend
+    session = start_session(backend)
+    before = cancelled_count('chat')
+    response = backend.app.test_client().post('/api/chat/stream', buffered=False, json={
+        'message': 'What are the symptoms of late blight on tomato leaves?', 'session_id': session.id
+    })
+    body = iter(response.response)
+    assert b'event: token' in next(body)
+    # The client goes away after the first token
+    response.close()
+    assert cancelled_count('chat') == before + 1
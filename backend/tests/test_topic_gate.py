@@ -0,0 +1,54 @@
+import gc
+import weakref
+
+import pytest
+
+from topic_gate import TOPIC_GATE, TopicGate
+
+ON_TOPIC = [
+    'How do I treat rice blast?',
+    'Why are the leaves turning yellow?',
+    'Which fungicide should I spray and how often?',
+    'Is it contagious to the other plants in my field?',
+    'aloo ki patti par daag hai',
+    'iska ilaj kya hai',
+    'धान की पत्तियों पर धब्बे हैं',
+]
+
+# Each of these passed the gate on a generic word ('weather', 'rain', 'handle', 'solution',
+# 'yellow', 'control', 'healthy') or a short name at the start of another word ('alu', 'rog', 'dhan')
+OFF_TOPIC = [
+    'what is the weather on mars',
+    'Will it rain tomorrow?',
+    'How do I handle errors in Python?',
+    'What is the best solution for a slow laptop?',
+    'Why is the sky blue and the sun yellow?',
+    'Who has control of the senate?',
+    'How do I eat healthy?',
+    'What is the price of aluminium?',
+    'rogan josh kaise banate hain',
+    'dhanyavad dost',
+]
+
+
+@pytest.mark.parametrize('message', ON_TOPIC)
+def test_on_topic_messages_pass(message):
+    assert TOPIC_GATE.is_on_topic(message, 'Blast', 'Rice')
+
+
+@pytest.mark.parametrize('message', OFF_TOPIC)
+def test_off_topic_messages_are_rejected(message):
+    assert not TOPIC_GATE.is_on_topic(message, 'Blast', 'Rice')
+
+
+def test_detected_disease_name_passes():
+    assert TOPIC_GATE.is_on_topic('is mawa dangerous?', 'Mawa', 'Sugarcane')
+    assert TOPIC_GATE.is_on_topic('what is Quux rot?', 'Quux_rot', None)
+
+
+def test_gates_are_not_kept_alive_by_the_name_cache():
+    gate = TopicGate()
+    assert gate.is_on_topic('what is Quux rot?', 'Quux_rot', None)
+    gate = weakref.ref(gate)
+    gc.collect()
+    assert gate() is None
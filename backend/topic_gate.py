@@ -0,0 +1,160 @@
+"""
+Topic gate for the chat: decides, before any LLM call, whether a message is about
+crops and their diseases.
+
+Keywords in every language the frontend ships (public/locales: en, hi, gu, mr, pa,
+plus romanized Hindi) and the crop and disease names of the model's classes are
+compiled into one regular expression. The keywords are factored into a trie, so
+checking a message is a single regex search whatever the number of keywords.
+
+Keywords are stems that match at the start of a word: 'treat' matches 'treatment'
+and 'पत्त' matches 'पत्तियों'. \\b can't mark word starts in Indic scripts, whose
+vowel signs aren't word characters to the re module, so the start of a word is
+checked with a lookbehind that also covers the Devanagari, Gurmukhi and Gujarati blocks.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+
+from labels import CLASS_CONDITIONS, CROPS
+
+# Only stems specific to crops and their diseases: a generic word ('weather', 'water', 'yellow',
+# 'control', 'cause') or a short romanized name that starts common words ('alu' in 'aluminium')
+# would let off-topic messages through on its own. Messages about the detected crop or disease
+# still pass on its name.
+TOPIC_KEYWORDS = {
+    'en': [
+        'disease', 'diseased', 'treat', 'symptom', 'cure', 'infect', 'contagious', 'remed',
+        'plant', 'crop', 'farm', 'leaf', 'leaves', 'fruit', 'seed', 'soil', 'irrigat', 'fertiliz', 'fertilis',
+        'manure', 'compost', 'harvest', 'sow', 'pesticide', 'fungicide', 'insecticide', 'herbicide', 'spray',
+        'pest', 'larva', 'aphid', 'mite', 'fung', 'bacteri', 'mildew', 'blight', 'wilt',
+    ],
+    # Romanized Hindi, as typed on phones without a Devanagari keyboard
+    'hi-Latn': [
+        'bimari', 'beemari', 'bimaari', 'ilaj', 'ilaaj', 'upchar', 'dawa', 'dawai', 'davai',
+        'lakshan', 'bachav', 'bachaav', 'rokthaam', 'fasal', 'fasl', 'kheti', 'khet', 'kisan', 'paudha',
+        'paudhe', 'patti', 'patte', 'keet', 'keeda', 'kida', 'khaad', 'khad', 'chidkav', 'chhidkav',
+        'phaphund', 'fafund', 'upaj', 'paidavar',
+    ],
+    'hi': [
+        'रोग', 'बीमारी', 'बिमारी', 'इलाज', 'उपचार', 'दवा', 'दवाई', 'लक्षण', 'रोकथाम', 'बचाव', 'फैल',
+        'नियंत्रण', 'संक्रमण', 'उपाय', 'प्रबंधन', 'पौध', 'फसल', 'खेत', 'किसान', 'पत्ती', 'पत्ते', 'पत्त',
+        'जड़', 'तना', 'तने', 'फल', 'बीज', 'मिट्टी', 'सिंचाई',
+        'खाद', 'उर्वरक', 'कीटनाशक', 'फफूंद', 'छिड़क', 'स्प्रे', 'कीट', 'कीड़', 'जीवाणु', 'वायरस',
+        'विषाणु', 'धब्ब', 'सड़', 'झुलस', 'उकठा', 'मुरझा', 'पैदावार', 'उपज', 'कटाई', 'बुवाई',
+    ],
+    'mr': [
+        'रोग', 'आजार', 'उपचार', 'उपाय', 'इलाज', 'औषध', 'लक्षण', 'प्रतिबंध', 'नियंत्रण', 'प्रसार', 'पसर',
+        'संसर्ग', 'प्रादुर्भाव', 'व्यवस्थापन', 'पीक', 'पिक', 'रोप', 'झाड', 'शेत', 'पान', 'पाने',
+        'मूळ', 'मुळ', 'खोड', 'फळ', 'बियाणे', 'माती', 'सिंचन', 'खत', 'कीटकनाशक', 'बुरशी',
+        'फवार', 'कीड', 'किडी', 'जिवाणू', 'विषाणू', 'ठिपके', 'करपा', 'तांबेरा', 'कुज', 'उत्पादन',
+        'काढणी', 'पेरणी',
+    ],
+    'gu': [
+        'રોગ', 'બીમારી', 'બિમારી', 'સારવાર', 'ઉપચાર', 'ઈલાજ', 'ઇલાજ', 'દવા', 'લક્ષણ', 'નિવારણ', 'અટકાવ',
+        'ફેલા', 'નિયંત્રણ', 'ચેપ', 'ઉપાય', 'વ્યવસ્થાપન', 'છોડ', 'પાક', 'ખેતર', 'ખેતી', 'ખેડૂત', 'પાન',
+        'પાંદડ', 'મૂળ', 'થડ', 'ફળ', 'બીજ', 'માટી', 'સિંચાઈ', 'ખાતર', 'જંતુનાશક',
+        'ફૂગ', 'છંટકાવ', 'છાંટ', 'જીવાત', 'કીટ', 'જીવાણુ', 'વાયરસ', 'ડાઘ', 'સડો', 'સુકારો', 'ઉત્પાદન', 'ઉપજ',
+        'લણણી', 'વાવણી',
+    ],
+    'pa': [
+        'ਬਿਮਾਰੀ', 'ਰੋਗ', 'ਇਲਾਜ', 'ਉਪਚਾਰ', 'ਦਵਾਈ', 'ਦਵਾ', 'ਲੱਛਣ', 'ਰੋਕਥਾਮ', 'ਬਚਾਅ', 'ਫੈਲ', 'ਕੰਟਰੋਲ',
+        'ਲਾਗ', 'ਉਪਾਅ', 'ਪ੍ਰਬੰਧ', 'ਪੌਦ', 'ਫਸਲ', 'ਖੇਤ', 'ਕਿਸਾਨ', 'ਪੱਤ', 'ਜੜ੍ਹ',
+        'ਤਣਾ', 'ਤਣੇ', 'ਫਲ', 'ਬੀਜ', 'ਮਿੱਟੀ', 'ਸਿੰਚਾਈ', 'ਖਾਦ', 'ਕੀਟਨਾਸ਼ਕ', 'ਉੱਲੀ', 'ਛਿੜਕ',
+        'ਸਪਰੇਅ', 'ਕੀੜ', 'ਕੀਟ', 'ਵਾਇਰਸ', 'ਧੱਬ', 'ਝੁਲਸ', 'ਪੈਦਾਵਾਰ', 'ਝਾੜ', 'ਵਾਢੀ', 'ਬਿਜਾਈ',
+    ],
+}
+
+# Local names of the model's crops (labels.VALID_CROPS)
+CROP_NAMES = {
+    'Bean': ['bean', 'सेम', 'फली', 'घेवडा', 'वाल', 'ફણસી', 'વાલ', 'ਫਲੀ', 'ਸੇਮ'],
+    'Cotton': ['cotton', 'kapas', 'कपास', 'कापूस', 'કપાસ', 'ਕਪਾਹ', 'ਨਰਮਾ'],
+    'Groundnut': ['groundnut', 'peanut', 'moongfali', 'मूंगफली', 'मूँगफली', 'भुईमूग', 'शेंगदाणा', 'મગફળી', 'ਮੂੰਗਫਲੀ'],
+    'Maize': ['maize', 'corn', 'makka', 'makki', 'मक्का', 'मका', 'મકાઈ', 'ਮੱਕੀ'],
+    'Pepper': ['pepper', 'chili', 'chilli', 'capsicum', 'mirch', 'मिर्च', 'मिरची', 'મરચ', 'ਮਿਰਚ'],
+    'Potato': ['potato', 'aloo', 'आलू', 'बटाटा', 'બટાકા', 'બટેટા', 'ਆਲੂ'],
+    'Rice': ['rice', 'paddy', 'chawal', 'धान', 'चावल', 'भात', 'तांदूळ', 'ડાંગર', 'ચોખા', 'ਝੋਨਾ', 'ਚੌਲ'],
+    'Spinach': ['spinach', 'palak', 'पालक', 'પાલક', 'ਪਾਲਕ'],
+    'Sugarcane': ['sugarcane', 'ganna', 'गन्ना', 'गन्ने', 'ऊस', 'શેરડી', 'ਗੰਨਾ', 'ਗੰਨੇ'],
+    'Tomato': ['tomato', 'tamatar', 'टमाटर', 'टोमॅटो', 'ટામેટા', 'ટમેટા', 'ਟਮਾਟਰ'],
+    'Turmeric': ['turmeric', 'haldi', 'हल्दी', 'हळद', 'હળદર', 'ਹਲਦੀ'],
+}
+
+# Start of a word: not preceded by a word character or a Devanagari, Gurmukhi or Gujarati character
+WORD_START = r'(?<![\w\u0900-\u0aff])'
+
+# Nukta signs and zero-width joiners, which the same word may be typed with or without
+FOLDED_CHARS = re.compile('[\u093c\u0a3c\u0abc\u200c\u200d]')
+
+
+def normalize(text):
+    """Lowercase, compose and drop nukta and joiner characters, for both keywords and messages."""
+    return FOLDED_CHARS.sub('', unicodedata.normalize('NFC', text).lower())
+
+
+def trie_pattern(words):
+    """Regex source matching any of the words, factored by common prefixes."""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        # A search only needs the shortest keyword on a path, so longer ones are dropped
+        if '' in node:
+            return ''
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items())]
+        return branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+
+    return build(trie)
+
+
+def class_name_words():
+    """Crop names in every language and the model's disease names ('Late_blight' -> 'late blight')."""
+    words = [name for names in CROP_NAMES.values() for name in names] + [crop.lower() for crop in CROPS]
+    # 'healthy' isn't a disease, and on its own would pass any message about health
+    words += [condition.replace('_', ' ') for condition in CLASS_CONDITIONS if 'healthy' not in condition.lower()]
+    return words
+
+
+@lru_cache(maxsize=1024)
+def name_matcher(name):
+    """Compiled matcher for a normalized name at the start of a word, cached across gates."""
+    return re.compile(WORD_START + re.escape(name))
+
+
+class TopicGate:
+    """One compiled matcher over the keywords of all languages and the crop and disease names."""
+
+    def __init__(self, keywords=TOPIC_KEYWORDS, extra_words=None):
+        self.languages = sorted(keywords)
+        words = {normalize(word) for words in keywords.values() for word in words}
+        words |= {normalize(word) for word in (class_name_words() if extra_words is None else extra_words)}
+        self.words = sorted(words)
+        self.size = len(words)
+        self.pattern = re.compile(WORD_START + trie_pattern(words))
+
+    def is_on_topic(self, message, disease=None, crop_type=None):
+        """Whether the message is about crops or their diseases, including the detected crop and disease."""
+        text = normalize(message)
+        if self.pattern.search(text):
+            return True
+        # Names that aren't model classes, e.g. a disease from an older client's transcript
+        for name in (disease, crop_type):
+            pattern = self.name_pattern(name) if name else None
+            if pattern is not None and pattern.search(text):
+                return True
+        return False
+
+    def name_pattern(self, name):
+        """Matcher for a crop or disease name the compiled pattern doesn't cover, or None."""
+        name = normalize(name).replace('_', ' ')
+        if self.pattern.match(name):
+            return None
+        return name_matcher(name)
+
+
+# Shared gate, compiled once at import
+TOPIC_GATE = TopicGate()
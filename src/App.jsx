@@ -9,6 +9,7 @@ import Camera from './components/Camera';
 import DecorativeBackground from './components/DecorativeBackground';
 import { motion, AnimatePresence } from 'framer-motion';
 import axios from 'axios';
+import { showDetection } from './utils/explanations';
 import { AppProvider, useApp } from './context/AppContext';
 import './App.css';
 import DetectionHistoryPage from './pages/DetectionHistoryPage';
@@ -27,8 +28,10 @@ const DashboardPage = ({ handleImageProcess, isCollapsed }) => {
     setShowCamera,
     isLoading,
     addMessage,
+    updateMessageById,
     resetState,
     setImageDetected,
+    setChatSessionId,
     setIsLoading,
     removeTypingMessages
   } = useApp();
@@ -103,14 +106,13 @@ const DashboardPage = ({ handleImageProcess, isCollapsed }) => {
 
       if (response.data.status === 'success') {
         removeTypingMessages();
-        addMessage({
-          type: 'bot',
-          content: `Disease detected: ${response.data.disease}\n\n${response.data.explanation}`,
-          timestamp: new Date()
-        });
+        setChatSessionId(response.data.session_id || null);
+        // The explanation is filled in when it is ready, so the detection shows without waiting for it
+        const historyTimestamp = Date.now();
+        showDetection(response.data, { addMessage, updateMessageById }, historyTimestamp);
 
         const historyEntry = {
-          timestamp: Date.now(),
+          timestamp: historyTimestamp,
           image: URL.createObjectURL(file),
           detection: response.data.disease,
           treatment: response.data.treatment,
@@ -507,12 +509,14 @@ function AppContent() {
     isLoading,
     setIsLoading,
     addMessage,
+    updateMessageById,
     removeTypingMessages,
     showCamera,
     setShowCamera,
     cameraError,
     setCameraError,
     setImageDetected,
+    setChatSessionId,
     resetState
   } = useApp();
   const [currentTab, setCurrentTab] = useState('dashboard');
@@ -654,20 +658,19 @@ function AppContent() {
 
       if (response.data.status === 'success') {
         console.log('Analysis successful:', response.data.disease);
-        addMessage({
-          type: 'bot',
-          content: `Disease detected: ${response.data.disease}\n\n${response.data.explanation}`,
-          timestamp: new Date()
-        });
+        setChatSessionId(response.data.session_id || null);
+        // The explanation is filled in when it is ready, so the detection shows without waiting for it
+        const historyTimestamp = Date.now();
+        showDetection(response.data, { addMessage, updateMessageById }, historyTimestamp);
 
         // Save to detection history
         try {
           const historyEntry = {
-            timestamp: Date.now(),
+            timestamp: historyTimestamp,
             image: imageData,
             detection: response.data.disease,
             confidence: response.data.confidence,
-            explanation: response.data.explanation,
+            explanation: response.data.explanation || null,
             crop_type: response.data.crop_type,
             chatHistory: []
           };
@@ -2,6 +2,7 @@ import { useState, useRef } from 'react';
 import { motion } from 'framer-motion';
 import { Send, Loader, Mic, Image as ImageIcon } from 'lucide-react';
 import axios from 'axios';
+import { showDetection } from '../utils/explanations';
 import { useApp } from '../context/AppContext';
 import { useNotifications } from '../context/NotificationContext';
 import PropTypes from 'prop-types';
@@ -13,7 +14,10 @@ const ChatInput = ({
 }) => {
   const [input, setInput] = useState('');
   const [isListening, setIsListening] = useState(false);
-  const { addMessage, handleError, messages, removeTypingMessages, setImageDetected, setIsLoading } = useApp();
+  const {
+    addMessage, chatSessionId, handleError, messages, removeTypingMessages, setChatSessionId, setImageDetected,
+    setIsLoading, updateMessageById
+  } = useApp();
   const { addNotification } = useNotifications();
   const fileInputRef = useRef(null);
 
@@ -39,14 +43,7 @@ const ChatInput = ({
     });
 
     try {
-      const response = await axios.post('http://localhost:5000/api/chat', {
-        message: userMessage,
-        context: messages
-      }, {
-        headers: {
-          'Content-Type': 'application/json'
-        }
-      });
+      const response = await sendChatMessage(userMessage);
 
       removeTypingMessages();
       
@@ -73,6 +70,30 @@ const ChatInput = ({
     }
   };
 
+  // With a server-side session only the new message is sent. If the session has
+  // expired, the transcript is sent once and the server starts a new session from it.
+  const sendChatMessage = async (userMessage) => {
+    const post = (body) => axios.post('http://localhost:5000/api/chat', body, {
+      headers: {
+        'Content-Type': 'application/json'
+      }
+    });
+
+    if (!chatSessionId) {
+      return post({ message: userMessage, context: messages });
+    }
+    try {
+      return await post({ message: userMessage, session_id: chatSessionId });
+    } catch (error) {
+      if (!error.response?.data?.session_expired) {
+        throw error;
+      }
+      const response = await post({ message: userMessage, session_id: chatSessionId, context: messages });
+      setChatSessionId(response.data.session_id || null);
+      return response;
+    }
+  };
+
   const handleBotResponse = (response) => {
     // If response contains treatment recommendations
     if (response.includes('treatment') || response.includes('recommendation')) {
@@ -180,19 +201,18 @@ const ChatInput = ({
       removeTypingMessages();
 
       if (response.data.status === 'success') {
-        addMessage({
-          type: 'bot',
-          content: `Disease detected: ${response.data.disease}\n\n${response.data.explanation}`,
-          timestamp: new Date()
-        });
+        setChatSessionId(response.data.session_id || null);
+        // The explanation is filled in when it is ready, so the detection shows without waiting for it
+        const historyTimestamp = Date.now();
+        showDetection(response.data, { addMessage, updateMessageById }, historyTimestamp);
 
         // Save to detection history
         const historyEntry = {
-          timestamp: Date.now(),
+          timestamp: historyTimestamp,
           image: URL.createObjectURL(file),
           detection: response.data.disease,
           confidence: response.data.confidence,
-          explanation: response.data.explanation,
+          explanation: response.data.explanation || null,
           crop_type: response.data.crop_type,
           chatHistory: messages
         };
@@ -16,6 +16,8 @@ export const AppProvider = ({ children }) => {
   // Initialize with empty state instead of loading from localStorage
   const [messages, setMessages] = useState([]);
   const [imageDetected, setImageDetected] = useState(false);
+  // Server-side chat session of the latest detection (see backend/chat_sessions.py)
+  const [chatSessionId, setChatSessionId] = useState(null);
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState(null);
   
@@ -36,6 +38,7 @@ export const AppProvider = ({ children }) => {
   const resetState = useCallback(() => {
     setMessages([]);
     setImageDetected(false);
+    setChatSessionId(null);
     setIsLoading(false);
     setShowCamera(false);
     setCameraError(null);
@@ -71,6 +74,11 @@ export const AppProvider = ({ children }) => {
     });
   };
 
+  // For messages filled in later, e.g. a detection whose explanation is still being generated
+  const updateMessageById = (id, update) => {
+    setMessages((prev) => prev.map((msg) => (msg.id === id ? { ...msg, ...update } : msg)));
+  };
+
   const removeTypingMessages = () => {
     setMessages((prev) => prev.filter((msg) => msg.status !== 'typing'));
   };
@@ -78,6 +86,7 @@ export const AppProvider = ({ children }) => {
   const clearState = () => {
     setMessages([]);
     setImageDetected(false);
+    setChatSessionId(null);
     setError(null);
     setShowCamera(false);
     setCameraError(null);
@@ -90,6 +99,8 @@ export const AppProvider = ({ children }) => {
     setMessages,
     imageDetected,
     setImageDetected,
+    chatSessionId,
+    setChatSessionId,
     isLoading,
     setIsLoading,
     error,
@@ -97,6 +108,7 @@ export const AppProvider = ({ children }) => {
     handleError,
     addMessage,
     updateMessage,
+    updateMessageById,
     removeTypingMessages,
     clearState,
     resetState,
@@ -0,0 +1,65 @@
+import axios from 'axios';
+
+const API_BASE_URL = 'http://localhost:5000';
+
+export const EXPLANATION_PENDING = '_Preparing a detailed explanation of this disease..._';
+const EXPLANATION_UNAVAILABLE =
+  'A detailed explanation is not available right now. Please ask me about this disease in the chat.';
+
+export const detectionMessage = (data, explanation) => `Disease detected: ${data.disease}\n\n${explanation}`;
+
+// /api/predict answers as soon as the image is classified. When the disease
+// explanation isn't ready yet, the response carries a URL to poll for it.
+export const resolveExplanation = async (data, { intervalMs = 1000, timeoutMs = 60000 } = {}) => {
+  if (data.explanation || !data.explanation_url) {
+    return data.explanation;
+  }
+
+  const deadline = Date.now() + timeoutMs;
+  while (Date.now() < deadline) {
+    try {
+      const { data: job } = await axios.get(`${API_BASE_URL}${data.explanation_url}`);
+      if (job.status === 'done') {
+        return job.explanation;
+      }
+      if (job.status === 'failed') {
+        console.error('Explanation generation failed:', job.error);
+        break;
+      }
+    } catch (error) {
+      console.error('Error fetching explanation:', error);
+      break;
+    }
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+  return EXPLANATION_UNAVAILABLE;
+};
+
+// Show the detection right away: the message starts with a placeholder when the explanation is
+// still being generated, and updateMessageById fills it in (or shows the fallback) once it resolves.
+// The detection history entry saved at historyTimestamp gets the explanation too.
+export const showDetection = (data, { addMessage, updateMessageById }, historyTimestamp = null) => {
+  const id = `detection-${Date.now()}`;
+  addMessage({
+    id,
+    type: 'bot',
+    content: detectionMessage(data, data.explanation || EXPLANATION_PENDING),
+    timestamp: new Date()
+  });
+  if (data.explanation) {
+    return;
+  }
+
+  resolveExplanation(data)
+    .catch(() => EXPLANATION_UNAVAILABLE)
+    .then((resolved) => {
+      const explanation = resolved || EXPLANATION_UNAVAILABLE;
+      updateMessageById(id, { content: detectionMessage(data, explanation) });
+      if (historyTimestamp !== null) {
+        const history = JSON.parse(sessionStorage.getItem('detectionHistory') || '[]');
+        sessionStorage.setItem('detectionHistory', JSON.stringify(history.map((entry) => (
+          entry.timestamp === historyTimestamp ? { ...entry, explanation } : entry
+        ))));
+      }
+    });
+};